@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Listing, ListingImage, Availability, Booking, Profile, Review, Message
+from .models import Category, Listing, ListingImage, Availability, Booking, Profile, Review, Message, Conversation, Task
 
 admin.site.register(Category)
 admin.site.register(Listing)
@@ -8,4 +8,12 @@ admin.site.register(Availability)
 admin.site.register(Booking)
 admin.site.register(Profile)
 admin.site.register(Review)
-admin.site.register(Message)
\ No newline at end of file
+admin.site.register(Message)
+admin.site.register(Conversation)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
@@ -0,0 +1,160 @@
+"""Read-only JSON API, version 1.
+
+Every endpoint answers conditional GETs: the ETag and Last-Modified headers
+come from a single ``Count``/``Max(updated_at)`` query over the rows the
+response is built from, evaluated before the view runs. A client that polls
+with If-None-Match therefore gets a 304 without any serialization.
+
+Query parameters shared by the collection endpoints:
+
+* ``fields=id,title`` returns only the named fields;
+* ``cursor`` / ``limit`` page through results with keyset cursors.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Availability, Category, Listing, Review
+from .pagination import PAGE_SIZE, InvalidCursor, KeysetPaginator
+from .serializers import AvailabilitySerializer, CategorySerializer, ListingSerializer, ReviewSerializer
+
+API_VERSION = 1
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(BasePagination):
+    """DRF adapter for core.pagination.KeysetPaginator."""
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            limit = min(int(request.query_params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': "Must be an integer."})
+        if limit < 1:
+            raise ValidationError({'limit': "Must be positive."})
+        try:
+            self.page = KeysetPaginator(queryset, ordering=self.ordering, per_page=limit).page(request.query_params.get('cursor'))
+        except InvalidCursor:
+            raise ValidationError({'cursor': "Invalid cursor."})
+        self.request = request
+        return self.page.object_list
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+
+def conditional(source):
+    """Derive a strong ETag and Last-Modified from the rows ``source`` returns.
+
+    ``source(request, **kwargs)`` returns the queryset the view serializes;
+    the fingerprint is computed once per request and shared by both headers.
+    """
+    def fingerprint(request, **kwargs):
+        if not hasattr(request, '_api_fingerprint'):
+            try:
+                queryset = source(request, **kwargs)
+            except (ValidationError, DjangoValidationError, ValueError):
+                # Let the view report the bad parameter.
+                queryset = None
+            request._api_fingerprint = None if queryset is None else queryset.order_by().aggregate(
+                count=Count('pk'), last_modified=Max('updated_at'),
+            )
+        return request._api_fingerprint
+
+    def etag(request, **kwargs):
+        state = fingerprint(request, **kwargs)
+        if state is None:
+            return None
+        last_modified = state['last_modified'].isoformat() if state['last_modified'] else ''
+        raw = f"{API_VERSION}|{request.get_full_path()}|{state['count']}|{last_modified}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def last_modified(request, **kwargs):
+        state = fingerprint(request, **kwargs)
+        return state and state['last_modified']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _fields(request):
+    fields = request.GET.get('fields')
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(',') if name.strip()]
+
+
+def _paginated(request, queryset, serializer_class, ordering):
+    paginator = KeysetPagination(ordering)
+    rows = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(rows, many=True, fields=_fields(request), context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+def _listings(request):
+    listings = Listing.objects.filter(is_available=True)
+    category = request.GET.get('category')
+    if category:
+        listings = listings.filter(category__slug=category)
+    updated_since = request.GET.get('updated_since')
+    if updated_since:
+        parsed = parse_datetime(updated_since)
+        if parsed is None:
+            raise ValidationError({'updated_since': "Must be an ISO 8601 datetime."})
+        listings = listings.filter(updated_at__gt=parsed)
+    return listings
+
+
+@conditional(_listings)
+@api_view(['GET'])
+def listing_list(request):
+    return _paginated(request, _listings(request), ListingSerializer, ('-created_at', '-id'))
+
+
+@conditional(lambda request, pk: Listing.objects.filter(pk=pk))
+@api_view(['GET'])
+def listing_detail(request, pk):
+    listing = get_object_or_404(Listing, pk=pk)
+    return Response(ListingSerializer(listing, fields=_fields(request), context={'request': request}).data)
+
+
+@conditional(lambda request, pk: Availability.objects.filter(listing_id=pk))
+@api_view(['GET'])
+def listing_availability(request, pk):
+    get_object_or_404(Listing.objects.only('pk'), pk=pk)
+    return _paginated(request, Availability.objects.filter(listing_id=pk), AvailabilitySerializer, ('start_date', 'id'))
+
+
+@conditional(lambda request, pk: Review.objects.filter(listing_id=pk))
+@api_view(['GET'])
+def listing_reviews(request, pk):
+    get_object_or_404(Listing.objects.only('pk'), pk=pk)
+    reviews = Review.objects.filter(listing_id=pk).select_related('booking__renter')
+    return _paginated(request, reviews, ReviewSerializer, ('-created_at', '-id'))
+
+
+@conditional(lambda request: Category.objects.all())
+@api_view(['GET'])
+def category_list(request):
+    categories = Category.objects.order_by('name')
+    return Response(CategorySerializer(categories, many=True, fields=_fields(request)).data)
@@ -0,0 +1,73 @@
+"""Async variants of the public read-only pages.
+
+``home``, ``listing_list`` and ``listing_detail`` fetch their rows with the
+async ORM so that, served by asgi.py under an ASGI server, a slow client or
+a burst of traffic waits on the event loop instead of holding a worker
+thread. Settings' ASYNC_VIEWS routes the public URLs here; the sync views in
+core.views stay the default for WSGI deployments, where an async view would
+only add a thread hop per request.
+
+Templates still render in a thread: the auth context processor and the
+listing card fragments touch the session and cache synchronously.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+
+from . import facets
+from .caching import cache_anonymous_page
+from .models import Category, Listing
+from .pagination import InvalidCursor, KeysetPaginator, RankedPaginator, acached_count, count_cache_key
+from .views import (
+    LISTING_ORDERINGS, REVIEW_PAGE_SIZE, _filter_listings, _listing_detail_context, _listing_list_context,
+    _listing_reviews,
+)
+
+_render = sync_to_async(render)
+
+
+@cache_anonymous_page(lambda request: ['listings', 'categories'])
+async def home(request):
+    """Display featured listings on the homepage."""
+    featured = Listing.objects.filter(is_available=True).select_related('category', 'primary_image').order_by('-created_at')[:6]
+    featured_listings = [listing async for listing in featured.aiterator()]
+    return await _render(request, 'core/home.html', {'featured_listings': featured_listings})
+
+
+async def _paginate_listings(listings, ranked_ids, filters, cursor=None):
+    if ranked_ids is not None:
+        page = await RankedPaginator(listings, ranked_ids).apage(cursor)
+    else:
+        page = await KeysetPaginator(listings, ordering=LISTING_ORDERINGS[filters['sort'] or 'newest']).apage(cursor)
+    if page.count is None:
+        page.count = await acached_count(listings, count_cache_key('listing_list', filters))
+    return page
+
+
+async def listing_list(request):
+    """List all available listings with filters."""
+    # Only the search-index lookup queries here; it is raw SQL with no async path.
+    listings, ranked_ids, filters, facet_listings = await sync_to_async(_filter_listings)(request)
+    try:
+        page = await _paginate_listings(listings, ranked_ids, filters, request.GET.get('cursor'))
+    except InvalidCursor:
+        page = await _paginate_listings(listings, ranked_ids, filters)
+    counts = await facets.acounts(facet_listings, filters)
+    categories = [category async for category in Category.objects.all()]
+    return await _render(request, 'core/listing_list.html', _listing_list_context(page, filters, categories, counts))
+
+
+@cache_anonymous_page(lambda request, pk: ['categories', f'listing:{pk}'])
+async def listing_detail(request, pk):
+    """Display details of a specific listing."""
+    queryset = Listing.objects.select_related('category', 'owner').prefetch_related('images')
+    try:
+        listing = await queryset.aget(pk=pk)
+    except Listing.DoesNotExist:
+        raise Http404('No Listing matches the given query.')
+    paginator = KeysetPaginator(_listing_reviews(listing.pk), per_page=REVIEW_PAGE_SIZE)
+    try:
+        reviews = await paginator.apage(request.GET.get('reviews'))
+    except InvalidCursor:
+        reviews = await paginator.apage()
+    return await _render(request, 'core/listing_detail.html', _listing_detail_context(request, listing, reviews))
@@ -0,0 +1,175 @@
+"""Helpers shared by the benchmark management commands.
+
+Benchmarks seed synthetic data inside a transaction that is rolled back at the
+end, so they can run against a development database without leaving rows
+behind.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import geo, ratings
+from .images import VARIANT_SIZES
+from .models import Availability, Booking, Category, Listing, ListingImage, Message, Review
+
+BATCH_SIZE = 2000
+
+CATEGORY_NAMES = ['Cameras', 'Cars', 'Apartments', 'Tools', 'Event Halls', 'Sound Systems']
+LOCATIONS = ['Dar es Salaam', 'Arusha', 'Mwanza', 'Dodoma', 'Zanzibar', 'Mbeya', 'Morogoro', 'Tanga']
+# Seeded listings are spread this far around their town's coordinates.
+SCATTER_DEGREES = 0.15
+TITLE_WORDS = ['Canon', 'Toyota', 'Studio', 'Drill', 'Hall', 'Speaker', 'Villa', 'Tent', 'Projector', 'Generator']
+# Password of the seeded renters, for benchmarks that log in over HTTP.
+BENCH_PASSWORD = 'bench-password'
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def _scatter(listing, rng):
+    """Place a seeded listing at a random point around its town."""
+    place = geo.geocode(listing.location)
+    listing.latitude = place.latitude + rng.uniform(-SCATTER_DEGREES, SCATTER_DEGREES)
+    listing.longitude = place.longitude + rng.uniform(-SCATTER_DEGREES, SCATTER_DEGREES)
+    listing.geohash = geo.encode(listing.latitude, listing.longitude)
+
+
+def seed_catalog(listings, seed=0, bookings_per_listing=2):
+    """Bulk-create ``listings`` listings with availability windows and bookings.
+
+    Rows are written with bulk_create, so model signals (search index,
+    calendars) do not fire; benchmarks measure the primary tables only.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    owner = User.objects.create_user(f'bench-owner-{seed}')
+    renter = User.objects.create_user(f'bench-renter-{seed}')
+    categories = [Category.objects.create(name=name, slug=f'bench-{seed}-{index}') for index, name in enumerate(CATEGORY_NAMES)]
+
+    for offset in range(0, listings, BATCH_SIZE):
+        batch = [
+            Listing(
+                title=f'{rng.choice(TITLE_WORDS)} {number}',
+                slug=f'bench-{seed}-{number}',
+                description='Synthetic benchmark listing.',
+                category=rng.choice(categories),
+                rental_type=rng.choice(Listing.RENTAL_TYPES)[0],
+                owner=owner,
+                price=rng.randint(5, 500) * 1000,
+                pricing_unit=rng.choice(Listing.PRICING_UNITS)[0],
+                location=rng.choice(LOCATIONS),
+                instant_book=rng.random() < 0.3,
+            )
+            for number in range(offset, min(offset + BATCH_SIZE, listings))
+        ]
+        for listing in batch:
+            _scatter(listing, rng)
+        Listing.objects.bulk_create(batch)
+
+    listing_ids = list(Listing.objects.filter(owner=owner).values_list('pk', flat=True))
+    availability = []
+    bookings = []
+    for listing_id in listing_ids:
+        start = today + timedelta(days=rng.randint(0, 60))
+        availability.append(Availability(listing_id=listing_id, start_date=start, end_date=start + timedelta(days=rng.randint(7, 90))))
+        for _ in range(bookings_per_listing):
+            booked = today + timedelta(days=rng.randint(0, 120))
+            bookings.append(Booking(
+                listing_id=listing_id, renter=renter, start_date=booked,
+                end_date=booked + timedelta(days=rng.randint(1, 7)), total_price=0,
+                status=rng.choice(Booking.STATUS_CHOICES)[0],
+            ))
+    Availability.objects.bulk_create(availability, batch_size=BATCH_SIZE)
+    Booking.objects.bulk_create(bookings, batch_size=BATCH_SIZE)
+    return listing_ids
+
+
+def seed_activity(listing_ids, renters, seed=0, messages_per_renter=2):
+    """Add renters, images, reviews and messages around a seeded catalog.
+
+    Creates ``renters`` users sharing BENCH_PASSWORD, one ready image per
+    listing, a review for every confirmed booking (marked paid) and a few
+    messages from each renter to the owner. Returns the renters.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)  # Hash once; every renter shares it.
+    users = User.objects.bulk_create([
+        User(username=f'bench-user-{seed}-{number}', password=password) for number in range(renters)
+    ])
+
+    variants = {
+        name: {
+            'width': width, 'height': width * 3 // 4,
+            'webp': f'listings/variants/bench-{seed}/{name}.webp', 'jpeg': f'listings/variants/bench-{seed}/{name}.jpg',
+        }
+        for name, width in VARIANT_SIZES.items()
+    }
+    images = ListingImage.objects.bulk_create([
+        ListingImage(listing_id=listing_id, image=f'listings/bench-{seed}.jpg', status='ready', width=1600, height=1200, variants=variants)
+        for listing_id in listing_ids
+    ], batch_size=BATCH_SIZE)
+    Listing.objects.bulk_update(
+        [Listing(pk=image.listing_id, primary_image=image, thumbnail_url=image.variant_url('thumbnail')) for image in images],
+        ['primary_image', 'thumbnail_url'], batch_size=BATCH_SIZE,
+    )
+
+    confirmed = Booking.objects.filter(listing_id__in=listing_ids, status='confirmed')
+    confirmed.update(payment_status='paid')
+    Review.objects.bulk_create([
+        Review(booking_id=booking_id, listing_id=listing_id, rating=rng.choices(range(1, 6), weights=(1, 1, 2, 4, 6))[0], comment='Synthetic review.')
+        for booking_id, listing_id in confirmed.values_list('pk', 'listing_id').iterator()
+    ], batch_size=BATCH_SIZE)
+    ratings.rebuild(listing_ids)
+
+    # Sent one by one so the conversation signals thread them as the app would.
+    owners = dict(Listing.objects.filter(pk__in=listing_ids).values_list('pk', 'owner_id'))
+    for user in users:
+        for _ in range(messages_per_renter):
+            listing_id = rng.choice(listing_ids)
+            Message.objects.create(sender=user, recipient_id=owners[listing_id], listing_id=listing_id, content='Is it available?')
+    return users
+
+
+def measure(func, repeat):
+    """Call ``func`` ``repeat`` times and return latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples),
+        'p50': percentile(samples, 0.50),
+        'p95': percentile(samples, 0.95),
+        'p99': percentile(samples, 0.99),
+    }
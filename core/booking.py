@@ -0,0 +1,88 @@
+"""Booking service.
+
+Creating a booking is a check-then-insert, so both steps run inside one
+transaction that first takes a per-listing lock. The lock is an UPDATE of
+``Listing.booking_version``: it takes the row lock on PostgreSQL/MySQL exactly
+like ``select_for_update`` would, and on SQLite it acquires the database write
+lock up front instead of failing on a read-to-write upgrade.
+
+Requests are accepted or rejected only by the query run under that lock. No
+cached view of a listing's bookings is consulted first: a cache can miss a
+cancellation made by another process or by a bulk ``update()``, which sends
+no signals, and would keep turning those dates away.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from . import tasks
+from .models import Availability, Booking, Listing
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+class BookingUnavailable(ValidationError):
+    def __init__(self, message="This listing is not available for the selected dates."):
+        super().__init__(message)
+
+
+def _lock_listing(listing_id):
+    Listing.objects.filter(pk=listing_id).update(booking_version=F('booking_version') + 1)
+
+
+def _availability_overlapping(start_date, end_date):
+    return Availability.objects.filter(
+        listing=OuterRef('pk'), start_date__lte=end_date, end_date__gte=start_date,
+    )
+
+
+def _bookings_overlapping(start_date, end_date):
+    return Booking.objects.filter(
+        listing=OuterRef('pk'), status__in=ACTIVE_STATUSES,
+        start_date__lte=end_date, end_date__gte=start_date,
+    )
+
+
+def filter_bookable(queryset, start_date, end_date):
+    """Restrict a listing queryset to listings create_booking would accept for the range.
+
+    Both checks are correlated EXISTS probes served by the
+    ``(listing, start_date, end_date)`` indexes, so the cost per candidate row
+    is constant however many listings the catalog holds.
+    """
+    return queryset.filter(
+        Exists(_availability_overlapping(start_date, end_date)),
+        ~Exists(_bookings_overlapping(start_date, end_date)),
+    )
+
+
+def _booking_state(listing_id, start_date, end_date):
+    """Fetch availability and conflict flags for a date range in one query."""
+    return Listing.objects.filter(pk=listing_id).annotate(
+        has_availability=Exists(_availability_overlapping(start_date, end_date)),
+        has_conflict=Exists(_bookings_overlapping(start_date, end_date)),
+    ).values('has_availability', 'has_conflict').get()
+
+
+def create_booking(listing, renter, start_date, end_date, total_price):
+    """Atomically check availability and create a booking.
+
+    Raises BookingUnavailable if the listing has no availability for the range
+    or an active booking already overlaps it.
+    """
+    with transaction.atomic():
+        _lock_listing(listing.pk)
+        state = _booking_state(listing.pk, start_date, end_date)
+        if not state['has_availability'] or state['has_conflict']:
+            raise BookingUnavailable()
+        booking = Booking.objects.create(
+            listing=listing,
+            renter=renter,
+            start_date=start_date,
+            end_date=end_date,
+            total_price=total_price,
+            status='confirmed' if listing.instant_book else 'pending',
+            payment_status='unpaid',
+        )
+        tasks.enqueue('booking.confirmation', {'booking_id': booking.pk}, key=f'booking-confirmation:{booking.pk}')
+        return booking
@@ -0,0 +1,177 @@
+"""Bulk listing import and export.
+
+Imports read CSV or JSONL one row at a time and work in chunks. Each chunk is
+validated with the ListingForm rules, resolves its categories with one query,
+reserves slugs once per distinct title, and is written with a single
+bulk_create. Exports stream rows from a server-side iterator, so neither
+direction holds the whole file or table in memory.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import caching, geo, search, slugs
+from .forms import ListingForm
+from .models import Category, Listing
+
+CHUNK_SIZE = 500
+FORMATS = ('csv', 'jsonl')
+IMPORT_FIELDS = ['title', 'description', 'category', 'rental_type', 'price', 'pricing_unit', 'location', 'instant_book']
+EXPORT_FIELDS = ['id', 'slug'] + IMPORT_FIELDS
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class ListingImportForm(ListingForm):
+    """ListingForm without the per-row category query; categories are resolved per chunk."""
+
+    class Meta(ListingForm.Meta):
+        fields = [name for name in ListingForm.Meta.fields if name != 'category']
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        # Set when the file itself could not be read to the end.
+        self.file_error = None
+
+    def add_error(self, line, messages):
+        self.errors.append((line, messages))
+
+    def __repr__(self):
+        return f"<ImportResult created={self.created} errors={len(self.errors)}>"
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(binary_file, fmt):
+    """Yield ``(line_number, row_dict)`` pairs from a binary file object."""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            yield line_number, row
+
+
+def _form_data(row):
+    data = {name: row.get(name) for name in IMPORT_FIELDS}
+    data = {name: '' if value is None else value for name, value in data.items()}
+    instant_book = data['instant_book']
+    data['instant_book'] = instant_book if isinstance(instant_book, bool) else str(instant_book).strip().lower() in TRUE_VALUES
+    return {name: value if isinstance(value, bool) else str(value).strip() for name, value in data.items()}
+
+
+def _resolve_categories(keys, known):
+    """Look up unseen category slugs or names in one query, caching them in ``known``."""
+    missing = {key for key in keys if key and key not in known}
+    if not missing:
+        return
+    for category in Category.objects.filter(Q(slug__in=missing) | Q(name__in=missing)):
+        known.setdefault(category.slug, category)
+        known.setdefault(category.name, category)
+    for key in missing:
+        known.setdefault(key, None)
+
+
+def _import_chunk(chunk, owner, categories, result):
+    _resolve_categories([str(row.get('category') or '').strip() for _, row in chunk if isinstance(row, dict)], categories)
+    valid = []
+    for line, row in chunk:
+        if not isinstance(row, dict):
+            result.add_error(line, [f"Not a JSON object: {row}"])
+            continue
+        data = _form_data(row)
+        form = ListingImportForm(data)
+        errors = [] if form.is_valid() else [f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()]
+        category = categories.get(data['category'])
+        if category is None:
+            errors.append(f"category: Unknown category {data['category']!r}." if data['category'] else "category: This field is required.")
+        if errors:
+            result.add_error(line, errors)
+            continue
+        listing = form.save(commit=False)
+        listing.owner = owner
+        listing.category = category
+        geo.locate(listing)
+        valid.append(listing)
+    if not valid:
+        return
+
+    with transaction.atomic():
+        for listing, slug in zip(valid, slugs.allocate_many(Listing, [listing.title for listing in valid])):
+            listing.slug = slug
+        created = Listing.objects.bulk_create(valid)
+        # bulk_create skips the post_save receivers, so sync the side tables here.
+        search.index_listings(created)
+        transaction.on_commit(lambda: caching.bump('listings'))
+    result.created += len(created)
+
+
+def _position(line):
+    return f"after line {line}" if line else "at the start of the file"
+
+
+def import_listings(rows, owner, chunk_size=CHUNK_SIZE):
+    """Import ``(line, row)`` pairs for ``owner``; invalid rows are skipped and reported.
+
+    A file that cannot be decoded or parsed stops the import at that point:
+    the rows read before it are still imported and ``file_error`` says where
+    reading stopped.
+    """
+    result = ImportResult()
+    categories = {}
+    chunk = []
+    line = 0
+    try:
+        for line, row in rows:
+            chunk.append((line, row))
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, owner, categories, result)
+                chunk = []
+    except UnicodeDecodeError:
+        result.file_error = f"Stopped reading {_position(line)}: the file is not UTF-8 text."
+    except csv.Error as e:
+        result.file_error = f"Stopped reading {_position(line)}: {e}."
+    if chunk:
+        _import_chunk(chunk, owner, categories, result)
+    return result
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_listings(queryset, fmt):
+    """Yield the listings of ``queryset`` as CSV or JSONL text, one row at a time."""
+    rows = (
+        queryset.order_by('pk')
+        .values_list('id', 'slug', 'title', 'description', 'category__slug', 'rental_type', 'price', 'pricing_unit', 'location', 'instant_book')
+        .iterator(chunk_size=2000)
+    )
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            yield json.dumps(record) + '\n'
@@ -0,0 +1,143 @@
+"""Page and fragment caching with model-driven invalidation.
+
+Whole pages are cached for anonymous visitors under keys that embed the
+version of every namespace they depend on (``listings``, ``listing:<pk>``,
+``categories``). Bumping a namespace therefore invalidates every page built
+from it without having to enumerate their URLs. Listing card fragments show
+the category name, so their keys embed the ``categories`` version; they are
+deleted directly when their listing changes.
+"""
+import functools
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.encoding import iri_to_uri
+
+CARD_VARIANTS = ('featured', 'listing', 'owned')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(kind, outcome):
+    with _stats_lock:
+        _stats[f'{kind}_{outcome}'] += 1
+
+
+def stats():
+    """Hit/miss counters for this process, plus derived hit ratios."""
+    with _stats_lock:
+        counters = dict(_stats)
+    for kind in ('page', 'fragment'):
+        hits, misses = counters.get(f'{kind}_hit', 0), counters.get(f'{kind}_miss', 0)
+        counters[f'{kind}_hit_ratio'] = round(hits / (hits + misses), 4) if hits + misses else None
+    return counters
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def versions(namespaces):
+    """Return the current version token of each namespace, creating missing ones."""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*namespaces):
+    # A fresh timestamp rather than incr() so an evicted version never comes back.
+    cache.set_many({_version_key(namespace): time.time_ns() for namespace in namespaces}, None)
+
+
+def card_key(listing_id, variant, categories_version):
+    return f'card:{listing_id}:{variant}:{categories_version}'
+
+
+def invalidate_listing(listing_id):
+    bump('listings', f'listing:{listing_id}')
+    categories_version, = versions(['categories'])
+    cache.delete_many([card_key(listing_id, variant, categories_version) for variant in CARD_VARIANTS])
+
+
+def invalidate_categories():
+    bump('categories')
+
+
+def cached_fragment(key, render):
+    html = cache.get(key)
+    if html is None:
+        record('fragment', 'miss')
+        html = render()
+        cache.set(key, html, settings.CACHE_FRAGMENT_TIMEOUT)
+    else:
+        record('fragment', 'hit')
+    return html
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _cached_page(request, dependencies, args, kwargs):
+    """Return ``(key, response)`` for a cacheable request; the response is None on a miss."""
+    if not _cacheable_request(request):
+        return None, None
+    tokens = versions(dependencies(request, *args, **kwargs))
+    key = 'page:{}:{}'.format(iri_to_uri(request.get_full_path()), ':'.join(map(str, tokens)))
+    cached = cache.get(key)
+    if cached is None:
+        record('page', 'miss')
+        return key, None
+    record('page', 'hit')
+    content, content_type = cached
+    return key, HttpResponse(content, content_type=content_type)
+
+
+def _store_page(key, response):
+    if key is not None and response.status_code == 200 and not response.streaming and not response.cookies:
+        cache.set(key, (response.content, response['Content-Type']), settings.CACHE_PAGE_TIMEOUT)
+
+
+def cache_anonymous_page(dependencies):
+    """Cache a view's HTML for anonymous users.
+
+    ``dependencies(request, **kwargs)`` returns the namespaces the page is
+    built from; the cache key embeds their versions. Works on sync and async
+    views alike.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # The session and message lookups are sync-only.
+                key, response = await sync_to_async(_cached_page)(request, dependencies, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(_store_page)(key, response)
+                return response
+            return wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, response = _cached_page(request, dependencies, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                _store_page(key, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""Per-listing free/busy calendars.
+
+Each listing keeps a ListingCalendar row whose bitmap has one bit per day for
+``HORIZON_DAYS`` days from its epoch. Bitmaps are handled as Python integers,
+so reading a date range out of a calendar is a shift and mask no matter how
+many days it spans, and ``free_listing_ids`` answers "free on every day from
+D1 to D2" for a whole catalog with one query and no per-listing SQL.
+
+listing_list still filters dates with booking.filter_bookable: its results
+must match what create_booking accepts, which is any overlapping
+availability, while a calendar only calls a listing free when every day is.
+bench_availability_filter times the two side by side; loading every bitmap
+through the ORM costs more than the indexed EXISTS probes at 10k listings.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .booking import ACTIVE_STATUSES
+from .models import Availability, Booking, Listing, ListingCalendar
+
+HORIZON_DAYS = 366
+
+# Calendars whose epoch is older than this are rebuilt from today.
+REBASE_AFTER_DAYS = 30
+
+
+def _mask(first, last):
+    """Bits ``first`` through ``last`` inclusive."""
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _to_int(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def _to_bytes(bits, days):
+    return bits.to_bytes((days + 7) // 8, 'little')
+
+
+def _compute_bits(listing_id, epoch, days, start, end):
+    """Recompute the free bits for ``start``..``end`` from the source rows.
+
+    Rows reaching past the window (an availability that began before the
+    epoch, a booking beyond the horizon) only contribute their days inside it.
+    """
+    first = max((start - epoch).days, 0)
+    last = min((end - epoch).days, days - 1)
+    if last < first:
+        return 0, 0
+    window_start = epoch + timedelta(days=first)
+    window_end = epoch + timedelta(days=last)
+
+    available = busy = 0
+    for range_start, range_end in Availability.objects.filter(
+        listing_id=listing_id, start_date__lte=window_end, end_date__gte=window_start,
+    ).values_list('start_date', 'end_date'):
+        available |= _mask(max((range_start - epoch).days, first), min((range_end - epoch).days, last))
+    for range_start, range_end in Booking.objects.filter(
+        listing_id=listing_id, status__in=ACTIVE_STATUSES,
+        start_date__lte=window_end, end_date__gte=window_start,
+    ).values_list('start_date', 'end_date'):
+        busy |= _mask(max((range_start - epoch).days, first), min((range_end - epoch).days, last))
+
+    window = _mask(first, last)
+    return available & ~busy & window, window
+
+
+def rebuild_calendar(listing_id, epoch=None):
+    """Recompute a listing's whole calendar, starting at ``epoch`` (default today)."""
+    epoch = epoch or timezone.localdate()
+    bits, _ = _compute_bits(listing_id, epoch, HORIZON_DAYS, epoch, epoch + timedelta(days=HORIZON_DAYS - 1))
+    calendar, _ = ListingCalendar.objects.update_or_create(
+        listing_id=listing_id,
+        defaults={'epoch': epoch, 'days': HORIZON_DAYS, 'free_days': _to_bytes(bits, HORIZON_DAYS)},
+    )
+    return calendar
+
+
+def _is_stale(calendar):
+    return (timezone.localdate() - calendar.epoch).days > REBASE_AFTER_DAYS
+
+
+def get_calendar(listing_id):
+    """Return a current calendar for the listing, building or rebasing it if needed."""
+    calendar = ListingCalendar.objects.filter(listing_id=listing_id).first()
+    if calendar is None or _is_stale(calendar):
+        calendar = rebuild_calendar(listing_id)
+    return calendar
+
+
+def update_calendar(listing_id, start, end):
+    """Refresh only the bits for ``start``..``end`` after a source row changed.
+
+    Pass ``None`` for both dates when the affected range is unknown.
+    """
+    with transaction.atomic():
+        calendar = ListingCalendar.objects.select_for_update().filter(listing_id=listing_id).first()
+        if calendar is None or _is_stale(calendar) or start is None:
+            if Listing.objects.filter(pk=listing_id).exists():
+                rebuild_calendar(listing_id)
+            return
+        bits, window = _compute_bits(listing_id, calendar.epoch, calendar.days, start, end)
+        if not window:
+            return
+        current = _to_int(calendar.free_days)
+        calendar.free_days = _to_bytes((current & ~window) | bits, calendar.days)
+        calendar.save(update_fields=['free_days', 'updated_at'])
+
+
+def day_flags(calendar, start, end):
+    """Return one boolean per day from ``start`` to ``end``; days outside the horizon are busy."""
+    bits = _to_int(calendar.free_days)
+    flags = []
+    for offset in range((end - start).days + 1):
+        index = (start - calendar.epoch).days + offset
+        flags.append(0 <= index < calendar.days and bool(bits >> index & 1))
+    return flags
+
+
+def free_ranges(calendar, start, end):
+    """Collapse the free days between ``start`` and ``end`` into ``(first, last)`` runs."""
+    runs = []
+    run_start = None
+    # Dates are only built for days in the range, so ``end`` may be date.max.
+    for offset, free in enumerate(day_flags(calendar, start, end) + [False]):
+        if free and run_start is None:
+            run_start = start + timedelta(days=offset)
+        elif not free and run_start is not None:
+            runs.append((run_start, start + timedelta(days=offset - 1)))
+            run_start = None
+    return runs
+
+
+def free_listing_ids(start, end, listings=None):
+    """Ids of listings free on every day from ``start`` to ``end``, optionally within ``listings``.
+
+    Loads the bitmaps in one query and tests each against a single mask.
+    Listings without a calendar, or whose calendar does not cover the whole
+    range, are treated as not free.
+    """
+    calendars = ListingCalendar.objects.all()
+    if listings is not None:
+        calendars = calendars.filter(listing__in=listings.values('pk'))
+    matches = []
+    for listing_id, epoch, days, data in calendars.values_list('listing_id', 'epoch', 'days', 'free_days').iterator():
+        first = (start - epoch).days
+        last = (end - epoch).days
+        if first < 0 or last >= days:
+            continue
+        mask = _mask(first, last)
+        if _to_int(data) & mask == mask:
+            matches.append(listing_id)
+    return matches
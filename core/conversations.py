@@ -0,0 +1,85 @@
+"""Message threads.
+
+Messages about a listing between the same two users form one Conversation.
+Each participant has a ConversationMember row that holds the conversation's
+place in their inbox and how many messages they have not read yet. The
+signals in core.signals keep those rows current:
+
+* before a message is inserted it is attached to its conversation, which is
+  created on first contact;
+* after the insert, one UPDATE moves the conversation to the top of both
+  inboxes and bumps the recipient's unread count.
+
+``mark_read`` clears a member's unread count when they open the thread.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.db.models.functions import Greatest
+
+from .models import Conversation, ConversationMember, Message
+
+# Most messages returned by one "since" poll.
+POLL_LIMIT = 100
+
+
+def _pair(user_id, other_id):
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def get_or_create(listing_id, user_id, other_id):
+    """The conversation about ``listing_id`` between two users, with both member rows."""
+    first, second = _pair(user_id, other_id)
+    lookup = {'listing_id': listing_id, 'first_user_id': first, 'second_user_id': second}
+    conversation = Conversation.objects.filter(**lookup).first()
+    if conversation is not None:
+        return conversation
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(**lookup)
+            ConversationMember.objects.bulk_create([
+                ConversationMember(conversation=conversation, user_id=member_id, other_user_id=other_member_id)
+                for member_id, other_member_id in {(first, second), (second, first)}
+            ])
+    except IntegrityError:
+        # Another request started the same conversation first.
+        conversation = Conversation.objects.get(**lookup)
+    return conversation
+
+
+def attach(message):
+    """Point an unsaved message at its conversation."""
+    if message.conversation_id is None:
+        message.conversation = get_or_create(message.listing_id, message.sender_id, message.recipient_id)
+
+
+def message_sent(message):
+    """Make ``message`` the latest of its conversation and count it as unread for the recipient."""
+    Conversation.objects.filter(pk=message.conversation_id).update(last_message=message, last_message_at=message.created_at)
+    unread = F('unread_count') + (0 if message.is_read else 1)
+    ConversationMember.objects.filter(conversation_id=message.conversation_id).update(
+        last_message_at=message.created_at,
+        unread_count=Case(
+            When(user_id=message.recipient_id, then=unread), default=F('unread_count'), output_field=PositiveIntegerField(),
+        ),
+    )
+
+
+def mark_read(member):
+    """Mark every message ``member`` has received in the conversation as read."""
+    if not member.unread_count:
+        return
+    with transaction.atomic():
+        marked = Message.objects.filter(conversation_id=member.conversation_id, recipient_id=member.user_id, is_read=False).update(is_read=True)
+        # Subtract rather than zero, so a message that arrives meanwhile stays unread.
+        ConversationMember.objects.filter(pk=member.pk).update(unread_count=Greatest(F('unread_count') - marked, 0))
+    member.unread_count = 0
+
+
+def messages_since(conversation_id, after_id=0, limit=POLL_LIMIT):
+    """Messages newer than ``after_id``, oldest first, for incremental polling."""
+    return list(
+        Message.objects.filter(conversation_id=conversation_id, pk__gt=after_id)
+        .select_related('sender')
+        .order_by('pk')[:limit]
+    )
+
@@ -0,0 +1,115 @@
+"""Structured JSON logging written off the request thread.
+
+``event`` logs a named event with keyword fields (user_id, listing_id,
+booking_id, duration_ms, ...), which the JsonFormatter writes as one JSON
+object per line next to the level, logger and time. settings.LOGGING routes
+the core loggers through BackgroundHandler: the calling thread only puts the
+record on a queue, and a QueueListener thread formats it and writes it to a
+rotating file (LOG_FILE) or stderr. The calling thread renders the message
+and traceback and turns non-JSON extra fields into strings before queueing,
+so the writer never calls back into objects (model instances, querysets)
+that could query the database or have changed since the log call; the JSON
+encoding and the write happen on the writer thread.
+
+The listener thread is started when logging is configured; under a
+pre-forking server configure logging after the fork (gunicorn without
+--preload does).
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Records waiting for the writer; beyond this they are dropped and counted
+# rather than blocking requests.
+QUEUE_SIZE = 10000
+# Attributes every LogRecord has; anything else on a record came from ``extra``.
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+# Extra field values json.dumps writes without calling back into the object.
+JSON_TYPES = (str, int, float, bool, type(None))
+
+
+def event(logger, name, level=logging.INFO, exc_info=None, **fields):
+    """Log the event ``name`` with ``fields`` as structured data.
+
+    Field names must not be LogRecord attributes (``created``, ``name``, ``args``, ...).
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, name, exc_info=exc_info, extra={'event': name, **fields}, stacklevel=2)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, then the extra fields."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """Queue records for a writer thread that logs them as JSON lines.
+
+    Writes to ``filename``, rotated at ``max_bytes`` with ``backup_count``
+    old files kept, or to stderr when no filename is given.
+    """
+
+    def __init__(self, filename='', max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        if filename:
+            target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        else:
+            target = logging.StreamHandler(sys.stderr)
+        target.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        self.running = True
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, work on a copy that carries the rendered
+        # message instead of msg and args, and a rendered traceback instead of
+        # frames that would stay alive in the queue; the JSON stays for later.
+        prepared = copy.copy(record)
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        if record.exc_info:
+            prepared.exc_text = logging.Formatter().formatException(record.exc_info)
+        prepared.exc_info = None
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not isinstance(value, JSON_TYPES):
+                setattr(prepared, key, str(value))
+        return prepared
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until the writer has handled every queued record."""
+        if self.running:
+            self.queue.join()
+
+    def close(self):
+        if self.running:
+            self.running = False
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+        super().close()
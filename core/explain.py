@@ -0,0 +1,79 @@
+"""Query-plan checks for the core views.
+
+``capture`` records every statement a block of code sends to the database,
+with its parameters, and ``full_scans`` runs EXPLAIN on each one and reports
+the tables it reads without an index. Only tables that grow with the catalog
+count; scanning a handful of categories or the session row is fine.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+LARGE_TABLES = {
+    'core_availability',
+    'core_booking',
+    'core_conversation',
+    'core_conversationmember',
+    'core_listing',
+    'core_listingcalendar',
+    'core_listingimage',
+    'core_message',
+    'core_ownerstats',
+    'core_review',
+}
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Django aliases joined and subquery tables as "core_listing" U0 / T3.
+ALIAS = re.compile(r'"(\w+)"(?: AS)? "?([UT]\d+)\b"?')
+
+
+@contextmanager
+def capture():
+    """Collect ``(sql, params)`` for every SELECT run inside the block."""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def explain(sql, params):
+    """The plan of one query, as a list of text lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(f"EXPLAIN is not supported on {connection.vendor}")
+
+
+def scanned_tables(sql, plan):
+    """Large tables that ``plan`` reads row by row without an index."""
+    aliases = {alias: table for table, alias in ALIAS.findall(sql)}
+    pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+    tables = set()
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            if table in LARGE_TABLES:
+                tables.add(table)
+    return tables
+
+
+def full_scans(queries):
+    """``(sql, plan, tables)`` for each captured query that scans a large table."""
+    found = []
+    for sql, params in queries:
+        plan = explain(sql, params)
+        tables = scanned_tables(sql, plan)
+        if tables:
+            found.append((sql, plan, sorted(tables)))
+    return found
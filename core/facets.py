@@ -0,0 +1,140 @@
+"""Facet counts for listing searches.
+
+``counts`` groups the listings matching every filter except the facets
+(category, rental type, pricing unit, instant book and price bucket) by all
+five facets at once in one GROUP BY query, and adds the groups up per facet
+in Python. Each facet is counted with its own selection left out, so picking
+a category still shows how many listings the other categories hold, while
+the other selections narrow it as usual. The number of groups is bounded by
+the product of the facet sizes, not by the number of listings. Results are
+cached per normalized filter set for FACET_CACHE_TIMEOUT seconds, so counts
+may lag new listings by that much, like the capped result count.
+"""
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .models import Listing
+from .pagination import count_cache_key
+
+# Lower edges of the price buckets in TSh; the last bucket is open-ended.
+PRICE_BUCKETS = (0, 10000, 50000, 100000, 250000, 500000)
+FACET_CACHE_TIMEOUT = 300
+# Query-string keys that change the order or page of results but not the counts.
+UNFACETED = ('sort', 'cursor')
+# Filters set from facets, in the order of the columns ``_grouped`` returns.
+FACETS = ('category', 'rental_type', 'pricing_unit', 'instant_book', 'price_range')
+
+
+def _price_bucket():
+    return Case(
+        *[When(price__lt=upper, then=Value(index)) for index, upper in enumerate(PRICE_BUCKETS[1:])],
+        default=Value(len(PRICE_BUCKETS) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def price_ranges():
+    """``(low, high)`` per bucket; high is None for the last one."""
+    return list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,)))
+
+
+def selection(filters):
+    """The valid facet selections in ``filters``, as the values ``_grouped`` returns."""
+    category, rental_type, pricing_unit, instant_book, price_range = (filters.get(facet, '') for facet in FACETS)
+    selected = {}
+    if category.isdigit():
+        selected['category'] = int(category)
+    if rental_type in dict(Listing.RENTAL_TYPES):
+        selected['rental_type'] = rental_type
+    if pricing_unit in dict(Listing.PRICING_UNITS):
+        selected['pricing_unit'] = pricing_unit
+    if instant_book == '1':
+        selected['instant_book'] = True
+    if price_range.isdigit() and int(price_range) < len(PRICE_BUCKETS):
+        selected['price_range'] = int(price_range)
+    return selected
+
+
+def apply(listings, filters):
+    """Restrict ``listings`` to the facet selections in ``filters``."""
+    selected = selection(filters)
+    if 'category' in selected:
+        listings = listings.filter(category_id=selected['category'])
+    if 'rental_type' in selected:
+        listings = listings.filter(rental_type=selected['rental_type'])
+    if 'pricing_unit' in selected:
+        listings = listings.filter(pricing_unit=selected['pricing_unit'])
+    if 'instant_book' in selected:
+        listings = listings.filter(instant_book=True)
+    if 'price_range' in selected:
+        low, high = price_ranges()[selected['price_range']]
+        listings = listings.filter(price__gte=low, **({'price__lt': high} if high is not None else {}))
+    return listings
+
+
+def _grouped(listings):
+    return (
+        listings.order_by()
+        .annotate(price_bucket=_price_bucket())
+        .values_list('category_id', 'rental_type', 'pricing_unit', 'instant_book', 'price_bucket')
+        .annotate(n=Count('pk'))
+    )
+
+
+def _tally(rows, selected):
+    facets = {
+        'total': 0,
+        'category': {},
+        'rental_type': dict.fromkeys((value for value, _ in Listing.RENTAL_TYPES), 0),
+        'pricing_unit': dict.fromkeys((value for value, _ in Listing.PRICING_UNITS), 0),
+        'instant_book': 0,
+        'price': [0] * len(PRICE_BUCKETS),
+    }
+    for *values, n in rows:
+        category_id, rental_type, pricing_unit, instant_book, price_bucket = values
+        # A group counts towards a facet when it passes every other facet's selection.
+        missed = [facet for facet, value in zip(FACETS, values) if facet in selected and selected[facet] != value]
+        if len(missed) > 1:
+            continue
+        counted = set(missed) or set(FACETS)
+        if not missed:
+            facets['total'] += n
+        if 'category' in counted:
+            facets['category'][category_id] = facets['category'].get(category_id, 0) + n
+        if 'rental_type' in counted:
+            facets['rental_type'][rental_type] = facets['rental_type'].get(rental_type, 0) + n
+        if 'pricing_unit' in counted:
+            facets['pricing_unit'][pricing_unit] = facets['pricing_unit'].get(pricing_unit, 0) + n
+        if 'instant_book' in counted and instant_book:
+            facets['instant_book'] += n
+        if 'price_range' in counted:
+            facets['price'][price_bucket] += n
+    return facets
+
+
+def cache_key(filters):
+    return count_cache_key('facets', {key: value for key, value in filters.items() if key not in UNFACETED})
+
+
+def counts(listings, filters):
+    """Facet counts for ``filters``, cached under their normalized form.
+
+    ``listings`` must have every filter applied except the facet selections,
+    which are applied per facet here.
+    """
+    key = cache_key(filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = _tally(_grouped(listings), selection(filters))
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+async def acounts(listings, filters):
+    """``counts`` for async views."""
+    key = cache_key(filters)
+    facets = await cache.aget(key)
+    if facets is None:
+        facets = _tally([row async for row in _grouped(listings)], selection(filters))
+        await cache.aset(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,161 @@
+"""Offline geocoding and geohash range queries for listings.
+
+Listing.location stays free text. ``geocode`` matches it against the bundled
+gazetteer (core/data/gazetteer.csv) on whole words, preferring the most
+specific place named, so "Masaki, Dar es Salaam" resolves to Masaki and
+"Mdaraka" matches nothing. The coordinates are stored with a geohash, whose
+prefixes are contiguous key ranges: ``within`` covers a bounding box with a
+handful of prefixes and filters on them through the geohash index, then
+trims to the exact radius with ``distance_km``.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.db.models.functions import Sqrt
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# Most geohash ranges one bounding-box filter may OR together.
+MAX_CELLS = 16
+KM_PER_DEGREE = 111.32
+# More specific places win when a location names several.
+KIND_RANK = {'area': 3, 'town': 2, 'city': 1}
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class Place:
+    def __init__(self, name, kind, latitude, longitude, names):
+        self.name = name
+        self.kind = kind
+        self.latitude = latitude
+        self.longitude = longitude
+        self.names = names
+
+    def __repr__(self):
+        return f'<Place {self.name}>'
+
+
+def _tokens(text):
+    return tuple(TOKEN_RE.findall(text.lower()))
+
+
+@lru_cache(maxsize=None)
+def gazetteer():
+    places = []
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            aliases = [alias for alias in row['aliases'].split('|') if alias]
+            places.append(Place(
+                row['name'], row['kind'], float(row['latitude']), float(row['longitude']),
+                [_tokens(name) for name in [row['name'], *aliases]],
+            ))
+    return places
+
+
+def _contains(words, phrase):
+    return any(words[start:start + len(phrase)] == phrase for start in range(len(words) - len(phrase) + 1))
+
+
+def geocode(text):
+    """The most specific gazetteer place named in ``text``, or None."""
+    words = _tokens(text or '')
+    best, best_rank = None, None
+    for place in gazetteer():
+        for name in place.names:
+            rank = (KIND_RANK.get(place.kind, 0), len(name))
+            if (best_rank is None or rank > best_rank) and _contains(words, name):
+                best, best_rank = place, rank
+    return best
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """The geohash of a point."""
+    bounds = {True: [-180.0, 180.0], False: [-90.0, 90.0]}
+    chars, bits, count, even = [], 0, 0, True
+    while len(chars) < precision:
+        low_high, value = bounds[even], longitude if even else latitude
+        middle = (low_high[0] + low_high[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            low_high[0] = middle
+        else:
+            low_high[1] = middle
+        even = not even
+        count += 1
+        if count == 5:
+            chars.append(BASE32[bits])
+            bits = count = 0
+    return ''.join(chars)
+
+
+def locate(listing):
+    """Set a listing's coordinates and geohash from its location text."""
+    place = geocode(listing.location)
+    if place is None:
+        listing.latitude = listing.longitude = None
+        listing.geohash = ''
+    else:
+        listing.latitude, listing.longitude = place.latitude, place.longitude
+        listing.geohash = encode(place.latitude, place.longitude)
+
+
+def _cell_size(precision):
+    """(latitude, longitude) degrees spanned by one cell."""
+    return 180 / 2 ** (5 * precision // 2), 360 / 2 ** ((5 * precision + 1) // 2)
+
+
+def cover(south, west, north, east, max_cells=MAX_CELLS):
+    """The geohash prefixes of the finest grid that covers the box in at most ``max_cells`` cells."""
+    south, north = max(south, -90.0), min(north, 90.0)
+    west, east = max(west, -180.0), min(east, 180.0)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = _cell_size(precision)
+        rows = range(math.floor((south + 90) / lat_step), math.floor((north + 90) / lat_step) + 1)
+        columns = range(math.floor((west + 180) / lon_step), math.floor((east + 180) / lon_step) + 1)
+        if len(rows) * len(columns) <= max_cells or precision == 1:
+            return sorted({
+                encode(min((row + 0.5) * lat_step - 90, 90.0), min((column + 0.5) * lon_step - 180, 180.0), precision)
+                for row in rows for column in columns
+            })
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) around a point."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - lat_delta, longitude - lon_delta, latitude + lat_delta, longitude + lon_delta
+
+
+def next_prefix(prefix):
+    """The first geohash prefix after every hash starting with ``prefix``; None after 'z...'.
+
+    Built from base32 characters only, so the range ends in the same place
+    under byte order (SQLite) and under locale collations (PostgreSQL),
+    which put punctuation before digits and letters.
+    """
+    stripped = prefix.rstrip(BASE32[-1])
+    if not stripped:
+        return None
+    return stripped[:-1] + BASE32[BASE32.index(stripped[-1]) + 1]
+
+
+def within(south, west, north, east):
+    """Q for listings inside a box: geohash prefix ranges for the index, exact bounds for the edges."""
+    cells = Q()
+    for prefix in cover(south, west, north, east):
+        end = next_prefix(prefix)
+        cells |= Q(geohash__gte=prefix, geohash__lt=end) if end else Q(geohash__gte=prefix)
+    return cells & Q(latitude__range=(south, north), longitude__range=(west, east))
+
+
+def distance_km(latitude, longitude):
+    """Equirectangular distance from a point; well under 1% off at the radii searched."""
+    dx = (F('longitude') - longitude) * math.cos(math.radians(latitude))
+    dy = F('latitude') - latitude
+    return ExpressionWrapper(Sqrt(dx * dx + dy * dy) * KM_PER_DEGREE, output_field=FloatField())
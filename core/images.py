@@ -0,0 +1,186 @@
+"""Listing image processing pipeline.
+
+Uploads are stored as-is inside the request and handed to a small thread pool
+once the transaction commits. Each worker decodes the original with Pillow,
+applies its EXIF orientation, and writes resized WebP and JPEG renditions
+without any metadata. It then records the variants on the ListingImage, so
+templates can serve the smallest rendition that fits, and replaces the
+original with a re-encoded copy that has no metadata either: uploads often
+carry the GPS position they were taken at. The original itself is never
+linked from pages or the API.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import caching
+from .models import Listing, ListingImage
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+# Longest-edge bound of each rendition; originals are never upscaled.
+VARIANT_SIZES = {
+    'thumbnail': 400,
+    'medium': 800,
+    'large': 1600,
+}
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF', 'MPO'}
+MAX_PIXELS = 40_000_000
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+# The stripped original is the source if renditions are ever regenerated.
+ORIGINAL_QUALITY = 95
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PIPELINE_WORKERS, thread_name_prefix='image-pipeline')
+    return _executor
+
+
+def validate_upload(upload):
+    """Reject uploads Pillow cannot identify as a supported raster image."""
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            width, height = image.size
+            image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValidationError(f"{upload.name} is not a valid image.")
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError(f"{upload.name}: {image_format} images are not supported.")
+    if width * height > MAX_PIXELS:
+        raise ValidationError(f"{upload.name} is too large ({width}x{height}).")
+
+
+def schedule(image_id):
+    """Process an image after the current transaction commits."""
+    transaction.on_commit(lambda: submit(image_id))
+
+
+def submit(image_id):
+    if settings.IMAGE_PIPELINE_EAGER:
+        process_image(image_id)
+    else:
+        _get_executor().submit(_run, image_id)
+
+
+def _run(image_id):
+    try:
+        process_image(image_id)
+    except Exception:
+        logger.exception("Image pipeline crashed on image %s", image_id)
+    finally:
+        close_old_connections()
+
+
+def _normalize(image):
+    """Apply EXIF orientation and convert to RGB on a white background."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _resized(image, bound):
+    if max(image.size) <= bound:
+        return image
+    resized = image.copy()
+    resized.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _encode(image, fmt, quality=None):
+    buffer = BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=quality or WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, 'JPEG', quality=quality or JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _variant_path(image_id, name, fmt):
+    extension = 'webp' if fmt == 'webp' else 'jpg'
+    return f'listings/variants/{image_id}/{name}.{extension}'
+
+
+def _strip_original(listing_image, image):
+    """Replace the stored upload with a metadata-free JPEG of ``image``; return its name."""
+    old_name = listing_image.image.name
+    stem = old_name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    name = default_storage.save(f'listings/{stem}.jpg', ContentFile(_encode(image, 'jpeg', ORIGINAL_QUALITY)))
+    if name != old_name:
+        default_storage.delete(old_name)
+    return name
+
+
+def delete_variants(variants):
+    paths = {variant[fmt] for variant in variants.values() for fmt in ('webp', 'jpeg') if variant.get(fmt)}
+    for path in paths:
+        default_storage.delete(path)
+
+
+@task('image.process', max_attempts=3)
+def process_image(image_id):
+    """Generate the renditions of one ListingImage and mark it ready or failed.
+
+    Also runs as the 'image.process' task, which migration 0018 queues for
+    images uploaded before the pipeline existed.
+    """
+    listing_image = ListingImage.objects.filter(pk=image_id).first()
+    if listing_image is None:
+        return
+    try:
+        with listing_image.image.open('rb') as source_file:
+            with Image.open(source_file) as source:
+                if source.format not in ALLOWED_FORMATS:
+                    raise ValueError(f"unsupported format {source.format}")
+                source.load()
+                image = _normalize(source)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        logger.warning("Image %s could not be processed: %s", image_id, e)
+        ListingImage.objects.filter(pk=image_id).update(status='failed')
+        return
+
+    variants = {}
+    previous = None
+    for name, bound in VARIANT_SIZES.items():
+        rendition = _resized(image, bound)
+        if previous and (previous['width'], previous['height']) == rendition.size:
+            # Small originals stop shrinking; reuse the files of the smaller variant.
+            variants[name] = previous
+            continue
+        variant = {'width': rendition.width, 'height': rendition.height}
+        for fmt in ('webp', 'jpeg'):
+            path = _variant_path(image_id, name, fmt)
+            default_storage.delete(path)
+            variant[fmt] = default_storage.save(path, ContentFile(_encode(rendition, fmt)))
+        variants[name] = previous = variant
+
+    fields = {'status': 'ready', 'width': image.width, 'height': image.height, 'variants': variants}
+    if listing_image.status != 'ready':
+        # A ready image's original was stripped when it was first processed;
+        # re-encoding it on every ``process_images --all`` would lose quality.
+        fields['image'] = _strip_original(listing_image, image)
+    ListingImage.objects.filter(pk=image_id).update(**fields)
+    Listing.objects.filter(pk=listing_image.listing_id, primary_image_id=image_id).update(
+        thumbnail_url=default_storage.url(variants['thumbnail']['jpeg']), updated_at=timezone.now(),
+    )
+    caching.invalidate_listing(listing_image.listing_id)
@@ -0,0 +1,265 @@
+"""Per-request performance profiles.
+
+InstrumentationMiddleware keeps a RequestProfile in a context variable for
+the duration of each request. Every database connection gets a query
+wrapper (installed from ``connection_created``) that adds the statement's
+time to the current profile, and the InstrumentedTemplates backend adds the
+time of each top-level render; context variables follow the request through
+sync_to_async, so async views are profiled too. Statements are compared with
+their parameters left out, so a SELECT repeated once per row (a listing
+loop calling ``images.first``) shows up as duplicates.
+
+Finished profiles go into a ring buffer of the last
+INSTRUMENTATION_BUFFER_SIZE requests and into per-view totals that
+``prometheus`` renders in the Prometheus text format. Both are per process.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+from django.utils.functional import LazyObject, empty
+
+from . import eventlog
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Longest SQL kept for the most repeated statement of a request.
+SQL_PREVIEW = 300
+
+_current = ContextVar('request_profile', default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=settings.INSTRUMENTATION_BUFFER_SIZE)
+_totals = {}
+_responses = Counter()
+
+
+def _user_id(request):
+    """The signed-in user's id, if the request already loaded the user; never queries."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, LazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    return getattr(user, 'pk', None)
+
+
+class RequestProfile:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.statements = Counter()
+        self.template_seconds = 0.0
+        self.rendering = False
+
+    def query(self, sql, seconds):
+        self.db_seconds += seconds
+        self.queries += 1
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            self.statements[sql] += 1
+
+    def finish(self, request, response):
+        match = request.resolver_match
+        top_sql, top_count = self.statements.most_common(1)[0] if self.statements else ('', 0)
+        return {
+            'time': timezone.now().isoformat(),
+            'method': self.method,
+            'path': self.path,
+            'view': match.view_name if match else '<unresolved>',
+            'status': response.status_code,
+            'wall_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'queries': self.queries,
+            'duplicate_queries': sum(self.statements.values()) - len(self.statements),
+            'most_repeated_sql': top_sql[:SQL_PREVIEW] if top_count > 1 else None,
+            'most_repeated_count': top_count if top_count > 1 else 0,
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'response_bytes': None if response.streaming else len(response.content),
+            'user_id': _user_id(request),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper timing statements run during a profiled request."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.query(sql, time.perf_counter() - started)
+
+
+def install(sender, connection, **kwargs):
+    """``connection_created`` receiver adding record_query to each new connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        # Nested renders (listing card fragments) are part of the outer one.
+        if profile is None or profile.rendering:
+            return self.template.render(context, request)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_seconds += time.perf_counter() - started
+            profile.rendering = False
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """The Django template backend, timing renders into the current request's profile."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+def _store(entry):
+    key = (entry['view'], entry['method'])
+    with _lock:
+        _recent.append(entry)
+        _responses[(*key, entry['status'])] += 1
+        totals = _totals.get(key)
+        if totals is None:
+            totals = _totals[key] = {
+                'count': 0, 'wall': 0.0, 'db': 0.0, 'queries': 0, 'duplicates': 0, 'template': 0.0, 'bytes': 0,
+                'buckets': [0] * len(DURATION_BUCKETS),
+            }
+        wall = entry['wall_ms'] / 1000
+        totals['count'] += 1
+        totals['wall'] += wall
+        totals['db'] += entry['db_ms'] / 1000
+        totals['queries'] += entry['queries']
+        totals['duplicates'] += entry['duplicate_queries']
+        totals['template'] += entry['template_ms'] / 1000
+        totals['bytes'] += entry['response_bytes'] or 0
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if wall <= bound:
+                totals['buckets'][index] += 1
+    slow = entry['wall_ms'] >= settings.INSTRUMENTATION_SLOW_MS
+    if slow or settings.LOG_REQUESTS:
+        eventlog.event(
+            logger, 'http.request.slow' if slow else 'http.request', level=logging.WARNING if slow else logging.INFO,
+            method=entry['method'], path=entry['path'], view=entry['view'], status=entry['status'],
+            duration_ms=entry['wall_ms'], db_ms=entry['db_ms'], queries=entry['queries'],
+            duplicate_queries=entry['duplicate_queries'], template_ms=entry['template_ms'], user_id=entry['user_id'],
+        )
+
+
+class InstrumentationMiddleware:
+    """Profile every request; disabled with settings.INSTRUMENTATION = False."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile(request.method, request.path)
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _store(profile.finish(request, response))
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile(request.method, request.path)
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _store(profile.finish(request, response))
+        return response
+
+
+def recent(view=None):
+    """Profiles in the ring buffer, newest first, optionally for one view name."""
+    with _lock:
+        entries = list(_recent)
+    return [entry for entry in reversed(entries) if view is None or entry['view'] == view]
+
+
+def reset():
+    with _lock:
+        _recent.clear()
+        _totals.clear()
+        _responses.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def prometheus():
+    """Per-view request totals in the Prometheus text exposition format."""
+    with _lock:
+        totals = {key: {**value, 'buckets': list(value['buckets'])} for key, value in _totals.items()}
+        responses = dict(_responses)
+
+    lines = [
+        '# HELP edalali_http_responses_total Responses by view, method and status.',
+        '# TYPE edalali_http_responses_total counter',
+    ]
+    for (view, method, status), count in sorted(responses.items()):
+        lines.append(f'edalali_http_responses_total{_labels(view=view, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP edalali_http_request_duration_seconds Wall time of requests by view.',
+        '# TYPE edalali_http_request_duration_seconds histogram',
+    ]
+    for (view, method), value in sorted(totals.items()):
+        for bound, count in zip(DURATION_BUCKETS, value['buckets']):
+            lines.append(f'edalali_http_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {count}')
+        lines.append(f'edalali_http_request_duration_seconds_bucket{_labels(view=view, method=method, le="+Inf")} {value["count"]}')
+        lines.append(f'edalali_http_request_duration_seconds_sum{_labels(view=view, method=method)} {value["wall"]:.6f}')
+        lines.append(f'edalali_http_request_duration_seconds_count{_labels(view=view, method=method)} {value["count"]}')
+
+    counters = (
+        ('db_duration_seconds', 'db', 'Time spent in SQL.', '.6f'),
+        ('db_queries', 'queries', 'SQL statements run.', 'd'),
+        ('db_duplicate_queries', 'duplicates', 'SELECTs repeated within a request, parameters aside.', 'd'),
+        ('template_duration_seconds', 'template', 'Time spent rendering templates.', '.6f'),
+        ('response_bytes', 'bytes', 'Bytes of non-streaming response bodies.', 'd'),
+    )
+    for name, field, help_text, number_format in counters:
+        lines += [f'# HELP edalali_http_{name}_total {help_text}', f'# TYPE edalali_http_{name}_total counter']
+        for (view, method), value in sorted(totals.items()):
+            lines.append(f'edalali_http_{name}_total{_labels(view=view, method=method)} {value[field]:{number_format}}')
+    return '\n'.join(lines) + '\n'
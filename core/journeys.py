@@ -0,0 +1,309 @@
+"""Replay user journeys for the bench_journeys command.
+
+A journey mix is a JSONL file, one journey per line: a name, a weight and the
+steps a visitor takes (core/data/journeys.jsonl is the default). Steps are
+plain names or objects with a ``step`` key plus arguments, e.g.
+``{"step": "listings", "params": {"sort": "rating"}}``. Virtual users replay
+journeys drawn from the mix either in-process through the test client, which
+also counts each request's queries, or over HTTP against a running server.
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .benchmark import BENCH_PASSWORD, TITLE_WORDS, summarize
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = Path(__file__).resolve().parent / 'data' / 'journeys.jsonl'
+STEPS = ('home', 'listings', 'search', 'detail', 'login', 'book', 'pay', 'review', 'dashboard', 'messages')
+HTTP_TIMEOUT = 30
+
+
+class Journey:
+    def __init__(self, name, weight, steps):
+        self.name = name
+        self.weight = weight
+        self.steps = steps
+
+    def __repr__(self):
+        return f'<Journey {self.name}>'
+
+
+def load_mix(path=DEFAULT_MIX):
+    """Parse a journey mix; raises ValueError on malformed lines or unknown steps."""
+    journeys = []
+    with open(path, encoding='utf-8') as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                steps = [step if isinstance(step, dict) else {'step': step} for step in data['steps']]
+                journey = Journey(data['name'], data.get('weight', 1), steps)
+            except (KeyError, TypeError, json.JSONDecodeError) as e:
+                raise ValueError(f"line {number}: {e!r}")
+            unknown = {step.get('step') for step in steps} - set(STEPS)
+            if unknown:
+                raise ValueError(f"line {number}: unknown steps {sorted(map(str, unknown))}")
+            journeys.append(journey)
+    if not journeys:
+        raise ValueError("no journeys")
+    return journeys
+
+
+class Recorder:
+    """Thread-safe latency, query and error samples keyed by "METHOD url_name"."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = Counter()
+        self.outcomes = Counter()
+
+    def add(self, method, path, status, elapsed, queries):
+        view = f'{method} {resolve(path).url_name}'
+        with self.lock:
+            if status is None or status >= 400:
+                self.errors[view] += 1
+            else:
+                self.samples.setdefault(view, []).append((elapsed, queries))
+
+    def count(self, outcome):
+        with self.lock:
+            self.outcomes[outcome] += 1
+
+    def report(self, seconds):
+        views = {}
+        for view in sorted(set(self.samples) | set(self.errors)):
+            rows = self.samples.get(view, [])
+            stats = summarize([elapsed for elapsed, _ in rows]) if rows else {'p50': None, 'p95': None, 'p99': None}
+            queries = [count for _, count in rows if count is not None]
+            views[view] = {
+                'requests': len(rows),
+                'errors': self.errors[view],
+                'p50': stats['p50'],
+                'p95': stats['p95'],
+                'p99': stats['p99'],
+                'queries': sum(queries) / len(queries) if queries else None,
+            }
+        requests = sum(view['requests'] for view in views.values())
+        return {
+            'requests': requests,
+            'errors': sum(self.errors.values()),
+            'seconds': seconds,
+            'throughput': requests / seconds if seconds else 0,
+            'outcomes': dict(self.outcomes),
+            'views': views,
+        }
+
+
+class ClientTransport:
+    """In-process requests through the test client; counts each request's queries."""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.client = Client()
+
+    def login(self, user):
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.post(path, data or {}) if method == 'POST' else self.client.get(path, data or {})
+            elapsed = (time.perf_counter() - started) * 1000
+        self.recorder.add(method, path, response.status_code, elapsed, len(queries))
+        return response.status_code
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Report redirects as responses, like the test client, instead of timing the next page too."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Requests to a running server, with a cookie jar for the session and CSRF token."""
+
+    def __init__(self, recorder, base_url):
+        self.recorder = recorder
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def login(self, user):
+        self.request('GET', reverse('login'))
+        self.request('POST', reverse('login'), {'username': user.username, 'password': BENCH_PASSWORD})
+
+    def request(self, method, path, data=None):
+        url, body, headers = self.base_url + path, None, {}
+        if method == 'POST':
+            body = urlencode(data or {}).encode()
+            csrf_token = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+            headers = {'Content-Type': 'application/x-www-form-urlencoded', 'X-CSRFToken': csrf_token}
+        elif data:
+            url += '?' + urlencode(data)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(url, data=body, headers=headers, method=method), timeout=HTTP_TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        except (URLError, OSError):
+            status = None
+        self.recorder.add(method, path, status, (time.perf_counter() - started) * 1000, None)
+        return status
+
+
+class Visitor:
+    """One virtual user walking through a journey's steps."""
+
+    def __init__(self, transport, user, catalog, rng):
+        self.transport = transport
+        self.user = user
+        self.catalog = catalog
+        self.rng = rng
+        self.listing_id = None
+        self.booking = None
+
+    def walk(self, journey):
+        for step in journey.steps:
+            getattr(self, f"step_{step['step']}")(step)
+
+    def _get(self, name, *args, params=None):
+        return self.transport.request('GET', reverse(name, args=args), params)
+
+    def _post(self, name, *args, data=None):
+        return self.transport.request('POST', reverse(name, args=args), data)
+
+    def step_home(self, step):
+        self._get('home')
+
+    def step_listings(self, step):
+        self._get('listing_list', params=step.get('params'))
+
+    def step_search(self, step):
+        self._get('listing_list', params={'q': step.get('q') or self.rng.choice(TITLE_WORDS)})
+
+    def step_detail(self, step):
+        self.listing_id = step.get('listing') or self.rng.choice(self.catalog['listing_ids'])
+        self._get('listing_detail', self.listing_id)
+
+    def step_login(self, step):
+        self.transport.login(self.user)
+
+    def step_book(self, step):
+        listing_id = self.listing_id or self.rng.choice(self.catalog['listing_ids'])
+        window_start, window_end = self.catalog['availability'][listing_id]
+        start = max(window_start, timezone.localdate() + timedelta(days=1))
+        start += timedelta(days=self.rng.randint(0, max((window_end - start).days - 1, 0)))
+        end = min(start + timedelta(days=self.rng.randint(1, 3)), window_end)
+        self._get('book_listing', listing_id)
+        self._post('book_listing', listing_id, data={'start_date': start.isoformat(), 'end_date': end.isoformat()})
+        # The harness shares the database, so it can find the booking the form created.
+        self.booking = Booking.objects.filter(listing_id=listing_id, renter=self.user, start_date=start).first()
+        self.transport.recorder.count('booked' if self.booking else 'booking rejected')
+
+    def step_pay(self, step):
+        if self.booking is None:
+            return
+        self._get('pay_booking', self.booking.pk)
+        self._post('pay_booking', self.booking.pk)
+
+    def step_review(self, step):
+        if self.booking is None:
+            return
+        if self.booking.status != 'confirmed':
+            # The owner accepting the request is not part of the renter's journey.
+            self.booking.refresh_from_db()
+            self.booking.status = 'confirmed'
+            self.booking.save()
+        self._get('leave_review', self.booking.pk)
+        self._post('leave_review', self.booking.pk, data={'rating': self.rng.randint(3, 5), 'comment': 'Benchmark review.'})
+        self.transport.recorder.count('reviewed')
+
+    def step_dashboard(self, step):
+        self._get('dashboard')
+
+    def step_messages(self, step):
+        self._get('messages')
+
+
+def replay(journeys, users, catalog, journey_count, concurrency, seed=0, base_url=None):
+    """Replay ``journey_count`` journeys drawn from the mix on ``concurrency`` threads.
+
+    ``catalog`` holds the seeded ``listing_ids`` and each listing's
+    ``availability`` window. Returns the Recorder report.
+    """
+    rng = random.Random(seed)
+    pending = queue.SimpleQueue()
+    for number, journey in enumerate(rng.choices(journeys, weights=[journey.weight for journey in journeys], k=journey_count)):
+        pending.put((number, journey))
+    recorder = Recorder()
+
+    def worker():
+        try:
+            while True:
+                try:
+                    number, journey = pending.get_nowait()
+                except queue.Empty:
+                    return
+                transport = HttpTransport(recorder, base_url) if base_url else ClientTransport(recorder)
+                visitor = Visitor(transport, users[number % len(users)], catalog, random.Random(seed + number))
+                try:
+                    visitor.walk(journey)
+                    recorder.count('completed')
+                except Exception:
+                    logger.exception("Journey %s failed", journey.name)
+                    recorder.count('failed')
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - started)
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of ``report`` against a saved baseline report, as messages.
+
+    A view regresses when it fails more often, runs more queries per request,
+    or when its p95 latency grows by more than ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for view, before in baseline['views'].items():
+        after = report['views'].get(view)
+        if after is None:
+            continue
+        if after['errors'] > before['errors']:
+            regressions.append(f"{view}: {before['errors']} -> {after['errors']} errors")
+        if before['queries'] is not None and after['queries'] is not None and after['queries'] > before['queries'] + 0.01:
+            regressions.append(f"{view}: {before['queries']:.1f} -> {after['queries']:.1f} queries per request")
+        if before['p95'] and after['p95'] and after['p95'] > before['p95'] * (1 + tolerance):
+            regressions.append(f"{view}: p95 {before['p95']:.1f} -> {after['p95']:.1f} ms")
+    return regressions
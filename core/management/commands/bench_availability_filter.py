@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+
+from core import calendars
+from core.benchmark import measure, rolled_back, seed_catalog
+from core.booking import filter_bookable
+from core.models import Listing
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure listing_list latency with a start/end filter across catalog sizes, and time the "
+        "EXISTS filter it uses against the calendar bitmap filter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help="Comma-separated catalog sizes.")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        today = timezone.localdate()
+        start, end = today + timedelta(days=20), today + timedelta(days=23)
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        client = Client()
+
+        self.stdout.write(
+            f"{'listings':>10} {'page p50':>10} {'page p95':>10} {'exists p50':>11} {'bitmap p50':>11} "
+            f"{'exists':>8} {'bitmap':>8}"
+        )
+        for seed, size in enumerate(sizes):
+            with rolled_back():
+                listing_ids = seed_catalog(size, seed=seed)
+                # seed_catalog skips the signals that would build the calendars.
+                for listing_id in listing_ids:
+                    calendars.rebuild_calendar(listing_id)
+                cache.clear()
+                client.get('/listings/', params)  # warm up, fills the count cache
+                page = measure(lambda: client.get('/listings/', params), options['repeat'])
+
+                candidates = Listing.objects.filter(is_available=True)
+                exists = measure(
+                    lambda: list(filter_bookable(candidates, start, end).values_list('pk', flat=True)), options['repeat'],
+                )
+                bitmap = measure(lambda: calendars.free_listing_ids(start, end, candidates), options['repeat'])
+                # Not the same question: EXISTS accepts any overlapping availability, the
+                # bitmap only listings free on every day, so the bitmap count is smaller.
+                exists_count = filter_bookable(candidates, start, end).count()
+                bitmap_count = len(calendars.free_listing_ids(start, end, candidates))
+            self.stdout.write(
+                f"{size:>10} {page['p50']:>10.1f} {page['p95']:>10.1f} {exists['p50']:>11.1f} {bitmap['p50']:>11.1f} "
+                f"{exists_count:>8} {bitmap_count:>8}"
+            )
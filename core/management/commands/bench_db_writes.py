@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from core.benchmark import summarize
+from core.models import Listing, Message
+
+# (journal_mode, synchronous) pairs compared on SQLite; the first is the
+# stock SQLite configuration the project used to run with.
+SQLITE_MODES = {
+    'rollback': ('DELETE', 'FULL'),
+    'wal': ('WAL', 'NORMAL'),
+}
+HOT_LISTINGS = 20
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent write throughput on the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--modes', default=','.join(SQLITE_MODES), help="SQLite journal modes to compare.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database: {settings.DATABASES['default']['ENGINE']} {settings.DATABASES['default']['NAME']}")
+        owner, renter, listing_ids = self._setup()
+        try:
+            self.stdout.write(f"{'mode':<10} {'threads':>7} {'commits/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+            if connection.vendor == 'sqlite':
+                original = self._pragma('journal_mode')
+                try:
+                    for mode in options['modes'].split(','):
+                        self._run(mode, SQLITE_MODES[mode], owner, renter, listing_ids, options)
+                finally:
+                    self._pragma('journal_mode', original)
+            else:
+                self._run(connection.vendor, None, owner, renter, listing_ids, options)
+        finally:
+            owner.delete()
+            renter.delete()
+
+    def _setup(self):
+        owner = User.objects.create_user('bench-writes-owner')
+        renter = User.objects.create_user('bench-writes-renter')
+        listing_ids = [
+            Listing.objects.create(
+                title=f'Write benchmark {number}', description='Synthetic benchmark listing.',
+                rental_type='equipment', owner=owner, price=1000, location='Dar es Salaam',
+            ).pk
+            for number in range(HOT_LISTINGS)
+        ]
+        return owner, renter, listing_ids
+
+    def _pragma(self, name, value=None):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}' if value is None else f'PRAGMA {name}={value}')
+            row = cursor.fetchone()
+        return row and row[0]
+
+    def _run(self, mode, pragmas, owner, renter, listing_ids, options):
+        if pragmas:
+            # journal_mode is stored in the database file, so set it once here.
+            connection.close()
+            self._pragma('journal_mode', pragmas[0])
+        deadline = time.perf_counter() + options['seconds']
+        samples, locked = [], [0]
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            if pragmas:
+                self._pragma('synchronous', pragmas[1])
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        # A message plus a hot-row update: the shape of booking and inbox writes.
+                        with transaction.atomic():
+                            listing_id = rng.choice(listing_ids)
+                            Message.objects.create(sender=renter, recipient=owner, listing_id=listing_id, content='Write benchmark.')
+                            Listing.objects.filter(pk=listing_id).update(booking_version=F('booking_version') + 1)
+                    except OperationalError:
+                        with lock:
+                            locked[0] += 1
+                        continue
+                    with lock:
+                        samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        stats = summarize(samples) if samples else {'p50': 0, 'p99': 0}
+        self.stdout.write(
+            f"{mode:<10} {options['threads']:>7} {len(samples) / elapsed:>10.0f} {stats['p50']:>8.1f} {stats['p99']:>8.1f} {locked[0]:>7}"
+        )
@@ -0,0 +1,172 @@
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import seed_catalog, summarize
+from core.models import Category
+
+# Seed used for the catalog this command commits and removes again; the
+# servers run in other processes, so a rolled-back transaction is invisible to them.
+SEED = 19
+STARTUP_TIMEOUT = 30
+SERVERS = {
+    'wsgi': ('gunicorn', False),
+    'asgi': ('uvicorn', True),
+}
+
+
+def _server_command(server, port, workers, threads):
+    if server == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'edalali.wsgi:application', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads), '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'edalali.asgi:application', '--port', str(port),
+        '--workers', str(workers), '--no-access-log', '--log-level', 'warning',
+    ]
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response; return its status and whether the server closes the connection."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    return int(status_line.split()[1]), headers.get('connection') == 'close'
+
+
+async def _client(host, port, paths, deadline, samples, errors, offset, bust_cache):
+    """One keep-alive connection issuing requests back to back until ``deadline``."""
+    connection = None
+    number = offset
+    while time.perf_counter() < deadline:
+        path = paths[number % len(paths)]
+        if bust_cache:
+            path += f"{'&' if '?' in path else '?'}_={number}"
+        number += 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n'.encode())
+            await writer.drain()
+            status, closed = await _read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors['connection'] += 1
+            connection = None
+            continue
+        if closed:
+            connection[1].close()
+            connection = None
+        if status == 200:
+            samples.append((time.perf_counter() - started) * 1000)
+        else:
+            errors[status] = errors.get(status, 0) + 1
+    if connection is not None:
+        connection[1].close()
+
+
+async def _load(host, port, paths, concurrency, seconds, bust_cache):
+    deadline = time.perf_counter() + seconds
+    samples, errors = [], {'connection': 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, paths, deadline, samples, errors, offset, bust_cache) for offset in range(concurrency)
+    ))
+    return samples, errors, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Compare requests/s of the public pages served by gunicorn (WSGI) and uvicorn (ASGI)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default=','.join(SERVERS), help="Comma-separated subset of: wsgi, asgi.")
+        parser.add_argument('--concurrency', type=int, default=500, help="Open connections.")
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes per server.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker.")
+        parser.add_argument('--port', type=int, default=8019)
+        parser.add_argument('--listings', type=int, default=2000, help="Listings to seed for the run.")
+        parser.add_argument('--bust-cache', action='store_true', help="Make every URL unique so the page cache never hits.")
+        parser.add_argument('--url', help="Benchmark an already running server at this base URL instead.")
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(',')
+        for server in servers:
+            if server not in SERVERS:
+                raise CommandError(f"Unknown server {server!r}; choose from {', '.join(SERVERS)}.")
+            module = SERVERS[server][0]
+            if not options['url'] and importlib.util.find_spec(module) is None:
+                raise CommandError(f"{module} is not installed; pip install -r requirements_fixed.txt")
+        if settings.DATABASES['default']['ENGINE'].endswith('sqlite3') and options['concurrency'] > 100:
+            self.stdout.write(self.style.WARNING("SQLite serializes connections; use DB_ENGINE=postgresql for representative numbers."))
+
+        try:
+            listing_ids = seed_catalog(options['listings'], seed=SEED)
+            category = Category.objects.filter(slug__startswith=f'bench-{SEED}-').first()
+            paths = ['/', '/listings/', f'/listings/?category={category.pk}'] + [f'/listing/{pk}/' for pk in listing_ids[:20]]
+            self.stdout.write(f"{'server':<8} {'conns':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            if options['url']:
+                self._bench('url', options['url'], paths, options)
+            else:
+                for server in servers:
+                    self._run_server(server, paths, options)
+        finally:
+            # Deleting the owner removes the seeded listings with it.
+            Category.objects.filter(slug__startswith=f'bench-{SEED}-').delete()
+            User.objects.filter(username__in=[f'bench-owner-{SEED}', f'bench-renter-{SEED}']).delete()
+
+    def _run_server(self, server, paths, options):
+        env = {**os.environ, 'ASYNC_VIEWS': str(SERVERS[server][1])}
+        process = subprocess.Popen(
+            _server_command(server, options['port'], options['workers'], options['threads']),
+            cwd=settings.BASE_DIR, env=env,
+        )
+        try:
+            self._wait_until_up('127.0.0.1', options['port'], process)
+            self._bench(server, f"http://127.0.0.1:{options['port']}", paths, options)
+        finally:
+            process.terminate()
+            process.wait()
+
+    def _wait_until_up(self, host, port, process):
+        deadline = time.perf_counter() + STARTUP_TIMEOUT
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with status {process.returncode}")
+            samples, _, _ = asyncio.run(_load(host, port, ['/'], 1, 0.01, False))
+            if samples:
+                return
+            time.sleep(0.2)
+        raise CommandError(f"Server did not answer on port {port} within {STARTUP_TIMEOUT}s")
+
+    def _bench(self, name, url, paths, options):
+        host, _, port = url.split('://', 1)[-1].rstrip('/').partition(':')
+        samples, errors, elapsed = asyncio.run(
+            _load(host, int(port or 80), paths, options['concurrency'], options['seconds'], options['bust_cache'])
+        )
+        stats = summarize(samples) if samples else {'p50': 0, 'p99': 0}
+        failed = sum(errors.values())
+        self.stdout.write(
+            f"{name:<8} {options['concurrency']:>6} {len(samples) / elapsed:>8.0f} {stats['p50']:>8.1f} {stats['p99']:>8.1f} {failed:>7}"
+        )
+        if failed:
+            self.stdout.write(f"    errors: {errors}")
@@ -0,0 +1,98 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from core import journeys
+from core.benchmark import seed_activity, seed_catalog
+from core.models import Availability, Booking, Category, Listing, Message, Task
+
+# Seed used for the data this command commits and removes again; worker
+# threads and servers use their own connections, so a rolled-back
+# transaction would be invisible to them.
+SEED = 23
+
+
+def _ms(value):
+    return f'{value:.1f}' if value is not None else '-'
+
+
+class Command(BaseCommand):
+    help = "Replay browse/search/book/pay/review journeys and report latency and queries per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=str(journeys.DEFAULT_MIX), help="JSONL journey mix to replay.")
+        parser.add_argument('--journeys', type=int, default=200, help="Journeys to replay.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Virtual users replaying at once.")
+        parser.add_argument('--listings', type=int, default=2000, help="Listings to seed.")
+        parser.add_argument('--renters', type=int, default=50, help="Renter accounts to seed.")
+        parser.add_argument('--url', help="Replay over HTTP against a running server at this base URL instead of the test client.")
+        parser.add_argument('--save', help="Write the report as a JSON baseline to this path.")
+        parser.add_argument('--compare', help="Compare with a saved baseline and fail on regressions.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 growth over the baseline, as a fraction.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = journeys.load_mix(options['mix'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read journey mix {options['mix']}: {e}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+
+        try:
+            listing_ids = seed_catalog(options['listings'], seed=SEED)
+            users = seed_activity(listing_ids, options['renters'], seed=SEED)
+            catalog = {
+                'listing_ids': listing_ids,
+                'availability': {
+                    listing_id: (start, end)
+                    for listing_id, start, end in Availability.objects.filter(listing_id__in=listing_ids).values_list('listing_id', 'start_date', 'end_date')
+                },
+            }
+            report = journeys.replay(
+                mix, users, catalog, options['journeys'], options['concurrency'], seed=SEED, base_url=options['url'],
+            )
+        finally:
+            # The replayed requests queued confirmation, receipt and notification
+            # tasks for seeded rows; they would fail once those rows are gone.
+            listings = Listing.objects.filter(owner__username=f'bench-owner-{SEED}')
+            Task.objects.filter(
+                Q(payload__booking_id__in=Booking.objects.filter(listing__in=listings).values('pk'))
+                | Q(payload__message_id__in=Message.objects.filter(listing__in=listings).values('pk'))
+            ).delete()
+            # Deleting the users removes the seeded listings, bookings and messages with them.
+            Category.objects.filter(slug__startswith=f'bench-{SEED}-').delete()
+            User.objects.filter(username__in=[f'bench-owner-{SEED}', f'bench-renter-{SEED}']).delete()
+            User.objects.filter(username__startswith=f'bench-user-{SEED}-').delete()
+
+        report['settings'] = {key: options[key] for key in ('mix', 'journeys', 'concurrency', 'listings', 'renters', 'url')}
+        self._print(report)
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline written to {options['save']}")
+        if baseline is not None:
+            if baseline.get('settings') != report['settings']:
+                self.stdout.write(self.style.WARNING(f"Baseline settings differ: {baseline.get('settings')}"))
+            regressions = journeys.compare(report, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def _print(self, report):
+        self.stdout.write(f"{'view':<28} {'reqs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+        for view, stats in report['views'].items():
+            queries = f"{stats['queries']:.1f}" if stats['queries'] is not None else '-'
+            self.stdout.write(
+                f"{view:<28} {stats['requests']:>6} {_ms(stats['p50']):>8} {_ms(stats['p95']):>8} {_ms(stats['p99']):>8} "
+                f"{queries:>8} {stats['errors']:>7}"
+            )
+        self.stdout.write(
+            f"{report['requests']} requests in {report['seconds']:.1f}s ({report['throughput']:.0f} req/s), "
+            f"{report['errors']} errors; journeys: {report['outcomes']}"
+        )
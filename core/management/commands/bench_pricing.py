@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import pricing
+from core.benchmark import measure, rolled_back, seed_catalog
+from core.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Compare per-listing Decimal quotes with the batch SQL annotation."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        start = timezone.localdate() + timedelta(days=1)
+        end = start + timedelta(days=3)
+
+        with rolled_back():
+            seed_catalog(options['listings'])
+            rows = list(Listing.objects.values_list('price', 'pricing_unit'))
+            modes = {
+                'python': lambda: [pricing.quote(price, unit, start, end) for price, unit in rows],
+                'sql': lambda: list(pricing.annotate_quotes(Listing.objects.all(), start, end).values_list('pk', 'quote_cents')),
+            }
+            self.stdout.write(f"{'mode':<8} {'listings':>9} {'p50 ms':>10} {'p95 ms':>10}")
+            for mode, func in modes.items():
+                stats = measure(func, options['repeat'])
+                self.stdout.write(f"{mode:<8} {len(rows):>9} {stats['p50']:>10.1f} {stats['p95']:>10.1f}")
@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify
+
+from core import slugs
+from core.benchmark import BATCH_SIZE, rolled_back, summarize
+from core.models import Listing
+
+TITLE = 'Canon EOS Camera'
+
+
+def _listing(owner, slug):
+    return Listing(
+        title=TITLE, slug=slug, description='Synthetic benchmark listing.', rental_type='equipment',
+        owner=owner, price=10000, location='Dar es Salaam',
+    )
+
+
+class Command(BaseCommand):
+    help = "Time slug allocation for many listings that share one title."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000)
+        parser.add_argument('--naive', type=int, default=1000, help="Rows for the exists()-loop baseline.")
+
+    def handle(self, *args, **options):
+        count = options['count']
+        self.stdout.write(f"{'mode':<10} {'rows':>8} {'total s':>9} {'first 10% p50 us':>17} {'last 10% p50 us':>16}")
+
+        with rolled_back():
+            owner = User.objects.create_user('bench-slugs')
+            samples, pending = [], []
+            for _ in range(count):
+                started = time.perf_counter()
+                pending.append(_listing(owner, slugs.allocate(Listing, TITLE)))
+                samples.append((time.perf_counter() - started) * 1e6)
+                if len(pending) == BATCH_SIZE:
+                    Listing.objects.bulk_create(pending)
+                    pending = []
+            Listing.objects.bulk_create(pending)
+            self._report('single', samples)
+
+        with rolled_back():
+            owner = User.objects.create_user('bench-slugs')
+            started = time.perf_counter()
+            allocated = slugs.allocate_many(Listing, [TITLE] * count)
+            elapsed = time.perf_counter() - started
+            Listing.objects.bulk_create([_listing(owner, slug) for slug in allocated], batch_size=BATCH_SIZE)
+            self.stdout.write(f"{'batch':<10} {count:>8} {elapsed:>9.2f} {'-':>17} {'-':>16}")
+
+        with rolled_back():
+            owner = User.objects.create_user('bench-slugs')
+            samples = []
+            base = slugify(TITLE)
+            for _ in range(options['naive']):
+                started = time.perf_counter()
+                slug, number = base, 1
+                while Listing.objects.filter(slug=slug).exists():
+                    number += 1
+                    slug = f'{base}-{number}'
+                _listing(owner, slug).save()
+                samples.append((time.perf_counter() - started) * 1e6)
+            self._report('naive', samples)
+
+    def _report(self, mode, samples):
+        window = max(len(samples) // 10, 1)
+        first = summarize(samples[:window])['p50']
+        last = summarize(samples[-window:])['p50']
+        self.stdout.write(f"{mode:<10} {len(samples):>8} {sum(samples) / 1e6:>9.2f} {first:>17.0f} {last:>16.0f}")
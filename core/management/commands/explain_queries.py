@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core import conversations, explain, ratings
+from core.benchmark import BATCH_SIZE, rolled_back, seed_catalog
+from core.models import Booking, Category, Listing, ListingImage, Message, Review
+
+# Listings per owner. The checked owner gets the first batch; the rest of the
+# catalog is spread over background owners so the planner statistics see a
+# realistic owner_id distribution rather than one owner holding everything.
+OWNED_LISTINGS = 20
+# The capped listing count stops after COUNT_LIMIT rows, and the facet counts
+# group every match. Without a selective filter nearly every listing matches,
+# so reading the table is the cheapest way.
+CAPPED_COUNT = {'core_listing'}
+
+
+def _requests(listing_id, category, booking_id, conversation_id):
+    today = timezone.localdate()
+    dates = {'start': (today + timedelta(days=20)).isoformat(), 'end': (today + timedelta(days=23)).isoformat()}
+    return [
+        ('anonymous', reverse('home'), {}, set()),
+        ('anonymous', reverse('listing_list'), {}, CAPPED_COUNT),
+        ('anonymous', reverse('listing_list'), {'category': category.pk}, set()),
+        ('anonymous', reverse('listing_list'), {'category': category.pk, 'max_price': '50000'}, set()),
+        ('anonymous', reverse('listing_list'), {'max_price': '50000'}, set()),
+        ('anonymous', reverse('listing_list'), {'sort': 'rating'}, CAPPED_COUNT),
+        ('anonymous', reverse('listing_list'), {'min_rating': '4'}, set()),
+        ('anonymous', reverse('listing_list'), {'category': category.pk, 'rental_type': 'equipment', 'price_range': '1'}, set()),
+        ('anonymous', reverse('listing_list'), {'near': 'Arusha'}, set()),
+        ('anonymous', reverse('listing_list'), {'lat': '-6.80', 'lng': '39.25', 'radius': '5'}, set()),
+        ('anonymous', reverse('listing_list'), {'bbox': '36.5,-3.5,36.8,-3.2', 'sort': 'rating'}, set()),
+        ('anonymous', reverse('listing_list'), dates, CAPPED_COUNT),
+        ('anonymous', reverse('listing_list'), {'q': 'Canon'}, set()),
+        ('anonymous', reverse('listing_list'), {'q': 'Canon', 'category': category.pk, 'rental_type': 'equipment'}, set()),
+        ('anonymous', reverse('listing_list_json'), {'category': category.pk, **dates}, set()),
+        ('anonymous', reverse('listing_detail', args=[listing_id]), {}, set()),
+        ('anonymous', reverse('listing_calendar', args=[listing_id]), {}, set()),
+        ('anonymous', reverse('api_listing_list'), {'category': category.slug}, set()),
+        ('anonymous', reverse('api_listing_detail', args=[listing_id]), {}, set()),
+        ('anonymous', reverse('api_listing_availability', args=[listing_id]), {}, set()),
+        ('anonymous', reverse('api_listing_reviews', args=[listing_id]), {}, set()),
+        ('owner', reverse('dashboard'), {}, set()),
+        ('owner', reverse('messages'), {}, set()),
+        ('owner', reverse('conversation', args=[conversation_id]), {}, set()),
+        ('owner', reverse('conversation_messages_json', args=[conversation_id]), {'since': 0}, set()),
+        ('owner', reverse('export_listings'), {}, set()),
+        ('renter', reverse('dashboard'), {}, set()),
+        ('renter', reverse('messages'), {}, set()),
+        ('renter', reverse('book_listing', args=[listing_id]), {}, set()),
+        ('renter', reverse('pay_booking', args=[booking_id]), {}, set()),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN every query of the core views on a seeded catalog and fail on full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=20000)
+        parser.add_argument('--verbose-plans', action='store_true', help="Print the plan of every query.")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            failures = self._check(options['listings'], options['verbose_plans'])
+        if failures:
+            raise CommandError(f"{failures} queries scan a large table without an index.")
+        self.stdout.write(self.style.SUCCESS("No full table scans."))
+
+    def _seed(self, listings):
+        """Seed a large catalog plus one ordinary owner and renter to check the views as."""
+        listing_ids = seed_catalog(listings)
+        background_owner = User.objects.get(username='bench-owner-0')
+        background_renter = User.objects.get(username='bench-renter-0')
+        owner = User.objects.create_user('explain-owner')
+        renter = User.objects.create_user('explain-renter')
+        owners = [owner] + User.objects.bulk_create(
+            [User(username=f'explain-owner-{number}') for number in range(len(listing_ids) // OWNED_LISTINGS)]
+        )
+        for offset, listing_owner in zip(range(0, len(listing_ids), OWNED_LISTINGS), owners):
+            Listing.objects.filter(pk__in=listing_ids[offset:offset + OWNED_LISTINGS]).update(owner=listing_owner)
+        owned = listing_ids[:OWNED_LISTINGS]
+
+        ListingImage.objects.bulk_create(
+            [ListingImage(listing_id=listing_id, image=f'listings/bench-{listing_id}.jpg') for listing_id in listing_ids],
+            batch_size=BATCH_SIZE,
+        )
+        start = timezone.localdate() + timedelta(days=200)
+        bookings = Booking.objects.bulk_create([
+            Booking(listing_id=listing_id, renter=renter, start_date=start, end_date=start + timedelta(days=2), total_price=0)
+            for listing_id in owned
+        ])
+        Review.objects.bulk_create([
+            Review(booking=booking, listing_id=booking.listing_id, rating=index % 5 + 1, comment='Fine.')
+            for index, booking in enumerate(bookings)
+        ])
+        ratings.rebuild(owned)
+        messages = [
+            Message(sender=background_renter, recipient=background_owner, listing_id=listing_id, content='Is this available?', is_read=index % 3 == 0)
+            for index, listing_id in enumerate(listing_ids[OWNED_LISTINGS:])
+        ]
+        messages += [
+            Message(
+                sender=renter, recipient=owner, listing_id=listing_id, content='Is this available?',
+                conversation=conversations.get_or_create(listing_id, renter.pk, owner.pk),
+            )
+            for listing_id in owned
+        ]
+        Message.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return owner, renter, owned[0], bookings[0].pk, messages[-1].conversation_id
+
+    def _check(self, listings, verbose):
+        owner, renter, listing_id, booking_id, conversation_id = self._seed(listings)
+        clients = {'anonymous': Client(), 'owner': Client(), 'renter': Client()}
+        clients['owner'].force_login(owner)
+        clients['renter'].force_login(renter)
+        category = Category.objects.get(listing__id=listing_id)
+
+        failures = 0
+        for who, path, params, allowed in _requests(listing_id, category, booking_id, conversation_id):
+            cache.clear()
+            with explain.capture() as queries:
+                response = clients[who].get(path, params)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            if response.status_code != 200:
+                raise CommandError(f"GET {path} as {who} returned {response.status_code}")
+            scans = [(sql, plan, tables) for sql, plan, tables in explain.full_scans(queries) if set(tables) - allowed]
+            failures += len(scans)
+            status = self.style.ERROR('SCAN') if scans else self.style.SUCCESS('ok')
+            self.stdout.write(f"{status:<4} {who:<9} {path} {params or ''} ({len(queries)} queries)")
+            for sql, plan, tables in scans:
+                self.stdout.write(f"    full scan of {', '.join(tables)}: {sql}")
+            if verbose:
+                for sql, params in queries:
+                    self.stdout.write(f"    {sql}")
+                    for line in explain.explain(sql, params):
+                        self.stdout.write(f"        {line}")
+        return failures
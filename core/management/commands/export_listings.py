@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core import bulk
+from core.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Stream listings as CSV or JSONL to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', help="Only export this username's listings.")
+        parser.add_argument('--format', choices=bulk.FORMATS, default='csv')
+        parser.add_argument('-o', '--output', help="Output path; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        listings = Listing.objects.all()
+        if options['owner']:
+            listings = listings.filter(owner__username=options['owner'])
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in bulk.export_listings(listings, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
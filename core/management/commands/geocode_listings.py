@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core import geo
+from core.models import Listing
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Geocode every listing's location against the bundled gazetteer again."
+
+    def handle(self, *args, **options):
+        changed = located = 0
+        batch = []
+        for listing in Listing.objects.only('pk', 'location', 'latitude', 'longitude', 'geohash').iterator(chunk_size=BATCH_SIZE):
+            before = (listing.latitude, listing.longitude)
+            geo.locate(listing)
+            located += listing.latitude is not None
+            if (listing.latitude, listing.longitude) != before:
+                batch.append(listing)
+                changed += 1
+            if len(batch) >= BATCH_SIZE:
+                Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+                batch = []
+        Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+        self.stdout.write(self.style.SUCCESS(f"{located} listings located, {changed} changed."))
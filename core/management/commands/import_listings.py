@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import bulk
+
+
+class Command(BaseCommand):
+    help = "Bulk-import listings for one owner from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--owner', required=True, help="Username that will own the listings.")
+        parser.add_argument('--format', choices=bulk.FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options['owner']).first()
+        if owner is None:
+            raise CommandError(f"No user named {options['owner']!r}.")
+        fmt = options['format'] or bulk.detect_format(options['path'])
+        with open(options['path'], 'rb') as source:
+            result = bulk.import_listings(bulk.read_rows(source, fmt), owner, chunk_size=options['chunk_size'])
+        for line, errors in result.errors:
+            self.stderr.write(f"line {line}: {'; '.join(errors)}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.created} listings; skipped {len(result.errors)} rows."))
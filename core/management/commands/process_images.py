@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import ListingImage
+
+
+class Command(BaseCommand):
+    help = "Generate responsive renditions for listing images, synchronously."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Reprocess images that are already ready; their stored originals are kept as they are.")
+
+    def handle(self, *args, **options):
+        queryset = ListingImage.objects.all() if options['all'] else ListingImage.objects.exclude(status='ready')
+        processed = 0
+        for image_id in queryset.values_list('pk', flat=True).iterator():
+            images.process_image(image_id)
+            processed += 1
+        failed = ListingImage.objects.filter(status='failed').count()
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} images ({failed} failed overall)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import calendars
+from core.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Rebuild the free/busy calendar bitmap of every listing from today."
+
+    def handle(self, *args, **options):
+        total = 0
+        for listing_id in Listing.objects.values_list('pk', flat=True).iterator():
+            calendars.rebuild_calendar(listing_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} calendars."))
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the owner dashboard statistics from bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', help="Only reconcile this username.")
+
+    def handle(self, *args, **options):
+        owner_id = None
+        if options['owner']:
+            owner_id = User.objects.filter(username=options['owner']).values_list('pk', flat=True).first()
+            if owner_id is None:
+                raise CommandError(f"No user named {options['owner']!r}.")
+        drifted = stats.rebuild(owner_id)
+        style = self.style.WARNING if drifted else self.style.SUCCESS
+        self.stdout.write(style(f"Reconciled owner stats; {drifted} rows were out of date."))
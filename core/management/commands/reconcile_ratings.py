@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute the listing rating aggregates from reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listing', type=int, action='append', help="Only reconcile this listing id; repeatable.")
+
+    def handle(self, *args, **options):
+        drifted = ratings.rebuild(options['listing'])
+        style = self.style.WARNING if drifted else self.style.SUCCESS
+        self.stdout.write(style(f"Reconciled listing ratings; {drifted} listings were out of date."))
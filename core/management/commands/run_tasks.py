@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks, polling until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the tasks that are due now and exit.")
+        parser.add_argument('--batch', type=int, default=50, help="Tasks to claim per poll.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            ran = tasks.run_due(limit=options['batch'])
+            if ran:
+                self.stdout.write(f"Ran {ran} tasks.")
+            if options['once']:
+                break
+            close_old_connections()
+            if ran < options['batch']:
+                time.sleep(options['sleep'])
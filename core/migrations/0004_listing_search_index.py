@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from core.search import create_index
+    create_index(schema_editor)
+
+
+def populate_search_index(apps, schema_editor):
+    from core.search import FTS_TABLE, PG_DOCUMENT_SQL, PG_TABLE
+    Listing = apps.get_model('core', 'Listing')
+    vendor = schema_editor.connection.vendor
+    rows = [
+        (listing.pk, listing.title, listing.description, listing.location,
+         listing.category.name if listing.category_id else '')
+        for listing in Listing.objects.select_related('category')
+    ]
+    if not rows:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, location, category) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+        elif vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (listing_id, document) VALUES (%s, {PG_DOCUMENT_SQL})",
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    from core.search import drop_index
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_remove_listing_images_listingimage_listing'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
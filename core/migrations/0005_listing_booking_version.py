@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='booking_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
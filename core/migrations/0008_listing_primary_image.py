@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_primary_images(apps, schema_editor):
+    # thumbnail_url stays empty: originals are never linked, and 0018 queues
+    # the processing that fills it in with the thumbnail rendition.
+    Listing = apps.get_model('core', 'Listing')
+    ListingImage = apps.get_model('core', 'ListingImage')
+    first_images = {}
+    for image in ListingImage.objects.order_by('pk'):
+        first_images.setdefault(image.listing_id, image)
+    for listing_id, image in first_images.items():
+        Listing.objects.filter(pk=listing_id).update(primary_image=image)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_listing_availability_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.listingimage'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='thumbnail_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_primary_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+
+def backfill_owner_stats(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    OwnerStats = apps.get_model('core', 'OwnerStats')
+    rows = (
+        Booking.objects.annotate(month=TruncMonth('start_date'))
+        .values('listing_id', 'listing__owner_id', 'month')
+        .annotate(
+            revenue=Sum(Case(
+                When(status='confirmed', payment_status='paid', then=F('total_price')),
+                default=Value(0), output_field=DecimalField(max_digits=14, decimal_places=2),
+            )),
+            bookings=Count('pk'),
+            pending=Count('pk', filter=Q(status='pending')),
+        )
+        .order_by()
+    )
+    OwnerStats.objects.bulk_create([
+        OwnerStats(
+            owner_id=row['listing__owner_id'], listing_id=row['listing_id'], month=row['month'],
+            revenue=row['revenue'] or 0, bookings=row['bookings'], pending=row['pending'],
+        )
+        for row in rows
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('bookings', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_stats', to='core.listing')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'month'], name='owner_stats_owner_month')],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'month'), name='owner_stats_listing_month')],
+            },
+        ),
+        migrations.RunPython(backfill_owner_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model('core', 'Message')
+    Conversation = apps.get_model('core', 'Conversation')
+    ConversationMember = apps.get_model('core', 'ConversationMember')
+    threads = {}
+    rows = Message.objects.order_by('pk').values_list('pk', 'listing_id', 'sender_id', 'recipient_id', 'created_at', 'is_read')
+    for pk, listing_id, sender_id, recipient_id, created_at, is_read in rows.iterator():
+        key = (listing_id, min(sender_id, recipient_id), max(sender_id, recipient_id))
+        thread = threads.setdefault(key, {'unread': {key[1]: 0, key[2]: 0}})
+        thread['last_message_id'], thread['last_message_at'] = pk, created_at
+        if not is_read:
+            thread['unread'][recipient_id] += 1
+
+    for (listing_id, first, second), thread in threads.items():
+        conversation = Conversation.objects.create(
+            listing_id=listing_id, first_user_id=first, second_user_id=second,
+            last_message_id=thread['last_message_id'], last_message_at=thread['last_message_at'],
+        )
+        ConversationMember.objects.bulk_create([
+            ConversationMember(
+                conversation=conversation, user_id=user_id, other_user_id=other_id,
+                unread_count=thread['unread'][user_id], last_message_at=thread['last_message_at'],
+            )
+            for user_id, other_id in {(first, second), (second, first)}
+        ])
+        Message.objects.filter(
+            listing_id=listing_id, sender_id__in=(first, second), recipient_id__in=(first, second),
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('first_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('last_message', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.message')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='core.listing')),
+                ('second_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='core.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'id'], name='message_conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='core.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='other_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('listing', 'first_user', 'second_user'), name='conversation_listing_pair'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmember',
+            index=models.Index(fields=['user', 'last_message_at', 'id'], name='conversation_member_inbox'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationmember',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='conversation_member_user'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_ratings(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    Listing = apps.get_model('core', 'Listing')
+    Review = apps.get_model('core', 'Review')
+    Review.objects.update(listing_id=Subquery(Booking.objects.filter(pk=OuterRef('booking_id')).values('listing_id')[:1]))
+
+    histograms = {}
+    for listing_id, rating, n in Review.objects.values_list('listing_id', 'rating').annotate(n=Count('pk')).order_by():
+        histograms.setdefault(listing_id, {})[rating] = n
+    for listing_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        Listing.objects.filter(pk=listing_id).update(
+            rating_count=count,
+            rating_avg=sum(stars * n for stars, n in histogram.items()) / count,
+            **{f'rating_{stars}': histogram.get(stars, 0) for stars in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='listing',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.listing'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='review',
+            name='listing',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.listing'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['rating_avg', 'id'], name='listing_available_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', 'created_at', 'id'], name='review_listing_recent'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core import geo
+
+
+def geocode_listings(apps, schema_editor):
+    Listing = apps.get_model('core', 'Listing')
+    listings = list(Listing.objects.only('pk', 'location'))
+    for listing in listings:
+        geo.locate(listing)
+    Listing.objects.bulk_update(listings, ['latitude', 'longitude', 'geohash'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_listing_ratings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(geocode_listings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['geohash'], name='listing_geohash'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def queue_image_processing(apps, schema_editor):
+    """Queue renditions for images uploaded before the pipeline existed.
+
+    They stay 'pending', shown as "Processing image", until the run_tasks
+    worker (or ``manage.py process_images``) has processed them.
+    """
+    Listing = apps.get_model('core', 'Listing')
+    ListingImage = apps.get_model('core', 'ListingImage')
+    Task = apps.get_model('core', 'Task')
+    Listing.objects.filter(~Q(thumbnail_url=''), ~Q(primary_image__status='ready')).update(thumbnail_url='')
+    pending = ListingImage.objects.filter(status='pending').values_list('pk', flat=True)
+    Task.objects.bulk_create(
+        [
+            Task(name='image.process', payload={'image_id': image_id}, idempotency_key=f'image.process:{image_id}', max_attempts=3)
+            for image_id in pending.iterator()
+        ],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_listing_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_image_processing, migrations.RunPython.noop),
+    ]
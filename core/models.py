@@ -1,15 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
-from django.utils.text import slugify
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import slugs
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = slugs.allocate(Category, self.name)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -41,31 +45,133 @@ class Listing(models.Model):
     is_available = models.BooleanField(default=True)
     instant_book = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set explicitly by queryset updates that change what the API returns.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bumped under the booking lock; see core.booking.
+    booking_version = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalized first image so cards render without touching ListingImage.
+    primary_image = models.ForeignKey('ListingImage', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    thumbnail_url = models.CharField(max_length=500, blank=True, editable=False)
+    # Review aggregates, maintained by core.ratings. rating_avg is 0 until the
+    # first review so it can be sorted and paginated on without NULLs.
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Geocoded from location against the bundled gazetteer; see core.geo.
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Serves the default newest-first ordering of available listings.
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_available=True), name='listing_available_recent'),
+            # Max(updated_at) for API ETags without a table scan.
+            models.Index(fields=['updated_at'], condition=models.Q(is_available=True), name='listing_available_updated'),
+            # Category pages in the same order, without a sort step.
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_available=True), name='listing_available_category'),
+            # max_price filters and their capped counts.
+            models.Index(fields=['price'], condition=models.Q(is_available=True), name='listing_available_price'),
+            # Best-rated ordering and min_rating filters.
+            models.Index(fields=['rating_avg', 'id'], condition=models.Q(is_available=True), name='listing_available_rating'),
+            # Radius and bounding-box filters, as geohash prefix ranges. Not
+            # partial: SQLite only plans an OR of ranges on a full index.
+            models.Index(fields=['geohash'], name='listing_geohash'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)
+            self.slug = slugs.allocate(Listing, self.title)
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
+    @property
+    def rating_histogram(self):
+        """``(stars, count, percent)`` from five stars down to one."""
+        counts = [(stars, getattr(self, f'rating_{stars}')) for stars in range(5, 0, -1)]
+        return [(stars, count, round(100 * count / self.rating_count) if self.rating_count else 0) for stars, count in counts]
+
+    def refresh_primary_image(self):
+        """Point primary_image at the oldest remaining image, or clear it."""
+        image = self.images.order_by('pk').first()
+        self.primary_image = image
+        self.thumbnail_url = image.variant_url('thumbnail') if image else ''
+        Listing.objects.filter(pk=self.pk).update(primary_image=image, thumbnail_url=self.thumbnail_url, updated_at=timezone.now())
+
 class ListingImage(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='listings/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Filled in by core.images once the upload has been processed.
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Image for {self.listing.title}"
 
+    def _srcset(self, fmt):
+        by_width = {variant['width']: variant[fmt] for variant in self.variants.values()}
+        return ', '.join(f"{default_storage.url(by_width[width])} {width}w" for width in sorted(by_width))
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def fallback_url(self):
+        return self.variant_url('medium')
+
+    def variant_url(self, name, fmt='jpeg'):
+        """URL of a processed variant; empty until processed, as the original is never served."""
+        variant = self.variants.get(name)
+        return default_storage.url(variant[fmt]) if variant else ''
+
 class Availability(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='availability')
     start_date = models.DateField()
     end_date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['listing', 'start_date', 'end_date'], name='availability_listing_dates'),
+        ]
 
     def __str__(self):
         return f"{self.listing.title}: {self.start_date} to {self.end_date}"
 
+class ListingCalendar(models.Model):
+    """Free/busy bitmap for a listing, one bit per day starting at ``epoch``.
+
+    A set bit means the day is covered by an Availability row and not taken by
+    an active booking. Maintained by core.calendars.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='calendar')
+    epoch = models.DateField()
+    days = models.PositiveIntegerField()
+    free_days = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Calendar for listing {self.listing_id} from {self.epoch}"
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -86,9 +192,37 @@ class Booking(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='unpaid')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Overlap checks filter on status too; see core.booking and core.calendars.
+            models.Index(fields=['listing', 'status', 'start_date', 'end_date'], name='booking_listing_status_dates'),
+            # The renter's dashboard list, newest first with keyset cursors.
+            models.Index(fields=['renter', 'created_at', 'id'], name='booking_renter_recent'),
+        ]
+
     def __str__(self):
         return f"Booking for {self.listing.title} by {self.renter.username}"
 
+class OwnerStats(models.Model):
+    """Booking totals for one listing and month, maintained by core.stats."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='booking_stats')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booking_stats')
+    month = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    bookings = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'month'], name='owner_stats_listing_month'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'month'], name='owner_stats_owner_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} {self.month:%Y-%m}"
+
 class Profile(models.Model):
     USER_TYPES = (
         ('individual', 'Individual'),
@@ -105,20 +239,124 @@ class Profile(models.Model):
 
 class Review(models.Model):
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='review')
+    # Copied from the booking so a listing's reviews are read without its bookings.
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='reviews', editable=False)
     rating = models.IntegerField(validators=[MinValueValidator(1)], choices=[(i, i) for i in range(1, 6)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['listing', 'created_at', 'id'], name='review_listing_recent'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.listing_id is None:
+            self.listing_id = self.booking.listing_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Review for {self.booking.listing.title} by {self.booking.renter.username}"
 
+class Conversation(models.Model):
+    """The messages about one listing between two users; maintained by core.conversations."""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='conversations')
+    # The pair is stored lowest user id first, so each pair has one row per listing.
+    first_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    second_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    last_message_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'first_user', 'second_user'], name='conversation_listing_pair'),
+        ]
+
+    def __str__(self):
+        return f"Conversation about listing {self.listing_id} between users {self.first_user_id} and {self.second_user_id}"
+
+class ConversationMember(models.Model):
+    """One participant's inbox entry for a conversation, with their unread count."""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    other_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    unread_count = models.PositiveIntegerField(default=0)
+    # Copied from the conversation so the inbox is one index range scan.
+    last_message_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='conversation_member_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_message_at', 'id'], name='conversation_member_inbox'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in conversation {self.conversation_id}"
+
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='messages')
+    # Filled in on save from (listing, sender, recipient); see core.conversations.
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='messages')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Inbox and outbox, newest first.
+            models.Index(fields=['recipient', 'created_at'], name='message_recipient_recent'),
+            models.Index(fields=['sender', 'created_at'], name='message_sender_recent'),
+            # Conversation pages and "messages since id N" polling.
+            models.Index(fields=['conversation', 'id'], name='message_conversation'),
+        ]
+
+    def __str__(self):
+        return f"From {self.sender.username} to {self.recipient.username} about {self.listing.title}"
+
+class Task(models.Model):
+    """A unit of background work, run by the run_tasks worker; see core.tasks."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+class SlugCounter(models.Model):
+    """Next slug number per model and base; see core.slugs."""
+    scope = models.CharField(max_length=100)
+    base = models.CharField(max_length=100)
+    next_number = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'base'], name='slug_counter_scope_base'),
+        ]
+
     def __str__(self):
-        return f"From {self.sender.username} to {self.recipient.username} about {self.listing.title}"
\ No newline at end of file
+        return f"{self.scope}:{self.base} -> {self.next_number}"
@@ -0,0 +1,62 @@
+"""Background notification tasks.
+
+Text messages go out through Twilio when TWILIO_* settings are present and are
+only logged otherwise, which keeps development and tests offline.
+"""
+import logging
+
+from django.conf import settings
+
+from .models import Booking, Message, Profile
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+
+def send_sms(to, body):
+    if not (settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN and settings.TWILIO_FROM_NUMBER):
+        logger.info("SMS to %s: %s", to, body)
+        return
+    from twilio.rest import Client
+
+    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    client.messages.create(to=to, from_=settings.TWILIO_FROM_NUMBER, body=body)
+
+
+def _phone_number(user):
+    return Profile.objects.filter(user=user).values_list('phone_number', flat=True).first() or ''
+
+
+@task('booking.confirmation')
+def send_booking_confirmation(booking_id):
+    booking = Booking.objects.select_related('listing__owner', 'renter').get(pk=booking_id)
+    renter_phone = _phone_number(booking.renter)
+    if renter_phone:
+        send_sms(renter_phone, f"Your booking of {booking.listing.title} from {booking.start_date} "
+                               f"to {booking.end_date} is {booking.get_status_display().lower()}.")
+    owner_phone = _phone_number(booking.listing.owner)
+    if owner_phone:
+        send_sms(owner_phone, f"New booking request for {booking.listing.title} from {booking.renter.username}.")
+
+
+@task('message.notification')
+def notify_new_message(message_id):
+    message = Message.objects.select_related('sender', 'recipient', 'listing').get(pk=message_id)
+    phone = _phone_number(message.recipient)
+    if phone:
+        send_sms(phone, f"New message from {message.sender.username} about {message.listing.title}.")
+
+
+@task('payment.receipt')
+def send_payment_receipt(booking_id):
+    booking = Booking.objects.select_related('listing', 'renter').get(pk=booking_id)
+    phone = _phone_number(booking.renter)
+    if phone:
+        send_sms(phone, f"Payment of TSh {booking.total_price:,.0f} received for {booking.listing.title}.")
+
+
+@task('account.welcome')
+def send_welcome(user_id):
+    profile = Profile.objects.select_related('user').filter(user_id=user_id).first()
+    if profile and profile.phone_number:
+        send_sms(profile.phone_number, f"Welcome to Edalali, {profile.user.username}!")
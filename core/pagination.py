@@ -0,0 +1,208 @@
+"""Cursor pagination helpers.
+
+Pages are addressed by the sort key of their boundary row instead of an
+OFFSET, so page 500 costs the same index range scan as page 1.
+"""
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+# Counts stop at this many rows; the UI shows "1000+" beyond it.
+COUNT_LIMIT = 1000
+COUNT_CACHE_TIMEOUT = 300
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(payload, dict):
+        raise InvalidCursor(cursor)
+    return payload
+
+
+class Page:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a queryset on a unique ordering such as ``('-created_at', '-id')``."""
+
+    def __init__(self, queryset, ordering=('-created_at', '-id'), per_page=PAGE_SIZE):
+        self.queryset = queryset
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.per_page = per_page
+
+    def _ordering(self, reverse):
+        return [('-' if descending != reverse else '') + name for name, descending in self.fields]
+
+    def _after(self, values, reverse):
+        """Build the WHERE clause selecting rows strictly after ``values``."""
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(values)
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _key(self, obj):
+        return [_encode_value(getattr(obj, name)) for name, _ in self.fields]
+
+    def _slice(self, cursor):
+        """The decoded cursor and the queryset that fetches its page plus one row."""
+        payload = decode_cursor(cursor) if cursor else {}
+        reverse = payload.get('d') == 'p'
+        queryset = self.queryset.order_by(*self._ordering(reverse))
+        if 'v' in payload:
+            try:
+                queryset = queryset.filter(self._after(payload['v'], reverse))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+        return payload, queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        payload, queryset = self._slice(cursor)
+        return self._page(payload, list(queryset))
+
+    async def apage(self, cursor=None):
+        payload, queryset = self._slice(cursor)
+        return self._page(payload, [row async for row in queryset])
+
+    def _page(self, payload, rows):
+        reverse = payload.get('d') == 'p'
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = encode_cursor({'v': self._key(rows[-1])})
+            if (has_more and reverse) or (not reverse and 'v' in payload):
+                previous_cursor = encode_cursor({'v': self._key(rows[0]), 'd': 'p'})
+        return Page(rows, next_cursor, previous_cursor)
+
+
+class RankedPaginator:
+    """Paginate a queryset in the order of a precomputed id ranking.
+
+    Used for search results, whose order comes from the search index rather
+    than a column; the ranking is bounded so the cursor is simply an offset.
+    """
+
+    def __init__(self, queryset, ranked_ids, per_page=PAGE_SIZE):
+        self.queryset = queryset
+        self.ranked_ids = ranked_ids
+        self.per_page = per_page
+
+    def matching_ids(self):
+        allowed = set(self.queryset.filter(pk__in=self.ranked_ids).values_list('pk', flat=True))
+        return [pk for pk in self.ranked_ids if pk in allowed]
+
+    async def amatching_ids(self):
+        allowed = {pk async for pk in self.queryset.filter(pk__in=self.ranked_ids).values_list('pk', flat=True)}
+        return [pk for pk in self.ranked_ids if pk in allowed]
+
+    def _offset(self, cursor):
+        payload = decode_cursor(cursor) if cursor else {}
+        offset = payload.get('o', 0)
+        if not isinstance(offset, int) or offset < 0:
+            raise InvalidCursor(cursor)
+        return offset
+
+    def page(self, cursor=None):
+        offset = self._offset(cursor)
+        ids = self.matching_ids()
+        page_ids = ids[offset:offset + self.per_page]
+        return self._page(offset, ids, page_ids, self.queryset.in_bulk(page_ids))
+
+    async def apage(self, cursor=None):
+        offset = self._offset(cursor)
+        ids = await self.amatching_ids()
+        page_ids = ids[offset:offset + self.per_page]
+        return self._page(offset, ids, page_ids, await self.queryset.ain_bulk(page_ids))
+
+    def _page(self, offset, ids, page_ids, objects):
+        rows = [objects[pk] for pk in page_ids if pk in objects]
+        next_cursor = previous_cursor = None
+        if offset + self.per_page < len(ids):
+            next_cursor = encode_cursor({'o': offset + self.per_page})
+        if offset > 0:
+            previous_cursor = encode_cursor({'o': max(offset - self.per_page, 0)})
+        return Page(rows, next_cursor, previous_cursor, count=len(ids))
+
+
+def count_cache_key(prefix, params):
+    normalized = json.dumps(sorted(params.items()), separators=(',', ':'))
+    return f'{prefix}:count:{hashlib.md5(normalized.encode()).hexdigest()}'
+
+
+def cached_count(queryset, key, limit=COUNT_LIMIT, timeout=COUNT_CACHE_TIMEOUT):
+    """Return a capped, cached row count for ``queryset``.
+
+    The count is approximate by design: it is bounded at ``limit`` so it never
+    walks the whole table, and may be up to ``timeout`` seconds stale.
+    """
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by()[:limit + 1].count()
+        cache.set(key, count, timeout)
+    return count
+
+
+async def acached_count(queryset, key, limit=COUNT_LIMIT, timeout=COUNT_CACHE_TIMEOUT):
+    """``cached_count`` for async views."""
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.order_by()[:limit + 1].acount()
+        await cache.aset(key, count, timeout)
+    return count
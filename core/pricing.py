@@ -0,0 +1,75 @@
+"""Listing price quotes.
+
+All arithmetic is exact. A quote is the listing price times the rented
+duration measured in the listing's pricing unit. Durations are billed in whole
+hours, rounded up, so date ranges cost whole days and datetime ranges can be
+partial days. Longer units are prorated linearly: a week is 7 days, a month 30
+and a year 365. The total is rounded half-up to the cent once, at the end.
+
+``annotate_quotes`` computes the same figure in SQL for a whole queryset. It
+uses integer cents so that SQLite, which has no decimal type, rounds exactly
+like Postgres and like ``quote``.
+"""
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.functions import Cast, Round
+
+CENT = Decimal('0.01')
+BILLING_STEP = timedelta(hours=1)
+UNIT_HOURS = {
+    'hour': 1,
+    'day': 24,
+    'week': 7 * 24,
+    'month': 30 * 24,
+    'year': 365 * 24,
+}
+
+
+def billable_hours(start, end):
+    """Whole hours from ``start`` to ``end``; both dates or both datetimes."""
+    if isinstance(start, datetime) != isinstance(end, datetime):
+        raise TypeError("start and end must both be dates or both be datetimes")
+    if not isinstance(start, (date, datetime)):
+        raise TypeError("start and end must be dates or datetimes")
+    if end <= start:
+        raise ValidationError("End date must be after start date.")
+    return -(-(end - start) // BILLING_STEP)
+
+
+def quote(price, pricing_unit, start, end):
+    """Total price of renting from ``start`` to ``end``, as a Decimal."""
+    hours = billable_hours(start, end)
+    return (Decimal(price) * hours / UNIT_HOURS[pricing_unit]).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def quote_listing(listing, start, end):
+    return quote(listing.price, listing.pricing_unit, start, end)
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def quote_cents_expression(start, end):
+    """SQL for the quote in integer cents, for every listing in one query.
+
+    round_half_up(cents * hours / unit) is computed as
+    (2 * cents * hours + unit) / (2 * unit) with integer division.
+    """
+    hours = billable_hours(start, end)
+    price_cents = Cast(Round(F('price') * 100), BigIntegerField())
+    return Case(
+        *[
+            When(pricing_unit=unit, then=(price_cents * Value(2 * hours) + Value(unit_hours)) / Value(2 * unit_hours))
+            for unit, unit_hours in UNIT_HOURS.items()
+        ],
+        output_field=BigIntegerField(),
+    )
+
+
+def annotate_quotes(queryset, start, end):
+    """Annotate each listing with ``quote_cents`` for the given range."""
+    return queryset.annotate(quote_cents=quote_cents_expression(start, end))
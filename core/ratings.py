@@ -0,0 +1,90 @@
+"""Listing rating aggregates.
+
+Listing carries the review count, the average and a per-star histogram
+(``rating_1`` .. ``rating_5``) so cards, the best-rated ordering and the
+min_rating filter never aggregate reviews. The Review signals call
+``review_saved`` and ``review_deleted`` inside the review's transaction; each
+applies the change as one UPDATE relative to the stored columns, so
+concurrent reviews of the same listing do not overwrite each other.
+``rebuild`` recomputes the columns from the reviews and is what the
+reconcile_ratings command runs after bulk changes.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Listing, Review
+
+STARS = range(1, 6)
+BATCH_SIZE = 2000
+
+
+def _apply(listing_id, changes):
+    """Add ``changes`` (stars -> count delta) to a listing's aggregates."""
+    changes = {stars: delta for stars, delta in changes.items() if delta}
+    if not changes:
+        return
+    count = F('rating_count') + sum(changes.values())
+    total = sum(stars * (F(f'rating_{stars}') + changes.get(stars, 0)) for stars in STARS)
+    Listing.objects.filter(pk=listing_id).update(
+        rating_count=count,
+        rating_avg=Coalesce(Cast(total, FloatField()) / NullIf(count, 0), 0.0),
+        updated_at=timezone.now(),
+        **{f'rating_{stars}': F(f'rating_{stars}') + delta for stars, delta in changes.items()},
+    )
+
+
+def review_saved(review, previous_rating):
+    """Move a review's star from ``previous_rating`` (None for new reviews) to its current rating."""
+    if previous_rating == review.rating:
+        return
+    changes = Counter({review.rating: 1})
+    if previous_rating is not None:
+        changes[previous_rating] -= 1
+    _apply(review.listing_id, changes)
+
+
+def review_deleted(listing_id, rating):
+    if rating is None:
+        rebuild([listing_id])
+    else:
+        _apply(listing_id, {rating: -1})
+
+
+def _aggregates(histogram):
+    count = sum(histogram.values())
+    return {
+        'rating_count': count,
+        'rating_avg': sum(stars * n for stars, n in histogram.items()) / count if count else 0,
+        **{f'rating_{stars}': histogram.get(stars, 0) for stars in STARS},
+    }
+
+
+@transaction.atomic
+def rebuild(listing_ids=None):
+    """Recompute the aggregates from reviews; returns how many listings were wrong."""
+    reviews = Review.objects.all()
+    listings = Listing.objects.all()
+    if listing_ids is not None:
+        reviews = reviews.filter(listing_id__in=listing_ids)
+        listings = listings.filter(pk__in=listing_ids)
+
+    histograms = {}
+    for listing_id, rating, n in reviews.values_list('listing_id', 'rating').annotate(n=Count('pk')).order_by().iterator():
+        histograms.setdefault(listing_id, {})[rating] = n
+
+    fields = ['rating_count', 'rating_avg', *(f'rating_{stars}' for stars in STARS)]
+    now = timezone.now()
+    stale = []
+    for listing in listings.only('pk', *fields).iterator():
+        fresh = _aggregates(histograms.get(listing.pk, {}))
+        if any(getattr(listing, name) != value for name, value in fresh.items()):
+            for name, value in fresh.items():
+                setattr(listing, name, value)
+            listing.updated_at = now
+            stale.append(listing)
+    Listing.objects.bulk_update(stale, [*fields, 'updated_at'], batch_size=BATCH_SIZE)
+    return len(stale)
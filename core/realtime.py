@@ -0,0 +1,187 @@
+"""Push events to signed-in browsers over a WebSocket.
+
+Request code calls ``notify(user_id, event_type, **data)``. Once the current
+transaction commits, the event is published on the channel ``user:<id>``
+through the configured broker. ``websocket_app`` serves REALTIME_PATH: it
+authenticates the socket from the session cookie and forwards every event
+on its user's channel.
+
+Two brokers are provided; REALTIME_BROKER selects one by dotted path:
+
+* InProcessBroker (default without a Redis URL) delivers to sockets held by
+  the same process, which is all a single ASGI worker serving every request
+  needs;
+* RedisBroker uses Redis pub/sub, so an event published by any worker, a
+  WSGI process or a management command reaches sockets on every worker.
+  Deployments with more than one process must use it.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import parse_cookie
+from django.utils.module_loading import import_string
+
+from . import eventlog
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per socket before a slow client starts missing them.
+QUEUE_SIZE = 100
+# Close code sent to sockets without a valid session.
+UNAUTHORIZED = 4401
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class InProcessBroker:
+    """Fan events out to the asyncio queues of sockets in this process."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        # Called from worker threads; hand the payload to each socket's loop.
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, payload)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1].get
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+def _offer(queue, payload):
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        logger.warning("Dropping realtime event for a slow client")
+
+
+class RedisBroker:
+    """Redis pub/sub, for deployments with more than one process."""
+
+    def __init__(self, url=None):
+        import redis
+
+        self.url = url or settings.REALTIME_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel, payload):
+        self.client.publish(channel, payload)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def next_event():
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is not None:
+                    return message['data'].decode()
+
+        try:
+            yield next_event
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.REALTIME_BROKER)()
+
+
+def notify(user_id, event_type, **data):
+    """Send ``event_type`` to ``user_id``'s open sockets after the transaction commits."""
+    payload = json.dumps({'type': event_type, **data}, cls=DjangoJSONEncoder)
+
+    def publish():
+        try:
+            get_broker().publish(user_channel(user_id), payload)
+        except Exception:
+            # Push is best effort; pages still poll.
+            eventlog.event(logger, 'realtime.publish_failed', level=logging.ERROR, exc_info=True, user_id=user_id, event_type=event_type)
+
+    transaction.on_commit(publish)
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _same_origin(scope):
+    """Reject cross-site sockets; browsers always send Origin, other clients may not."""
+    origin = _header(scope, b'origin')
+    return origin is None or urlsplit(origin).netloc == _header(scope, b'host')
+
+
+async def _user_id(scope):
+    cookies = parse_cookie(_header(scope, b'cookie') or '')
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = await aget_user(SimpleNamespace(session=session))
+    return user.pk if user.is_authenticated else None
+
+
+async def websocket_app(scope, receive, send):
+    """ASGI application for one realtime socket."""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    user_id = await _user_id(scope) if _same_origin(scope) else None
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': UNAUTHORIZED})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async with get_broker().subscribe(user_channel(user_id)) as next_event:
+        incoming = asyncio.ensure_future(receive())
+        outgoing = asyncio.ensure_future(next_event())
+        try:
+            while True:
+                done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+                if incoming in done:
+                    if incoming.result()['type'] == 'websocket.disconnect':
+                        return
+                    # The channel is push-only; anything the client sends is ignored.
+                    incoming = asyncio.ensure_future(receive())
+                if outgoing in done:
+                    await send({'type': 'websocket.send', 'text': outgoing.result()})
+                    outgoing = asyncio.ensure_future(next_event())
+        finally:
+            incoming.cancel()
+            outgoing.cancel()
@@ -0,0 +1,227 @@
+"""Full-text search over listings.
+
+SQLite databases use an FTS5 virtual table keyed by listing id, PostgreSQL a
+side table holding a weighted tsvector behind a GIN index. Other backends fall
+back to icontains filtering so the site keeps working, just without ranking.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Listing
+
+FTS_TABLE = 'core_listing_fts'
+PG_TABLE = 'core_listing_search'
+
+# Upper bound on ranked ids returned for a single query.
+SEARCH_LIMIT = 1000
+
+# Relative weight of each indexed column: title, description, location, category.
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKENS = 10
+REBUILD_BATCH_SIZE = 500
+
+
+def _vendor():
+    return connection.vendor
+
+
+def _tokens(query):
+    """Split a free-text query into lowercase word tokens."""
+    return TOKEN_RE.findall(query.lower())[:MAX_TOKENS]
+
+
+def _document(listing):
+    category = listing.category.name if listing.category_id else ''
+    return (listing.title, listing.description, listing.location, category)
+
+
+def _fts_match(tokens):
+    # Every token must match, and each is a prefix so "cam" finds "camera".
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _pg_tsquery(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+PG_DOCUMENT_SQL = (
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'D') || "
+    "setweight(to_tsvector('simple', %s), 'B') || "
+    "setweight(to_tsvector('simple', %s), 'C')"
+)
+
+
+def create_index(schema_editor):
+    """Create the backing index structures for the current database vendor."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, description, location, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+            "listing_id bigint PRIMARY KEY REFERENCES core_listing (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_idx ON {PG_TABLE} USING GIN (document)"
+        )
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {PG_TABLE}")
+
+
+def _write_documents(cursor, rows):
+    """Upsert ``(listing_id, title, description, location, category)`` rows."""
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, location, category) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+    elif vendor == 'postgresql':
+        cursor.executemany(
+            f"INSERT INTO {PG_TABLE} (listing_id, document) VALUES (%s, {PG_DOCUMENT_SQL}) "
+            "ON CONFLICT (listing_id) DO UPDATE SET document = EXCLUDED.document",
+            rows,
+        )
+
+
+def index_listings(listings):
+    """Add or refresh index entries for the given listings."""
+    rows = [(listing.pk, *_document(listing)) for listing in listings]
+    if not rows or _vendor() not in ('sqlite', 'postgresql'):
+        return
+    with connection.cursor() as cursor:
+        _write_documents(cursor, rows)
+
+
+def index_listing(listing):
+    index_listings([listing])
+
+
+def remove_listing(listing_id):
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [listing_id])
+        elif vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {PG_TABLE} WHERE listing_id = %s", [listing_id])
+
+
+def rebuild_index():
+    """Rebuild the whole index from the listing table and return the row count."""
+    vendor = _vendor()
+    if vendor not in ('sqlite', 'postgresql'):
+        return 0
+    table = FTS_TABLE if vendor == 'sqlite' else PG_TABLE
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        batch = []
+        for listing in Listing.objects.select_related('category').iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append((listing.pk, *_document(listing)))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                _write_documents(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _write_documents(cursor, batch)
+            total += len(batch)
+        if vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def search_listing_ids(query, listings=None, limit=None):
+    """Return ids of listings matching ``query``, best match first.
+
+    With ``listings``, only ids in that queryset are ranked: its filters run
+    inside the search query, so the ``limit`` best matches are taken from the
+    filtered listings rather than from all of them. ``limit`` defaults to
+    SEARCH_LIMIT.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    limit = limit or SEARCH_LIMIT
+    vendor = _vendor()
+    if vendor not in ('sqlite', 'postgresql'):
+        return _fallback_ids(tokens, listings, limit)
+
+    restriction, restriction_params = '', []
+    if listings is not None:
+        # Correlated on the match's id, so each match costs one primary key probe.
+        id_column = f'{FTS_TABLE}.rowid' if vendor == 'sqlite' else f'{PG_TABLE}.listing_id'
+        candidates = listings.filter(pk=RawSQL(id_column, [])).order_by().values('pk')
+        try:
+            subquery, restriction_params = candidates.query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        restriction = f" AND EXISTS ({subquery})"
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s{restriction} "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [_fts_match(tokens), *restriction_params, limit],
+            )
+        else:
+            cursor.execute(
+                f"SELECT listing_id FROM {PG_TABLE}, to_tsquery('simple', %s) AS query "
+                f"WHERE document @@ query{restriction} ORDER BY ts_rank(document, query) DESC, listing_id DESC LIMIT %s",
+                [_pg_tsquery(tokens), *restriction_params, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching(listings, query):
+    """Restrict ``listings`` to every match of ``query``, unranked and unlimited.
+
+    The text match becomes a subquery of the listing query, so nothing runs
+    until the queryset is evaluated.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return listings.none()
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        return listings.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_match(tokens)]))
+    if vendor == 'postgresql':
+        return listings.filter(pk__in=RawSQL(
+            f"SELECT listing_id FROM {PG_TABLE} WHERE document @@ to_tsquery('simple', %s)", [_pg_tsquery(tokens)],
+        ))
+    return listings.filter(_fallback_condition(tokens))
+
+
+def _fallback_condition(tokens):
+    condition = Q()
+    for token in tokens:
+        condition &= (
+            Q(title__icontains=token) | Q(description__icontains=token)
+            | Q(location__icontains=token) | Q(category__name__icontains=token)
+        )
+    return condition
+
+
+def _fallback_ids(tokens, listings, limit):
+    listings = Listing.objects.all() if listings is None else listings
+    return list(listings.filter(_fallback_condition(tokens)).order_by('-created_at').values_list('pk', flat=True)[:limit])
@@ -0,0 +1,56 @@
+from rest_framework import serializers
+
+from .models import Availability, Category, Listing, Review
+
+
+class SparseFieldsMixin:
+    """Accept ``fields=[...]`` and drop every other field from the output."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'updated_at']
+
+
+class ListingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+    url = serializers.HyperlinkedIdentityField(view_name='api_listing_detail')
+
+    class Meta:
+        model = Listing
+        fields = [
+            'id', 'url', 'title', 'slug', 'description', 'category', 'rental_type', 'price', 'pricing_unit',
+            'location', 'is_available', 'instant_book', 'thumbnail_url', 'rating_avg', 'rating_count',
+            'created_at', 'updated_at',
+        ]
+
+    def get_thumbnail_url(self, listing):
+        if not listing.thumbnail_url:
+            return None
+        return self.context['request'].build_absolute_uri(listing.thumbnail_url)
+
+
+class AvailabilitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Availability
+        fields = ['id', 'start_date', 'end_date', 'updated_at']
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.CharField(source='booking.renter.username', read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['id', 'rating', 'comment', 'author', 'created_at', 'updated_at']
@@ -0,0 +1,228 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, calendars, conversations, geo, images, ratings, realtime, search, stats
+from .models import Availability, Booking, Category, Listing, ListingImage, Message, OwnerStats, Review
+
+
+@receiver(post_save, sender=Listing)
+def index_saved_listing(sender, instance, raw=False, **kwargs):
+    """Keep the search index in sync with listing edits."""
+    if not raw:
+        search.index_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_deleted_listing(sender, instance, **kwargs):
+    search.remove_listing(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_listings(sender, instance, created, raw=False, **kwargs):
+    """Category names are indexed with each listing, so a rename touches them all."""
+    if not created and not raw:
+        search.index_listings(Listing.objects.filter(category=instance).select_related('category'))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_listings(sender, instance, **kwargs):
+    instance._listing_ids = list(instance.listing_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_uncategorized_listings(sender, instance, **kwargs):
+    listing_ids = getattr(instance, '_listing_ids', [])
+    if listing_ids:
+        search.index_listings(Listing.objects.filter(pk__in=listing_ids))
+
+
+@receiver(post_init, sender=Availability)
+@receiver(post_init, sender=Booking)
+def remember_date_range(sender, instance, **kwargs):
+    # Read through __dict__ so deferred fields are not fetched one by one.
+    instance._original_dates = (instance.__dict__.get('start_date'), instance.__dict__.get('end_date'))
+
+
+def _refresh_calendar(listing_id, dates):
+    """Update the calendar over ``dates``; a missing date means a full rebuild."""
+    if None in dates:
+        calendars.update_calendar(listing_id, None, None)
+    else:
+        calendars.update_calendar(listing_id, min(dates), max(dates))
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_save, sender=Booking)
+def refresh_calendar(sender, instance, created, raw=False, **kwargs):
+    """Recompute calendar bits over both the old and the new date range."""
+    if raw:
+        return
+    current = (instance.start_date, instance.end_date)
+    _refresh_calendar(instance.listing_id, current if created else (*instance._original_dates, *current))
+    instance._original_dates = current
+
+
+@receiver(post_delete, sender=Availability)
+@receiver(post_delete, sender=Booking)
+def refresh_calendar_after_delete(sender, instance, **kwargs):
+    # Deferred: when the whole listing is being deleted, the calendar must not
+    # be rebuilt halfway through the cascade.
+    listing_id = instance.listing_id
+    dates = instance._original_dates
+    transaction.on_commit(lambda: _refresh_calendar(listing_id, dates))
+
+
+@receiver(post_init, sender=Booking)
+def remember_stats_contribution(sender, instance, **kwargs):
+    instance._stats_contribution = stats.contribution(instance)
+
+
+@receiver(post_save, sender=Booking)
+def update_owner_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stats.booking_saved(instance, None if created else instance._stats_contribution)
+    instance._stats_contribution = stats.contribution(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def remove_owner_stats(sender, instance, **kwargs):
+    stats.booking_deleted(instance._stats_contribution, instance.listing_id)
+
+
+@receiver(post_init, sender=Listing)
+def remember_location(sender, instance, **kwargs):
+    instance._original_location = instance.__dict__.get('location')
+
+
+@receiver(pre_save, sender=Listing)
+def geocode_listing(sender, instance, raw=False, **kwargs):
+    """Look the location up in the gazetteer when it is new or has changed."""
+    if raw or 'location' not in instance.__dict__:
+        return
+    if instance._state.adding or instance.location != instance._original_location:
+        geo.locate(instance)
+        instance._original_location = instance.location
+
+
+@receiver(post_save, sender=Listing)
+def move_owner_stats(sender, instance, created, raw=False, **kwargs):
+    """Stats follow a listing to its new owner."""
+    if not created and not raw:
+        OwnerStats.objects.filter(listing=instance).exclude(owner_id=instance.owner_id).update(owner_id=instance.owner_id)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_listing_cache(sender, instance, **kwargs):
+    listing_id = instance.pk
+    transaction.on_commit(lambda: caching.invalidate_listing(listing_id))
+
+
+@receiver(post_save, sender=ListingImage)
+def set_primary_image(sender, instance, created, raw=False, **kwargs):
+    """The first image uploaded becomes the listing's card image."""
+    if created and not raw:
+        Listing.objects.filter(pk=instance.listing_id, primary_image__isnull=True).update(
+            primary_image=instance, thumbnail_url=instance.variant_url('thumbnail'), updated_at=timezone.now(),
+        )
+        images.schedule(instance.pk)
+
+
+@receiver(post_delete, sender=ListingImage)
+def delete_image_variants(sender, instance, **kwargs):
+    variants = instance.variants
+    if variants:
+        transaction.on_commit(lambda: images.delete_variants(variants))
+
+
+@receiver(post_delete, sender=ListingImage)
+def replace_primary_image(sender, instance, **kwargs):
+    # Deleting the primary image nulls the foreign key via SET_NULL.
+    listing = Listing.objects.filter(pk=instance.listing_id, primary_image__isnull=True).first()
+    if listing:
+        listing.refresh_primary_image()
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def invalidate_parent_listing_cache(sender, instance, **kwargs):
+    listing_id = instance.listing_id
+    transaction.on_commit(lambda: caching.invalidate_listing(listing_id))
+
+
+@receiver(post_init, sender=Review)
+def remember_rating(sender, instance, **kwargs):
+    instance._original_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=Review)
+def update_listing_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        ratings.review_saved(instance, None)
+    elif instance._original_rating is None:
+        # The rating was deferred when the review was loaded.
+        ratings.rebuild([instance.listing_id])
+    else:
+        ratings.review_saved(instance, instance._original_rating)
+    instance._original_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def remove_listing_rating(sender, instance, **kwargs):
+    ratings.review_deleted(instance.listing_id, instance.__dict__.get('rating'))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviewed_listing_cache(sender, instance, **kwargs):
+    listing_id = instance.listing_id
+    transaction.on_commit(lambda: caching.invalidate_listing(listing_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    transaction.on_commit(caching.invalidate_categories)
+
+
+@receiver(pre_save, sender=Message)
+def attach_conversation(sender, instance, raw=False, **kwargs):
+    if not raw and instance._state.adding:
+        conversations.attach(instance)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation(sender, instance, created, raw=False, **kwargs):
+    """Move the conversation to the top of both inboxes and count the message as unread."""
+    if created and not raw:
+        conversations.message_sent(instance)
+        realtime.notify(
+            instance.recipient_id, 'message', conversation=instance.conversation_id, message=instance.pk,
+            sender=instance.sender.username, listing=instance.listing_id,
+        )
+
+
+@receiver(post_init, sender=Booking)
+def remember_status(sender, instance, **kwargs):
+    instance._original_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+def push_booking_status(sender, instance, created, raw=False, **kwargs):
+    """Tell the owner about new bookings and both sides about status changes."""
+    # A None original status means the field was deferred, so a change cannot be detected.
+    if raw or (not created and instance._original_status in (None, instance.status)):
+        return
+    instance._original_status = instance.status
+    listing = instance.listing
+    event = {'booking': instance.pk, 'listing': listing.pk, 'title': listing.title, 'status': instance.status}
+    realtime.notify(listing.owner_id, 'booking', **event)
+    if not created:
+        realtime.notify(instance.renter_id, 'booking', **event)
@@ -0,0 +1,83 @@
+"""Collision-free slug allocation.
+
+Each (model, base slug) pair has a SlugCounter row holding the next number to
+hand out: 1 stands for the bare base, n >= 2 for ``<base>-<n>``. Allocating is
+an UPDATE that adds the number of slugs wanted to the counter and a SELECT of
+the result. The UPDATE locks the row until the surrounding transaction ends,
+so concurrent creates of the same title get disjoint numbers and never race
+on the unique index.
+
+A counter is seeded on first use from one range query over the existing slugs
+that share its base. The query is on the slug index itself, not a LIKE.
+Bases that already end in ``-<digits>`` never get the bare form, because
+``camera-2`` must stay reserved for the second "Camera".
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.text import slugify
+
+FALLBACK_BASE = 'item'
+# Room for "-" plus a ten-digit number within the slug column.
+SUFFIX_RESERVE = 11
+NUMBERED = re.compile(r'-\d+$')
+
+
+def slug_base(model, text, field='slug'):
+    max_length = model._meta.get_field(field).max_length
+    return slugify(text)[:max_length - SUFFIX_RESERVE].strip('-_') or FALLBACK_BASE
+
+
+def _scope(model, field):
+    return f'{model._meta.label_lower}.{field}'
+
+
+def _seed(model, base, field):
+    """Next free number for ``base``, from one index range scan over its slugs."""
+    # Every slug equal to base or starting with "base-" sorts in [base, base + ".").
+    existing = model._default_manager.filter(**{f'{field}__gte': base, f'{field}__lt': base + '.'})
+    pattern = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    highest = 0 if NUMBERED.search(base) else None
+    for slug in existing.values_list(field, flat=True).iterator():
+        if slug == base:
+            highest = max(highest or 0, 1)
+        else:
+            match = pattern.match(slug)
+            if match:
+                highest = max(highest or 0, int(match.group(1)))
+    return 1 if highest is None else max(highest, 1) + 1
+
+
+def _format(base, number):
+    return base if number == 1 else f'{base}-{number}'
+
+
+def reserve(model, base, count=1, field='slug'):
+    """Reserve ``count`` consecutive slugs for ``base`` and return them in order."""
+    from .models import SlugCounter
+
+    scope = _scope(model, field)
+    counters = SlugCounter.objects.filter(scope=scope, base=base)
+    with transaction.atomic(savepoint=False):
+        if not counters.update(next_number=F('next_number') + count):
+            SlugCounter.objects.bulk_create(
+                [SlugCounter(scope=scope, base=base, next_number=_seed(model, base, field))],
+                ignore_conflicts=True,
+            )
+            counters.update(next_number=F('next_number') + count)
+        end = counters.values_list('next_number', flat=True).get()
+    return [_format(base, number) for number in range(end - count, end)]
+
+
+def allocate(model, text, field='slug'):
+    """A unique slug for one new ``model`` row titled ``text``."""
+    return reserve(model, slug_base(model, text, field), field=field)[0]
+
+
+def allocate_many(model, texts, field='slug'):
+    """Unique slugs for ``texts``, in order, with one reservation per distinct base."""
+    bases = [slug_base(model, text, field) for text in texts]
+    pools = {base: iter(reserve(model, base, count, field)) for base, count in Counter(bases).items()}
+    return [next(pools[base]) for base in bases]
@@ -0,0 +1,158 @@
+"""Owner dashboard statistics.
+
+OwnerStats keeps one row per (listing, month of start date) with the revenue,
+booking count and pending count of that bucket. Booking signals apply the
+difference between a booking's old and new contribution, so the dashboard
+reads a few dozen pre-aggregated rows instead of scanning every booking.
+``rebuild`` recomputes the table from the bookings and is what the
+reconcile_owner_stats command runs to repair drift from bulk updates.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from .models import Booking, Listing, OwnerStats
+
+STAT_FIELDS = ('listing_id', 'start_date', 'total_price', 'status', 'payment_status')
+BATCH_SIZE = 2000
+
+
+def contribution(booking):
+    """The (bucket, deltas) a booking adds to the stats, or None if unknown.
+
+    Returns None when any of the fields involved was deferred at load time,
+    in which case the booking's old contribution cannot be subtracted.
+    """
+    if any(name not in booking.__dict__ for name in STAT_FIELDS) or booking.start_date is None:
+        return None
+    paid = booking.status == 'confirmed' and booking.payment_status == 'paid'
+    return (
+        (booking.listing_id, booking.start_date.replace(day=1)),
+        {
+            'revenue': Decimal(str(booking.total_price or 0)) if paid else Decimal(0),
+            'bookings': 1,
+            'pending': 1 if booking.status == 'pending' else 0,
+        },
+    )
+
+
+def _apply(bucket, deltas, sign):
+    listing_id, month = bucket
+    changes = {name: F(name) + sign * value for name, value in deltas.items()}
+    if OwnerStats.objects.filter(listing_id=listing_id, month=month).update(**changes) or sign < 0:
+        # A missing row has nothing to subtract from; this also covers the
+        # cascade when a listing and its stats are deleted together.
+        return
+    owner_id = Listing.objects.filter(pk=listing_id).values_list('owner_id', flat=True).first()
+    if owner_id is None:
+        return
+    try:
+        with transaction.atomic():
+            OwnerStats.objects.create(owner_id=owner_id, listing_id=listing_id, month=month, **deltas)
+    except IntegrityError:
+        OwnerStats.objects.filter(listing_id=listing_id, month=month).update(**changes)
+
+
+def booking_saved(booking, previous):
+    """Move ``booking``'s contribution from ``previous`` to its current state."""
+    current = contribution(booking)
+    if current is None:
+        rebuild_listing(booking.listing_id)
+        return
+    if previous == current:
+        return
+    if previous is not None:
+        _apply(*previous, sign=-1)
+    _apply(*current, sign=1)
+
+
+def booking_deleted(previous, listing_id):
+    if previous is None:
+        rebuild_listing(listing_id)
+    else:
+        _apply(*previous, sign=-1)
+
+
+def _aggregate(bookings):
+    """One grouped query producing OwnerStats rows for ``bookings``."""
+    rows = (
+        bookings.annotate(month=TruncMonth('start_date'))
+        .values('listing_id', 'listing__owner_id', 'month')
+        .annotate(
+            revenue=Sum(Case(
+                When(status='confirmed', payment_status='paid', then=F('total_price')),
+                default=Value(0), output_field=DecimalField(max_digits=14, decimal_places=2),
+            )),
+            bookings=Count('pk'),
+            pending=Count('pk', filter=Q(status='pending')),
+        )
+        .order_by()
+    )
+    return [
+        OwnerStats(
+            owner_id=row['listing__owner_id'], listing_id=row['listing_id'], month=row['month'],
+            revenue=row['revenue'] or 0, bookings=row['bookings'], pending=row['pending'],
+        )
+        for row in rows.iterator()
+    ]
+
+
+def _by_bucket(rows):
+    return {
+        (stats.listing_id, stats.month): (stats.owner_id, Decimal(stats.revenue), stats.bookings, stats.pending)
+        for stats in rows
+    }
+
+
+@transaction.atomic
+def rebuild(owner_id=None):
+    """Recompute OwnerStats from bookings; returns how many rows were wrong.
+
+    A row counts as wrong if it was missing, stale or should not exist.
+    """
+    existing = OwnerStats.objects.all()
+    bookings = Booking.objects.all()
+    if owner_id is not None:
+        existing = existing.filter(owner_id=owner_id)
+        bookings = bookings.filter(listing__owner_id=owner_id)
+    fresh = _aggregate(bookings)
+    before, after = _by_bucket(existing), _by_bucket(fresh)
+    existing.delete()
+    OwnerStats.objects.bulk_create(fresh, batch_size=BATCH_SIZE)
+    return sum(1 for bucket in before.keys() | after.keys() if before.get(bucket) != after.get(bucket))
+
+
+def rebuild_listing(listing_id):
+    with transaction.atomic():
+        OwnerStats.objects.filter(listing_id=listing_id).delete()
+        OwnerStats.objects.bulk_create(_aggregate(Booking.objects.filter(listing_id=listing_id)))
+
+
+def owner_summary(owner):
+    """Totals, a per-listing breakdown and a monthly series from one query."""
+    rows = (
+        OwnerStats.objects.filter(owner=owner)
+        .values_list('listing_id', 'listing__title', 'month', 'revenue', 'bookings', 'pending')
+        .order_by('month')
+    )
+    totals = {'revenue': Decimal(0), 'bookings': 0, 'pending': 0}
+    listings = {}
+    months = {}
+    for listing_id, title, month, revenue, bookings, pending in rows:
+        for group in (
+            totals,
+            listings.setdefault(listing_id, {'listing_id': listing_id, 'title': title, 'revenue': Decimal(0), 'bookings': 0, 'pending': 0}),
+            months.setdefault(month, {'month': month, 'revenue': Decimal(0), 'bookings': 0, 'pending': 0}),
+        ):
+            group['revenue'] += revenue
+            group['bookings'] += bookings
+            group['pending'] += pending
+    return {
+        'total_revenue': totals['revenue'],
+        'total_bookings': totals['bookings'],
+        'pending_bookings': totals['pending'],
+        'listing_stats': sorted(listings.values(), key=lambda item: (-item['revenue'], -item['bookings'])),
+        'monthly_stats': list(months.values()),
+    }
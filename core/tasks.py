@@ -0,0 +1,134 @@
+"""A small database-backed task queue.
+
+Views enqueue side effects (SMS, receipts, provider calls) as Task rows in the
+same transaction as the write that caused them, and the run_tasks worker
+executes them later. Claiming is a conditional UPDATE, so several workers can
+share the table without row locks. Failures are retried with exponential
+backoff until ``max_attempts`` is reached. A claim is a lease: a task whose
+worker died is claimed again once the lease runs out, which counts as another
+attempt, and is failed instead when it has none left. An optional
+idempotency key makes enqueueing the same logical job twice a no-op.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 60 * 60
+LEASE_SECONDS = 5 * 60
+
+_registry = {}
+
+
+def task(name, max_attempts=5):
+    """Register ``func`` as the handler for tasks called ``name``."""
+    def decorator(func):
+        _registry[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """Queue a task and return it.
+
+    With ``key``, a task already queued under the same key is returned instead
+    of creating a second one.
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown task {name!r}")
+    _, max_attempts = _registry[name]
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'max_attempts': max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        queued = Task.objects.create(**fields)
+    else:
+        try:
+            with transaction.atomic():
+                queued = Task.objects.create(idempotency_key=key, **fields)
+        except IntegrityError:
+            return Task.objects.get(idempotency_key=key)
+
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run(queued.pk))
+    return queued
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _due():
+    now = timezone.now()
+    return (
+        Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    ) & Q(attempts__lt=F('max_attempts'))
+
+
+def expire_leases():
+    """Fail running tasks whose lease ran out on their last attempt; returns how many."""
+    now = timezone.now()
+    expired = Task.objects.filter(status='running', locked_until__lt=now, attempts__gte=F('max_attempts'))
+    count = expired.update(
+        status='failed', last_error='Lease expired on the final attempt.', locked_until=None, updated_at=now,
+    )
+    if count:
+        logger.error("%s tasks failed permanently after their lease expired", count)
+    return count
+
+
+def claim(task_id):
+    """Atomically take ownership of a due task; returns True if we got it."""
+    now = timezone.now()
+    return Task.objects.filter(_due(), pk=task_id).update(
+        status='running', attempts=F('attempts') + 1,
+        locked_until=now + timedelta(seconds=LEASE_SECONDS), updated_at=now,
+    ) == 1
+
+
+def run(task_id):
+    """Claim and execute one task. Returns False if another worker owns it."""
+    if not claim(task_id):
+        return False
+    queued = Task.objects.get(pk=task_id)
+    handler = _registry.get(queued.name)
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for {queued.name!r}")
+        handler[0](**queued.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts >= queued.max_attempts:
+            logger.error("Task %s (%s) failed permanently", queued.pk, queued.name)
+            Task.objects.filter(pk=queued.pk).update(status='failed', last_error=error, locked_until=None, updated_at=timezone.now())
+        else:
+            retry_at = timezone.now() + timedelta(seconds=backoff(queued.attempts))
+            Task.objects.filter(pk=queued.pk).update(status='queued', last_error=error, run_at=retry_at, locked_until=None, updated_at=timezone.now())
+        return True
+    Task.objects.filter(pk=queued.pk).update(status='succeeded', locked_until=None, updated_at=timezone.now())
+    return True
+
+
+def run_due(limit=50):
+    """Run up to ``limit`` due tasks, oldest first; returns how many were run."""
+    expire_leases()
+    ran = 0
+    for task_id in Task.objects.filter(_due()).order_by('run_at').values_list('pk', flat=True)[:limit]:
+        if run(task_id):
+            ran += 1
+    return ran
@@ -0,0 +1,31 @@
+from django import template
+from django.template.loader import render_to_string
+
+from core import pricing
+from core.caching import CARD_VARIANTS, card_key, cached_fragment, versions
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def listing_card(context, listing, variant='listing', quote_cents=None, distance=None):
+    """Render a listing card from ``core/cards/<variant>.html``, cached per listing.
+
+    Cards showing a quote for the searched dates or a distance from the
+    searched place are rendered fresh, since those differ for every search.
+    """
+    if variant not in CARD_VARIANTS:
+        raise template.TemplateSyntaxError(f"Unknown listing card variant {variant!r}")
+    if quote_cents not in (None, '') or distance not in (None, ''):
+        return render_to_string(f'core/cards/{variant}.html', {
+            'listing': listing,
+            'quote': pricing.from_cents(quote_cents) if quote_cents not in (None, '') else None,
+            'distance': distance if distance != '' else None,
+        })
+    # Looked up once per page render rather than once per card.
+    if 'categories_version' not in context.render_context:
+        context.render_context['categories_version'], = versions(['categories'])
+    return cached_fragment(
+        card_key(listing.pk, variant, context.render_context['categories_version']),
+        lambda: render_to_string(f'core/cards/{variant}.html', {'listing': listing}),
+    )
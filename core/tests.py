@@ -1,3 +1,1316 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import random
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, bulk, caching, calendars, eventlog, explain, facets, geo, images, instrumentation, journeys, pricing, ratings, realtime, search, slugs, stats, tasks
+from .benchmark import seed_activity, seed_catalog
+from .booking import BookingUnavailable, create_booking, filter_bookable
+from .models import Availability, Booking, Category, ConversationMember, Listing, ListingCalendar, ListingImage, Message, OwnerStats, Profile, Review, Task
+from .pagination import InvalidCursor, KeysetPaginator, RankedPaginator, cached_count, count_cache_key, decode_cursor, encode_cursor
+
+
+def make_listing(owner, **kwargs):
+    defaults = {
+        'title': 'Canon Camera',
+        'description': 'Full-frame DSLR with two lenses.',
+        'rental_type': 'equipment',
+        'price': 10000,
+        'location': 'Dar es Salaam',
+    }
+    defaults.update(kwargs)
+    return Listing.objects.create(owner=owner, **defaults)
+
+
+
+def first_images(request):
+    """One image query per listing: the N+1 pattern the instrumentation flags."""
+    return HttpResponse(str([listing.images.first() for listing in Listing.objects.all()]))
+
+
+# The project URLs with the public pages served by core.async_views.
+urlpatterns = [
+    path('n-plus-one/', first_images),
+    path('', async_views.home, name='home'),
+    path('listings/', async_views.listing_list, name='listing_list'),
+    path('listing/<int:pk>/', async_views.listing_detail, name='listing_detail'),
+    path('', include('edalali.urls')),
+]
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner')
+        self.listings = [make_listing(owner, title=f'Camera {number}') for number in range(7)]
+        # Four listings share a timestamp, so the id has to break the tie.
+        Listing.objects.filter(pk__in=[listing.pk for listing in self.listings[1:5]]).update(created_at=self.listings[1].created_at)
+        self.expected = list(Listing.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def test_keyset_pages_forward_and_back(self):
+        paginator = KeysetPaginator(Listing.objects.all(), per_page=3)
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append([listing.pk for listing in page])
+            self.assertEqual(page.has_previous, cursor is not None)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(pages, [self.expected[0:3], self.expected[3:6], self.expected[6:]])
+
+        second = paginator.page(paginator.page(cursor).previous_cursor)
+        self.assertEqual([listing.pk for listing in second], self.expected[3:6])
+        self.assertTrue(second.has_next and second.has_previous)
+        first = paginator.page(second.previous_cursor)
+        self.assertEqual([listing.pk for listing in first], self.expected[0:3])
+        self.assertFalse(first.has_previous)
+
+    def test_invalid_cursors(self):
+        paginator = KeysetPaginator(Listing.objects.all(), per_page=3)
+        for cursor in ('not a cursor', encode_cursor([1, 2]), encode_cursor({'v': [1]}), encode_cursor({'v': ['yesterday', 1]})):
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                paginator.page(cursor)
+        with self.assertRaises(InvalidCursor):
+            RankedPaginator(Listing.objects.all(), self.expected).page(encode_cursor({'o': -3}))
+        response = self.client.get(reverse('listing_list'), {'cursor': 'not a cursor'})
+        self.assertEqual(len(response.context['listings']), 7)
+        self.assertEqual(self.client.get(reverse('listing_list_json'), {'cursor': 'not a cursor'}).status_code, 400)
+
+    def test_ranked_pages_follow_the_ranking(self):
+        ranking = [listing.pk for listing in reversed(self.listings)]
+        hidden = self.listings[3]
+        Listing.objects.filter(pk=hidden.pk).update(is_available=False)
+        visible = [pk for pk in ranking if pk != hidden.pk]
+        paginator = RankedPaginator(Listing.objects.filter(is_available=True), ranking, per_page=4)
+
+        first = paginator.page()
+        self.assertEqual(([listing.pk for listing in first], first.count, first.previous_cursor), (visible[:4], 6, None))
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([listing.pk for listing in second], visible[4:])
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(decode_cursor(second.previous_cursor), {'o': 0})
+
+    def test_cached_count_is_capped(self):
+        listings = Listing.objects.all()
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_count(listings, 'test-count', limit=5), 6)
+        make_listing(self.listings[0].owner)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(listings, 'test-count', limit=5), 6)
+        self.assertEqual(cached_count(listings, 'test-count-uncapped'), 8)
+        self.assertEqual(count_cache_key('x', {'a': 1, 'b': 2}), count_cache_key('x', {'b': 2, 'a': 1}))
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.cameras = Category.objects.create(name='Cameras', slug='cameras')
+        self.listing = make_listing(self.owner, category=self.cameras)
+
+    def counters(self):
+        return caching.stats()
+
+    def test_anonymous_pages_are_cached_until_a_dependency_changes(self):
+        before = self.counters()
+        self.assertContains(self.client.get(reverse('home')), 'Canon Camera')
+        self.assertContains(self.client.get(reverse('home')), 'Canon Camera')
+        after = self.counters()
+        self.assertEqual(after.get('page_miss', 0) - before.get('page_miss', 0), 1)
+        self.assertEqual(after.get('page_hit', 0) - before.get('page_hit', 0), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.title = 'Nikon Camera'
+            self.listing.save()
+        self.assertContains(self.client.get(reverse('home')), 'Nikon Camera')
+
+        self.client.force_login(self.owner)
+        hits = self.counters().get('page_hit', 0)
+        self.client.get(reverse('home'))
+        self.assertEqual(self.counters().get('page_hit', 0), hits)
+
+    def test_card_fragments_follow_listing_and_category_changes(self):
+        url = reverse('listing_list')
+        # Signed in, so the page itself is not cached and only the cards are.
+        self.client.force_login(self.owner)
+        before = self.counters()
+        self.assertContains(self.client.get(url), 'Cameras')
+        self.client.get(url)
+        after = self.counters()
+        self.assertEqual(after.get('fragment_hit', 0) - before.get('fragment_hit', 0), 1)
+        self.assertIsNotNone(after['fragment_hit_ratio'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cameras.name = 'Photography'
+            self.cameras.save()
+        self.assertNotContains(self.client.get(url), 'Cameras')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.price = 12345
+            self.listing.save()
+        self.assertContains(self.client.get(url), '12,345')
+
+    def test_cache_stats_is_staff_only(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 302)
+        User.objects.filter(pk=self.owner.pk).update(is_staff=True)
+        self.assertIn('page_hit_ratio', self.client.get(reverse('cache_stats')).json())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.cameras = Category.objects.create(name='Cameras')
+
+    def test_index_follows_listing_changes(self):
+        listing = make_listing(self.owner, title='Nikon Camera', description='Mirrorless body.')
+        self.assertEqual(search.search_listing_ids('nik'), [listing.pk])
+        self.assertEqual(search.search_listing_ids('mirrorless camera'), [listing.pk])
+        self.assertEqual(search.search_listing_ids('canon'), [])
+
+        listing.title = 'Sony Camera'
+        listing.category = self.cameras
+        listing.save()
+        self.assertEqual(search.search_listing_ids('nikon'), [])
+        self.assertEqual(search.search_listing_ids('sony cameras'), [listing.pk])
+
+        listing.delete()
+        self.assertEqual(search.search_listing_ids('sony'), [])
+        self.assertEqual(search.search_listing_ids('!!'), [])
+
+    def test_title_matches_rank_first(self):
+        in_description = make_listing(self.owner, title='Tripod', description='Fits any camera.')
+        in_title = make_listing(self.owner, title='Camera', description='Body only.')
+        self.assertEqual(search.search_listing_ids('camera'), [in_title.pk, in_description.pk])
+
+    def test_rebuild_index(self):
+        listings = [make_listing(self.owner, title=f'Camera {number}') for number in range(3)]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(search.search_listing_ids('camera'), [])
+        self.assertEqual(search.rebuild_index(), 3)
+        self.assertEqual(sorted(search.search_listing_ids('camera')), [listing.pk for listing in listings])
+
+    def test_filters_apply_before_the_limit(self):
+        for number in range(5):
+            make_listing(self.owner, title=f'Camera {number}')
+        filtered = make_listing(self.owner, title='Tripod', description='Camera support.', category=self.cameras)
+        listings = Listing.objects.filter(category=self.cameras)
+        self.assertNotIn(filtered.pk, search.search_listing_ids('camera', limit=5))
+        self.assertEqual(search.search_listing_ids('camera', listings, limit=5), [filtered.pk])
+        self.assertEqual(search.search_listing_ids('camera', Listing.objects.none()), [])
+
+        with mock.patch.object(search, 'SEARCH_LIMIT', 5):
+            response = self.client.get(reverse('listing_list'), {'q': 'camera', 'category': self.cameras.pk})
+        self.assertEqual([listing.pk for listing in response.context['listings']], [filtered.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite connection settings")
+class SqliteSettingsTests(TransactionTestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_JOURNAL_MODE.lower())
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT)
+        self.assertEqual(connection.settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+    def test_transactions_take_write_lock_when_they_begin(self):
+        errors = []
+
+        def writer():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA busy_timeout = 0')
+                Category.objects.create(name='Tools', slug='tools')
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            # Nothing written yet: only an IMMEDIATE begin holds the lock here.
+            thread = threading.Thread(target=writer)
+            thread.start()
+            thread.join()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertEqual(len(errors), 1)
+        self.assertIn('locked', str(errors[0]))
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    threads = 8
+    attempts_per_thread = 10
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renters = [User.objects.create_user(f'renter{i}') for i in range(self.threads)]
+        self.listing = make_listing(self.owner)
+        self.start = date.today() + timedelta(days=1)
+        Availability.objects.create(listing=self.listing, start_date=self.start, end_date=self.start + timedelta(days=30))
+
+    def test_no_double_booking_under_contention(self):
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+        errors = []
+
+        def worker(renter, offset):
+            barrier.wait()
+            try:
+                for attempt in range(self.attempts_per_thread):
+                    first = self.start + timedelta(days=(offset + attempt) % 25)
+                    try:
+                        create_booking(self.listing, renter, first, first + timedelta(days=2), 30000)
+                        outcomes.append('booked')
+                    except BookingUnavailable:
+                        outcomes.append('rejected')
+                    except OperationalError as e:
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(renter, i)) for i, renter in enumerate(self.renters)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(outcomes), self.threads * self.attempts_per_thread)
+        bookings = list(Booking.objects.filter(listing=self.listing).order_by('start_date'))
+        self.assertEqual(len(bookings), outcomes.count('booked'))
+        self.assertGreater(len(bookings), 0)
+        for previous, current in zip(bookings, bookings[1:]):
+            self.assertGreater(current.start_date, previous.end_date)
+
+
+class BookableFilterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter')
+        self.start = date.today() + timedelta(days=10)
+        self.free = self.listing('Free', available=True)
+        self.booked = self.listing('Booked', available=True)
+        self.cancelled = self.listing('Cancelled', available=True)
+        self.unavailable = self.listing('Unavailable', available=False)
+        Booking.objects.create(
+            listing=self.booked, renter=self.renter, start_date=self.start + timedelta(days=2),
+            end_date=self.start + timedelta(days=4), total_price=10000, status='confirmed',
+        )
+        Booking.objects.create(
+            listing=self.cancelled, renter=self.renter, start_date=self.start,
+            end_date=self.start + timedelta(days=5), total_price=10000, status='cancelled',
+        )
+
+    def listing(self, title, available):
+        listing = make_listing(self.owner, title=title)
+        if available:
+            Availability.objects.create(listing=listing, start_date=self.start, end_date=self.start + timedelta(days=30))
+        return listing
+
+    def titles(self, start_offset, end_offset):
+        response = self.client.get(reverse('listing_list'), {
+            'start': (self.start + timedelta(days=start_offset)).isoformat(),
+            'end': (self.start + timedelta(days=end_offset)).isoformat(),
+        })
+        return sorted(listing.title for listing in response.context['listings'])
+
+    def test_overlapping_bookings_exclude_a_listing(self):
+        self.assertEqual(self.titles(0, 3), ['Cancelled', 'Free'])
+        self.assertEqual(self.titles(4, 6), ['Cancelled', 'Free'])
+        self.assertEqual(self.titles(5, 7), ['Booked', 'Cancelled', 'Free'])
+
+    def test_matches_create_booking(self):
+        for start_offset, end_offset in ((0, 3), (5, 7)):
+            start, end = self.start + timedelta(days=start_offset), self.start + timedelta(days=end_offset)
+            bookable = set(filter_bookable(Listing.objects.all(), start, end))
+            for listing in (self.free, self.booked, self.cancelled, self.unavailable):
+                with transaction.atomic():
+                    try:
+                        create_booking(listing, self.renter, start, end, 10000)
+                        accepted = True
+                    except BookingUnavailable:
+                        accepted = False
+                    transaction.set_rollback(True)
+                self.assertEqual(accepted, listing in bookable, (listing.title, start_offset))
+
+    def test_reversed_range_is_ignored(self):
+        self.assertEqual(self.titles(3, 0), ['Booked', 'Cancelled', 'Free', 'Unavailable'])
+
+
+class CalendarTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter')
+        self.listing = make_listing(self.owner)
+        self.today = timezone.localdate()
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def flags(self, first, last):
+        return calendars.day_flags(calendars.get_calendar(self.listing.pk), self.day(first), self.day(last))
+
+    def test_ranges_overlapping_the_epoch_are_clamped(self):
+        Availability.objects.create(listing=self.listing, start_date=self.day(-10), end_date=self.day(10))
+        Booking.objects.create(
+            listing=self.listing, renter=self.renter, start_date=self.day(-3), end_date=self.day(1), total_price=10000,
+        )
+        self.assertEqual(self.flags(-1, 11), [False, False, False] + [True] * 9 + [False])
+
+        # A rebase moves the epoch past the start of both rows.
+        ListingCalendar.objects.filter(listing=self.listing).update(epoch=self.day(-calendars.REBASE_AFTER_DAYS - 5))
+        self.assertEqual(self.flags(0, 2), [False, False, True])
+
+    def test_ranges_past_the_horizon_are_clamped(self):
+        horizon = calendars.HORIZON_DAYS
+        Availability.objects.create(listing=self.listing, start_date=self.day(horizon - 5), end_date=self.day(horizon + 20))
+        Booking.objects.create(
+            listing=self.listing, renter=self.renter, start_date=self.day(horizon - 2), end_date=self.day(horizon + 3),
+            total_price=10000,
+        )
+        self.assertEqual(self.flags(horizon - 6, horizon), [False, True, True, True, False, False, False])
+
+    def test_calendar_endpoint_reports_free_ranges(self):
+        Availability.objects.create(listing=self.listing, start_date=self.day(-10), end_date=self.day(4))
+        response = self.client.get(reverse('listing_calendar', args=[self.listing.pk]), {'days': 7})
+        self.assertEqual(response.json()['days'], '1111100')
+        self.assertEqual(response.json()['free_ranges'], [[self.today.isoformat(), self.day(4).isoformat()]])
+
+    def test_calendar_endpoint_rejects_dates_past_date_max(self):
+        url = reverse('listing_calendar', args=[self.listing.pk])
+        response = self.client.get(url, {'start': '9999-12-31', 'days': 1})
+        self.assertEqual(response.json()['days'], '0')
+        self.assertEqual(self.client.get(url, {'start': '9999-12-31', 'days': 2}).status_code, 400)
+
+    def test_free_listing_ids_requires_every_day_free(self):
+        other = make_listing(self.owner, title='Other')
+        Availability.objects.create(listing=self.listing, start_date=self.day(0), end_date=self.day(20))
+        Availability.objects.create(listing=other, start_date=self.day(0), end_date=self.day(5))
+        Booking.objects.create(
+            listing=self.listing, renter=self.renter, start_date=self.day(8), end_date=self.day(9), total_price=10000,
+        )
+        self.assertEqual(sorted(calendars.free_listing_ids(self.day(1), self.day(4))), sorted([self.listing.pk, other.pk]))
+        self.assertEqual(calendars.free_listing_ids(self.day(3), self.day(8)), [])
+        self.assertEqual(calendars.free_listing_ids(self.day(10), self.day(12)), [self.listing.pk])
+        self.assertEqual(calendars.free_listing_ids(self.day(1), self.day(4), Listing.objects.filter(pk=other.pk)), [other.pk])
+        self.assertEqual(calendars.free_listing_ids(self.day(-1), self.day(2)), [])
+
+
+def jpeg_upload(name='photo.jpg', size=(1200, 600), orientation=None, gps=False):
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    if gps:
+        exif[0x8825] = {1: 'S', 2: (6.0, 48.0, 0.0)}
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.listing = make_listing(User.objects.create_user('owner'))
+
+    def test_validate_upload(self):
+        images.validate_upload(jpeg_upload())
+        with self.assertRaises(ValidationError):
+            images.validate_upload(SimpleUploadedFile('photo.jpg', b'not an image'))
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PDF')
+        with self.assertRaises(ValidationError):
+            images.validate_upload(SimpleUploadedFile('photo.pdf', buffer.getvalue()))
+        with mock.patch.object(images, 'MAX_PIXELS', 1000), self.assertRaises(ValidationError):
+            images.validate_upload(jpeg_upload())
+
+    def test_renditions_are_recorded_and_metadata_stripped(self):
+        image = ListingImage.objects.create(listing=self.listing, image=jpeg_upload(orientation=6, gps=True))
+        upload = image.image.name
+        self.assertEqual(image.status, 'pending')
+        self.assertEqual(image.variant_url('thumbnail'), '')
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).thumbnail_url, '')
+
+        images.process_image(image.pk)
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.width, image.height), ('ready', 600, 1200))
+        self.assertEqual(
+            {name: (variant['width'], variant['height']) for name, variant in image.variants.items()},
+            {'thumbnail': (200, 400), 'medium': (400, 800), 'large': (600, 1200)},
+        )
+        self.assertEqual(image.webp_srcset.count('w, '), 2)
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).thumbnail_url, image.variant_url('thumbnail'))
+        stored = [image.image.path] + [default_storage.path(variant['jpeg']) for variant in image.variants.values()]
+        for path in stored:
+            with Image.open(path) as rendition:
+                self.assertEqual(dict(rendition.getexif()), {}, path)
+        self.assertNotEqual(image.image.name, upload)
+        self.assertFalse(default_storage.exists(upload))
+
+        stripped = image.image.name
+        images.process_image(image.pk)
+        image.refresh_from_db()
+        self.assertEqual(image.image.name, stripped)
+
+    def test_existing_images_are_processed_as_tasks(self):
+        image = ListingImage.objects.create(listing=self.listing, image=jpeg_upload())
+        queued = tasks.enqueue('image.process', {'image_id': image.pk})
+        tasks.run(queued.pk)
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'ready')
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).thumbnail_url, image.variant_url('thumbnail'))
+
+    def test_undecodable_upload_fails(self):
+        image = ListingImage.objects.create(
+            listing=self.listing, image=SimpleUploadedFile('photo.jpg', b'jpeg', content_type='image/jpeg'),
+        )
+        images.process_image(image.pk)
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.variants), ('failed', {}))
+        response = self.client.get(reverse('listing_detail', args=[self.listing.pk]))
+        self.assertNotContains(response, image.image.url)
+        self.assertContains(response, 'Image unavailable')
+
+
+task_calls = []
+
+
+@tasks.task('tests.record', max_attempts=2)
+def record_task(value, fail=False):
+    task_calls.append(value)
+    if fail:
+        raise RuntimeError(f"failed on {value}")
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        task_calls.clear()
+
+    def test_claim_is_exclusive(self):
+        queued = tasks.enqueue('tests.record', {'value': 1})
+        self.assertTrue(tasks.claim(queued.pk))
+        self.assertFalse(tasks.claim(queued.pk))
+        self.assertFalse(tasks.run(queued.pk))
+        self.assertEqual(task_calls, [])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('running', 1))
+
+    def test_failures_back_off_then_fail(self):
+        queued = tasks.enqueue('tests.record', {'value': 1, 'fail': True})
+        self.assertEqual(tasks.run_due(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertIn('failed on 1', queued.last_error)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=7))
+        self.assertEqual(tasks.run_due(), 0)
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_due(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(task_calls, [1, 1])
+
+    def test_backoff_grows_to_the_cap(self):
+        self.assertTrue(8 <= tasks.backoff(1) <= 12)
+        self.assertTrue(16 <= tasks.backoff(2) <= 24)
+        self.assertLessEqual(tasks.backoff(30), tasks.BACKOFF_MAX_SECONDS * 1.2)
+
+    def test_idempotency_key(self):
+        first = tasks.enqueue('tests.record', {'value': 1}, key='record:1')
+        second = tasks.enqueue('tests.record', {'value': 2}, key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Task.objects.count(), 1)
+        tasks.run_due()
+        self.assertEqual(task_calls, [1])
+
+    def test_expired_lease_is_reclaimed_until_attempts_run_out(self):
+        queued = tasks.enqueue('tests.record', {'value': 1})
+        expired = timezone.now() - timedelta(seconds=1)
+        Task.objects.filter(pk=queued.pk).update(status='running', attempts=1, locked_until=expired)
+        self.assertEqual(tasks.run_due(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('succeeded', 2))
+
+        Task.objects.filter(pk=queued.pk).update(status='running', attempts=2, locked_until=expired)
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_due(), 0)
+        self.assertFalse(tasks.claim(queued.pk))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(task_calls, [1])
+
+
+class OwnerStatsTests(TestCase):
+    """Incremental stats always match a full rebuild."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter')
+        self.listing = make_listing(self.owner)
+
+    def snapshot(self):
+        return sorted(OwnerStats.objects.values_list('owner_id', 'listing_id', 'month', 'revenue', 'bookings', 'pending'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        self.assertEqual(stats.rebuild(), 0)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def book(self, start, **kwargs):
+        return Booking.objects.create(
+            listing=self.listing, renter=self.renter, start_date=start, end_date=start + timedelta(days=2),
+            total_price=kwargs.pop('total_price', 15000), **kwargs,
+        )
+
+    def test_booking_lifecycle(self):
+        first = self.book(date(2026, 3, 10))
+        second = self.book(date(2026, 3, 20), status='confirmed', payment_status='paid')
+        self.assertMatchesRebuild()
+
+        first = Booking.objects.get(pk=first.pk)
+        first.status, first.payment_status = 'confirmed', 'paid'
+        first.save()
+        self.assertMatchesRebuild()
+
+        second.start_date, second.end_date = date(2026, 4, 2), date(2026, 4, 4)
+        second.save()
+        self.assertMatchesRebuild()
+
+        Booking.objects.only('pk', 'listing_id').get(pk=first.pk).delete()
+        self.assertMatchesRebuild()
+        summary = stats.owner_summary(self.owner)
+        self.assertEqual((summary['total_bookings'], summary['pending_bookings'], summary['total_revenue']), (1, 0, 15000))
+        self.assertEqual([row['month'] for row in summary['monthly_stats']], [date(2026, 4, 1)])
+
+    def test_rebuild_repairs_bulk_updates(self):
+        booking = self.book(date(2026, 3, 10))
+        Booking.objects.filter(pk=booking.pk).update(status='cancelled')
+        self.assertEqual(stats.rebuild(), 1)
+        self.assertEqual(stats.owner_summary(self.owner)['pending_bookings'], 0)
+
+    def test_listing_delete_removes_stats(self):
+        self.book(date(2026, 3, 10))
+        self.listing.delete()
+        self.assertFalse(OwnerStats.objects.exists())
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.listings = [make_listing(self.owner, title=f'Camera {number}', slug=f'camera-{number}') for number in range(3)]
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        response = self.client.get(reverse('api_listing_list'), {'fields': 'id,title', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([set(row) for row in body['results']], [{'id', 'title'}] * 2)
+        self.assertIsNone(body['previous'])
+        rest = self.client.get(body['next']).json()
+        self.assertEqual([row['id'] for row in body['results'] + rest['results']], [listing.pk for listing in reversed(self.listings)])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('api_listing_list'), {'fields': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_listing_list'), {'cursor': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_listing_list'), {'updated_since': 'yesterday'}).status_code, 400)
+
+    def test_conditional_get(self):
+        url = reverse('api_listing_detail', args=[self.listings[0].pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.listings[0].title = 'Renamed'
+        self.listings[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_collection_etag_changes_on_delete(self):
+        url = reverse('api_listing_list')
+        etag = self.client.get(url)['ETag']
+        self.listings[1].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def legacy_total_price(listing, start_date, end_date):
+    """The float implementation pricing.quote replaced, kept as a reference."""
+    duration_days = (end_date - start_date).days
+    price = float(listing.price)
+    factor = {'hour': duration_days * 24, 'day': duration_days, 'week': duration_days / 7,
+              'month': duration_days / 30, 'year': duration_days / 365}[listing.pricing_unit]
+    return round(price * factor, 2)
+
+
+class PricingTests(TestCase):
+    def random_listings(self, rng, count):
+        owner = User.objects.create_user('owner')
+        return [
+            make_listing(
+                owner, title=f'Item {number}',
+                price=Decimal(rng.randint(0, 5_000_000)) / 100,
+                pricing_unit=rng.choice(list(pricing.UNIT_HOURS)),
+            )
+            for number in range(count)
+        ]
+
+    def test_matches_legacy_for_whole_days(self):
+        rng = random.Random(14)
+        for listing in self.random_listings(rng, 200):
+            start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 365))
+            end = start + timedelta(days=rng.randint(1, 400))
+            quoted = pricing.quote_listing(listing, start, end)
+            legacy = Decimal(str(legacy_total_price(listing, start, end)))
+            self.assertEqual(quoted, quoted.quantize(pricing.CENT))
+            if listing.pricing_unit in ('hour', 'day'):
+                self.assertEqual(quoted, legacy)
+            else:
+                # The float version can land one cent off on half-cent ties.
+                self.assertLessEqual(abs(quoted - legacy), pricing.CENT)
+
+    def test_batch_quotes_match_single_quotes(self):
+        rng = random.Random(15)
+        listings = {listing.pk: listing for listing in self.random_listings(rng, 100)}
+        for _ in range(10):
+            start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 365))
+            end = start + timedelta(days=rng.randint(1, 100))
+            annotated = pricing.annotate_quotes(Listing.objects.all(), start, end).values_list('pk', 'quote_cents')
+            for pk, cents in annotated:
+                self.assertEqual(pricing.from_cents(cents), pricing.quote_listing(listings[pk], start, end))
+
+    def test_partial_days_bill_started_hours(self):
+        start = datetime(2026, 5, 1, 9, 0)
+        self.assertEqual(pricing.quote(Decimal('2400'), 'day', start, start + timedelta(hours=5, minutes=1)), Decimal('600.00'))
+        self.assertEqual(pricing.quote(Decimal('1000'), 'hour', start, start + timedelta(minutes=90)), Decimal('2000.00'))
+        self.assertEqual(pricing.quote(Decimal('100'), 'week', date(2026, 5, 1), date(2026, 5, 2)), Decimal('14.29'))
+        with self.assertRaises(ValidationError):
+            pricing.quote(Decimal('100'), 'day', date(2026, 5, 2), date(2026, 5, 2))
+
+    def test_listing_list_shows_quotes_for_dates(self):
+        listing = make_listing(User.objects.create_user('owner'), price=Decimal('1000.50'))
+        start = date.today() + timedelta(days=1)
+        Availability.objects.create(listing=listing, start_date=start, end_date=start + timedelta(days=10))
+        params = {'start': start.isoformat(), 'end': (start + timedelta(days=3)).isoformat()}
+        response = self.client.get(reverse('listing_list'), params)
+        self.assertContains(response, 'TSh 3,001.50 total for your dates')
+        self.assertEqual(self.client.get(reverse('listing_list_json'), params).json()['results'][0]['quote'], '3001.50')
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+
+    def test_same_title_gets_next_suffix(self):
+        created = [make_listing(self.owner, title='Camera').slug for _ in range(3)]
+        self.assertEqual(created, ['camera', 'camera-2', 'camera-3'])
+        with self.assertNumQueries(2):
+            self.assertEqual(slugs.allocate(Listing, 'Camera!'), 'camera-4')
+
+    def test_seeds_from_existing_slugs(self):
+        make_listing(self.owner, title='Drill', slug='drill')
+        make_listing(self.owner, title='Drill', slug='drill-7')
+        make_listing(self.owner, title='Drill press', slug='drill-press')
+        self.assertEqual(slugs.allocate_many(Listing, ['Drill', 'Tent', 'Drill']), ['drill-8', 'tent', 'drill-9'])
+
+    def test_numbered_titles_do_not_take_suffixed_slugs(self):
+        self.assertEqual(make_listing(self.owner, title='Camera 2').slug, 'camera-2-2')
+        self.assertEqual([make_listing(self.owner, title='Camera').slug for _ in range(2)], ['camera', 'camera-2'])
+
+    def test_long_titles_are_truncated(self):
+        slug = make_listing(self.owner, title='Very long title ' * 10).slug
+        self.assertLessEqual(len(slug) + len('-9999999999'), Listing._meta.get_field('slug').max_length)
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter')
+        self.listing = make_listing(self.owner)
+
+    def member(self, user):
+        return ConversationMember.objects.get(user=user, conversation__listing=self.listing)
+
+    def test_messages_thread_by_listing_and_pair(self):
+        self.client.force_login(self.renter)
+        response = self.client.post(reverse('send_message', args=[self.listing.pk]), {'content': 'Is it free on Friday?'})
+        first = Message.objects.get()
+        self.assertRedirects(response, reverse('conversation', args=[first.conversation_id]))
+        Message.objects.create(sender=self.owner, recipient=self.renter, listing=self.listing, content='Yes.')
+        Message.objects.create(sender=self.renter, recipient=self.owner, listing=make_listing(self.owner), content='And this one?')
+
+        self.assertEqual(Message.objects.filter(conversation=first.conversation).count(), 2)
+        self.assertEqual(self.member(self.owner).unread_count, 1)
+        self.assertEqual(self.member(self.renter).unread_count, 1)
+        self.assertEqual(first.conversation.members.count(), 2)
+        first.conversation.refresh_from_db()
+        self.assertEqual(first.conversation.last_message.content, 'Yes.')
+
+    def test_opening_and_polling_mark_messages_read(self):
+        sent = [Message.objects.create(sender=self.renter, recipient=self.owner, listing=self.listing, content=str(n)) for n in range(3)]
+        conversation_id = sent[0].conversation_id
+        self.client.force_login(self.owner)
+
+        response = self.client.get(reverse('conversation_messages_json', args=[conversation_id]), {'since': sent[0].pk})
+        self.assertEqual([message['content'] for message in response.json()['messages']], ['1', '2'])
+        self.assertEqual(response.json()['last_id'], sent[2].pk)
+        self.assertEqual(self.member(self.owner).unread_count, 0)
+        self.assertFalse(Message.objects.filter(recipient=self.owner, is_read=False).exists())
+
+        response = self.client.post(reverse('conversation', args=[conversation_id]), {'content': 'Sure.'})
+        self.assertRedirects(response, reverse('conversation', args=[conversation_id]))
+        self.assertEqual(self.member(self.renter).unread_count, 1)
+        self.client.force_login(self.renter)
+        self.assertContains(self.client.get(reverse('conversation', args=[conversation_id])), 'Sure.')
+        self.assertEqual(self.member(self.renter).unread_count, 0)
+
+    def test_conversations_are_private(self):
+        message = Message.objects.create(sender=self.renter, recipient=self.owner, listing=self.listing, content='Hi')
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.client.get(reverse('conversation', args=[message.conversation_id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('conversation_messages_json', args=[message.conversation_id])).status_code, 404)
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter')
+        self.listing = make_listing(self.owner)
+
+    def scope(self, user=None):
+        headers = [(b'host', b'testserver'), (b'origin', b'http://testserver')]
+        if user is not None:
+            self.client.force_login(user)
+            headers.append((b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.client.session.session_key}'.encode()))
+        return {'type': 'websocket', 'path': settings.REALTIME_PATH, 'headers': headers}
+
+    @async_to_sync
+    async def connect(self, scope, publish=None):
+        """Open a socket, run ``publish`` once it is subscribed, and return what the server sent."""
+        communicator = ApplicationCommunicator(realtime.websocket_app, scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        events = [await communicator.receive_output(1)]
+        if events[0]['type'] == 'websocket.accept' and publish is not None:
+            await asyncio.sleep(0.05)
+            await sync_to_async(publish)()
+            events.append(await communicator.receive_output(1))
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(1)
+        return events
+
+    def test_socket_without_session_is_refused(self):
+        self.assertEqual(self.connect(self.scope()), [{'type': 'websocket.close', 'code': realtime.UNAUTHORIZED}])
+
+    def test_new_message_is_pushed_to_recipient(self):
+        def send():
+            with self.captureOnCommitCallbacks(execute=True):
+                Message.objects.create(sender=self.renter, recipient=self.owner, listing=self.listing, content='Hi')
+
+        accepted, pushed = self.connect(self.scope(self.owner), send)
+        self.assertEqual(accepted['type'], 'websocket.accept')
+        event = json.loads(pushed['text'])
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['conversation'], Message.objects.get().conversation_id)
+        self.assertEqual(event['sender'], 'renter')
+
+
+class RatingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.renter = User.objects.create_user('renter', password='secret')
+        self.listing = make_listing(self.owner)
+
+    def review(self, rating, listing=None):
+        booking = Booking.objects.create(
+            listing=listing or self.listing, renter=self.renter, start_date=date(2030, 1, 1), end_date=date(2030, 1, 2),
+            total_price=10000, status='confirmed', payment_status='paid',
+        )
+        return Review.objects.create(booking=booking, rating=rating, comment='Fine.')
+
+    def test_aggregates_follow_reviews(self):
+        reviews = [self.review(rating) for rating in (5, 4, 4)]
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.rating_count, self.listing.rating_4, self.listing.rating_5), (3, 2, 1))
+        self.assertAlmostEqual(self.listing.rating_avg, 13 / 3)
+
+        reviews[0].rating = 1
+        reviews[0].save()
+        reviews[1].delete()
+        self.listing.refresh_from_db()
+        self.assertEqual([count for _, count, _ in self.listing.rating_histogram], [0, 1, 0, 0, 1])
+        self.assertEqual(self.listing.rating_avg, 2.5)
+        self.assertEqual(ratings.rebuild(), 0)
+
+        Listing.objects.filter(pk=self.listing.pk).update(rating_count=0, rating_avg=0)
+        self.assertEqual(ratings.rebuild([self.listing.pk]), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.rating_count, self.listing.rating_avg), (2, 2.5))
+
+    def test_listing_list_sorts_and_filters_by_rating(self):
+        best = make_listing(self.owner, title='Sony Camera')
+        self.review(5, best)
+        self.review(3)
+        response = self.client.get(reverse('listing_list'), {'sort': 'rating'})
+        self.assertEqual([listing.pk for listing in response.context['listings']], [best.pk, self.listing.pk])
+        response = self.client.get(reverse('listing_list'), {'min_rating': '4'})
+        self.assertEqual([listing.pk for listing in response.context['listings']], [best.pk])
+
+    def test_listing_detail_pages_reviews(self):
+        for _ in range(12):
+            self.review(4)
+        response = self.client.get(reverse('listing_detail', args=[self.listing.pk]))
+        self.assertEqual(len(response.context['reviews']), 10)
+        response = self.client.get(reverse('listing_detail', args=[self.listing.pk]), {'reviews': response.context['reviews'].next_cursor})
+        self.assertEqual(len(response.context['reviews']), 2)
+
+    def test_booking_can_be_reviewed_once(self):
+        booking = self.review(5).booking
+        self.client.login(username='renter', password='secret')
+        response = self.client.post(reverse('leave_review', args=[booking.pk]), {'rating': 1, 'comment': 'Again.'})
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertEqual(Review.objects.count(), 1)
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+
+    def test_geocode_prefers_the_most_specific_whole_word_match(self):
+        self.assertEqual(geo.geocode('Masaki, Dar es Salaam').name, 'Masaki')
+        self.assertEqual(geo.geocode('near DAR city centre').name, 'Dar es Salaam')
+        self.assertIsNone(geo.geocode('Mdaraka'))
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_listings_are_located_on_save(self):
+        listing = make_listing(self.owner, location='Kariakoo')
+        self.assertEqual(listing.geohash, geo.encode(listing.latitude, listing.longitude))
+        listing.location = 'Somewhere new'
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual((listing.latitude, listing.geohash), (None, ''))
+
+    def test_near_filters_by_radius_and_sorts_nearest_first(self):
+        kariakoo = make_listing(self.owner, title='Kariakoo drill', location='Kariakoo, Dar es Salaam')
+        masaki = make_listing(self.owner, title='Masaki drill', location='Masaki')
+        make_listing(self.owner, title='Arusha drill', location='Arusha')
+        make_listing(self.owner, title='Nowhere drill', location='Mdaraka')
+
+        response = self.client.get(reverse('listing_list'), {'near': 'Upanga', 'radius': '10'})
+        self.assertEqual([listing.pk for listing in response.context['listings']], [kariakoo.pk, masaki.pk])
+        self.assertContains(response, 'km away')
+        response = self.client.get(reverse('listing_list'), {'lat': '-6.75', 'lng': '39.28', 'radius': '2'})
+        self.assertEqual([listing.pk for listing in response.context['listings']], [masaki.pk])
+        response = self.client.get(reverse('listing_list'), {'bbox': '39.0,-7.0,39.5,-6.5'})
+        self.assertEqual({listing.pk for listing in response.context['listings']}, {kariakoo.pk, masaki.pk})
+        response = self.client.get(reverse('listing_list'), {'near': 'Atlantis'})
+        self.assertTrue(response.context['near_unknown'])
+
+    def test_cover_spans_the_box(self):
+        box = geo.bounding_box(-6.7924, 39.2083, 25)
+        cells = geo.cover(*box)
+        self.assertLessEqual(len(cells), geo.MAX_CELLS)
+        for latitude in (box[0], box[2]):
+            for longitude in (box[1], box[3]):
+                self.assertTrue(any(geo.encode(latitude, longitude).startswith(cell) for cell in cells))
+
+    def test_prefix_ranges_use_only_base32_characters(self):
+        self.assertEqual(geo.next_prefix('kx'), 'ky')
+        self.assertEqual(geo.next_prefix('k9'), 'kb')
+        self.assertEqual(geo.next_prefix('kzz'), 'm')
+        self.assertIsNone(geo.next_prefix('zz'))
+        for cell in geo.cover(*geo.bounding_box(-6.7924, 39.2083, 25)):
+            self.assertTrue(set(geo.next_prefix(cell)) <= set(geo.BASE32))
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.cameras = Category.objects.create(name='Cameras', slug='cameras')
+        make_listing(self.owner, category=self.cameras, price=5000, instant_book=True)
+        make_listing(self.owner, category=self.cameras, price=60000, pricing_unit='week')
+        make_listing(self.owner, rental_type='property', price=600000, pricing_unit='month')
+
+    def test_counts_every_facet_in_one_cached_query(self):
+        listings = Listing.objects.filter(is_available=True)
+        with self.assertNumQueries(1):
+            counts = facets.counts(listings, {'q': ''})
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['category'], {self.cameras.pk: 2, None: 1})
+        self.assertEqual(counts['rental_type'], {'property': 1, 'equipment': 2, 'service': 0, 'package': 0})
+        self.assertEqual((counts['pricing_unit']['week'], counts['instant_book']), (1, 1))
+        self.assertEqual(counts['price'], [1, 0, 1, 0, 0, 1])
+        with self.assertNumQueries(0):
+            self.assertEqual(facets.counts(listings, {'q': '', 'sort': 'rating'}), counts)
+
+    def test_facet_links_filter_the_list(self):
+        response = self.client.get(reverse('listing_list'), {'rental_type': 'equipment', 'price_range': '2'})
+        self.assertEqual(len(response.context['listings']), 1)
+        groups = dict(response.context['facet_groups'])
+        selected = [option for option in groups['Type'] if option['selected']]
+        self.assertEqual((selected[0]['count'], selected[0]['query']), (1, 'price_range=2'))
+        data = self.client.get(reverse('listing_list_json'), {'category': self.cameras.pk}).json()
+        self.assertEqual(data['facets']['instant_book'], 1)
+        self.assertEqual(data['facets']['price'][0], {'range': 0, 'min': 0, 'max': 10000, 'count': 1})
+
+    def test_each_facet_ignores_its_own_selection(self):
+        filters = {'category': str(self.cameras.pk), 'rental_type': 'equipment', 'pricing_unit': '', 'instant_book': '', 'price_range': ''}
+        counts = facets.counts(Listing.objects.all(), filters)
+        self.assertEqual(counts['total'], 2)
+        self.assertEqual(counts['category'], {self.cameras.pk: 2})
+        self.assertEqual(counts['rental_type'], {'property': 0, 'equipment': 2, 'service': 0, 'package': 0})
+
+        cache.clear()
+        response = self.client.get(reverse('listing_list'), {'rental_type': 'property'})
+        self.assertEqual(len(response.context['listings']), 1)
+        types = {option['label']: option['count'] for option in dict(response.context['facet_groups'])['Type']}
+        self.assertEqual((types['Property'], types['Equipment']), (1, 2))
+        self.assertEqual([category['count'] for category in response.context['categories']], [0])
+        self.assertContains(response, 'Equipment <span class="opacity-75">2</span>', html=False)
+
+    def test_search_facets_count_every_match(self):
+        response = self.client.get(reverse('listing_list'), {'q': 'camera', 'category': self.cameras.pk, 'instant_book': '1'})
+        self.assertEqual(len(response.context['listings']), 1)
+        groups = dict(response.context['facet_groups'])
+        self.assertEqual(groups['Booking'][0]['count'], 1)
+        self.assertEqual(sum(option['count'] for option in groups['Price']), 1)
+        self.assertEqual(response.context['categories'][0]['count'], 1)
+
+
+class JourneyTests(TestCase):
+    def test_default_mix_replays_a_review_journey(self):
+        review = next(journey for journey in journeys.load_mix() if journey.name == 'review')
+        listing_ids = seed_catalog(20, seed=5, bookings_per_listing=0)
+        renter = seed_activity(listing_ids, 1, seed=5, messages_per_renter=1)[0]
+        catalog = {
+            'listing_ids': listing_ids,
+            'availability': {row.listing_id: (row.start_date, row.end_date) for row in Availability.objects.filter(listing_id__in=listing_ids)},
+        }
+        recorder = journeys.Recorder()
+        journeys.Visitor(journeys.ClientTransport(recorder), renter, catalog, random.Random(1)).walk(review)
+
+        report = recorder.report(1)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['outcomes'], {'booked': 1, 'reviewed': 1})
+        self.assertTrue(Review.objects.filter(booking__renter=renter).exists())
+        self.assertGreater(report['views']['POST book_listing']['queries'], 0)
+        self.assertEqual(journeys.compare(report, report, 0), [])
+        slower = json.loads(json.dumps(report))
+        slower['views']['GET home']['queries'] += 1
+        self.assertEqual(len(journeys.compare(report, slower, 0)), 0)
+        self.assertEqual(len(journeys.compare(slower, report, 0)), 1)
+
+    def test_unknown_steps_are_rejected(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as mix:
+            mix.write('{"name": "x", "steps": ["home", "teleport"]}\n')
+            mix.flush()
+            with self.assertRaisesMessage(ValueError, "teleport"):
+                journeys.load_mix(mix.name)
+
+
+class BenchJourneysCommandTests(TransactionTestCase):
+    def test_cleanup_removes_seeded_rows_and_their_tasks(self):
+        out = io.StringIO()
+        call_command('bench_journeys', journeys=20, listings=30, renters=3, concurrency=2, stdout=out)
+        self.assertIn('0 errors', out.getvalue())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Listing.objects.exists())
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='core.tests')
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+        self.owner = User.objects.create_user('owner')
+        for number in range(3):
+            make_listing(self.owner, title=f'Canon {number}')
+
+    def test_profiles_sync_and_async_requests(self):
+        response = self.client.get(reverse('listing_list_json'))
+        async_to_sync(self.async_client.get)(reverse('listing_list'))
+        page, data = instrumentation.recent()
+        self.assertEqual((data['view'], data['status']), ('listing_list_json', 200))
+        self.assertEqual(data['response_bytes'], len(response.content))
+        self.assertEqual(page['view'], 'listing_list')
+        self.assertGreater(page['queries'], 0)
+        self.assertGreater(page['template_ms'], 0)
+        self.assertEqual(page['duplicate_queries'], 0)
+
+    def test_flags_repeated_queries(self):
+        self.client.get('/n-plus-one/')
+        profile = instrumentation.recent()[0]
+        self.assertEqual((profile['queries'], profile['duplicate_queries'], profile['most_repeated_count']), (4, 2, 3))
+        self.assertIn('core_listingimage', profile['most_repeated_sql'])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_export(self):
+        self.client.get(reverse('listing_list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('request_profiles')).status_code, 302)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertContains(response, 'edalali_http_request_duration_seconds_count{view="listing_list",method="GET"} 1')
+        self.assertContains(response, 'edalali_http_responses_total{view="metrics",method="GET",status="403"} 1')
+
+
+class EventLogTests(TestCase):
+    def background_logger(self, directory, **kwargs):
+        handler = eventlog.BackgroundHandler(f'{directory}/events.jsonl', **kwargs)
+        logger = logging.getLogger('core.tests.eventlog')
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, 'propagate', True)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return logger, handler
+
+    def test_background_handler_writes_rotated_json_lines(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        logger, handler = self.background_logger(directory, max_bytes=400, backup_count=1)
+
+        eventlog.event(logger, 'booking.created', user_id=1, listing_id=2, booking_id=3, duration_ms=4.5)
+        try:
+            raise ValueError('card declined')
+        except ValueError:
+            eventlog.event(logger, 'booking.payment_failed', level=logging.ERROR, exc_info=True, booking_id=3)
+        handler.flush()
+
+        with open(f'{directory}/events.jsonl.1') as old, open(f'{directory}/events.jsonl') as new:
+            created, failed = [json.loads(line) for line in old.readlines() + new.readlines()]
+        self.assertEqual(
+            {key: created[key] for key in ('event', 'level', 'user_id', 'listing_id', 'booking_id', 'duration_ms')},
+            {'event': 'booking.created', 'level': 'INFO', 'user_id': 1, 'listing_id': 2, 'booking_id': 3, 'duration_ms': 4.5},
+        )
+        self.assertEqual((failed['event'], failed['level']), ('booking.payment_failed', 'ERROR'))
+        self.assertIn('ValueError: card declined', failed['exc'])
+
+    def test_records_are_rendered_on_the_calling_thread(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        logger, handler = self.background_logger(directory)
+        rendered_on = []
+
+        class Listing:
+            title = 'Canon'
+
+            def __str__(self):
+                rendered_on.append(threading.current_thread())
+                return self.title
+
+        listing = Listing()
+        logger.info("Saved %s", listing, extra={'event': 'listing.saved', 'listing': listing, 'tags': None})
+        listing.title = 'Nikon'
+        handler.flush()
+
+        with open(f'{directory}/events.jsonl') as events:
+            saved = json.loads(events.readline())
+        self.assertEqual((saved['message'], saved['listing'], saved['tags']), ('Saved Canon', 'Canon', None))
+        self.assertEqual(set(rendered_on), {threading.current_thread()})
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='secret')
+        cameras = Category.objects.create(name='Cameras', slug='cameras')
+        make_listing(self.owner, title='Canon Camera', slug='canon-camera', category=cameras)
+
+    def test_import_then_export_round_trip(self):
+        rows = 'title,description,category,rental_type,price,pricing_unit,location,instant_book\n'
+        rows += 'Canon Camera,DSLR,Cameras,equipment,10000,day,Arusha,yes\n' * 3
+        rows += 'Broken,No price,cameras,equipment,,day,Arusha,no\n'
+        rows += 'Lost,Unknown category,Boats,equipment,5,day,Arusha,no\n'
+        self.client.login(username='owner', password='secret')
+        upload = SimpleUploadedFile('listings.csv', rows.encode())
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('import_listings'), {'file': upload})
+        result = response.context['result']
+        self.assertEqual(result.created, 3)
+        self.assertEqual([line for line, _ in result.errors], [5, 6])
+        self.assertEqual(
+            sorted(Listing.objects.filter(title='Canon Camera').values_list('slug', flat=True)),
+            ['canon-camera', 'canon-camera-2', 'canon-camera-3', 'canon-camera-4'],
+        )
+        self.assertTrue(Listing.objects.get(slug='canon-camera-2').instant_book)
+
+        response = self.client.get(reverse('export_listings'), {'format': 'jsonl'})
+        exported = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(exported), 4)
+        again = bulk.import_listings(bulk.read_rows(io.BytesIO('\n'.join(exported).encode()), 'jsonl'), self.owner)
+        self.assertEqual((again.created, again.errors), (4, []))
+
+    def test_unreadable_file_is_reported(self):
+        self.client.login(username='owner', password='secret')
+        rows = 'title,description,category,rental_type,price,pricing_unit,location,instant_book\n'
+        rows += 'Caf\u00e9 Camera,DSLR,Cameras,equipment,10000,day,Arusha,yes\n'
+        upload = SimpleUploadedFile('listings.csv', rows.encode('latin-1'))
+        response = self.client.post(reverse('import_listings'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 0)
+        self.assertContains(response, 'the file is not UTF-8 text')
+
+        rows = 'title,description\nCanon Camera,DSLR\nNikon Camera,' + 'x' * 200 + '\n'
+        limit = csv.field_size_limit(100)
+        try:
+            result = bulk.import_listings(bulk.read_rows(io.BytesIO(rows.encode()), 'csv'), self.owner)
+        finally:
+            csv.field_size_limit(limit)
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.file_error, 'Stopped reading after line 2: field larger than field limit (100).')
+
+
+class QueryPlanTests(TestCase):
+    def test_scanned_tables_resolves_aliases(self):
+        sql = 'SELECT 1 FROM "core_listing" WHERE EXISTS (SELECT 1 FROM "core_booking" U0 WHERE U0."listing_id" = 1)'
+        self.assertEqual(explain.scanned_tables(sql, ['SCAN core_listing', 'SCAN U0']), {'core_listing', 'core_booking'})
+        self.assertEqual(explain.scanned_tables(sql, ['SCAN core_listing USING INDEX listing_available_recent']), set())
+
+    def test_core_views_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_queries', listings=2000, stdout=out)
+        self.assertIn('No full table scans.', out.getvalue())
+
+
+@override_settings(ROOT_URLCONF='core.tests')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.cameras = Category.objects.create(name='Cameras', slug='cameras')
+        self.listings = [make_listing(self.owner, title=f'Canon {number}', category=self.cameras) for number in range(30)]
+
+    async def test_public_pages_render(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Canon 29')
+        self.assertNotContains(response, 'Canon 23')
+
+        response = await self.async_client.get(reverse('listing_list'), {'category': self.cameras.pk})
+        self.assertContains(response, 'Canon 29')
+        self.assertNotContains(response, 'Canon 5<')
+        self.assertEqual(response.context['page'].count, 30)
+        next_page = await self.async_client.get(reverse('listing_list'), {'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(next_page.context['listings']), 6)
+
+        response = await self.async_client.get(reverse('listing_detail', args=[self.listings[0].pk]))
+        self.assertContains(response, 'Canon 0')
+        response = await self.async_client.get(reverse('listing_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_anonymous_pages_are_cached(self):
+        path = reverse('listing_detail', args=[self.listings[0].pk])
+        await self.async_client.get(path)
+        hits = caching.stats().get('page_hit', 0)
+        response = await self.async_client.get(path)
+        self.assertContains(response, 'Canon 0')
+        self.assertEqual(caching.stats()['page_hit'], hits + 1)
+
+
+class QueryCountTests(TestCase):
+    """Core views issue a fixed number of queries however much data they show."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        Profile.objects.create(user=self.owner, user_type='business')
+        self.renter = User.objects.create_user('renter')
+        Profile.objects.create(user=self.renter)
+        self.seeded = 0
+
+    def seed(self, count):
+        today = date.today()
+        for number in range(self.seeded, self.seeded + count):
+            listing = make_listing(self.owner, title=f'Camera {number}', slug=f'camera-{number}')
+            for index in range(2):
+                ListingImage.objects.create(
+                    listing=listing, image=SimpleUploadedFile(f'photo{number}-{index}.jpg', b'jpeg', content_type='image/jpeg'),
+                )
+            Availability.objects.create(listing=listing, start_date=today, end_date=today + timedelta(days=30))
+            booking = Booking.objects.create(
+                listing=listing, renter=self.renter, start_date=today, end_date=today + timedelta(days=2),
+                total_price=20000, status='confirmed', payment_status='paid',
+            )
+            Review.objects.create(booking=booking, rating=5, comment='Great.')
+            Message.objects.create(sender=self.renter, recipient=self.owner, listing=listing, content='Hi')
+            Message.objects.create(sender=self.owner, recipient=self.renter, listing=listing, content='Hello')
+        self.seeded += count
+
+    def count_queries(self, url, user):
+        cache.clear()
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, expected, user=None):
+        self.seed(1)
+        self.assertEqual(self.count_queries(url(), user), expected)
+        self.seed(9)
+        self.assertEqual(self.count_queries(url(), user), expected)
+
+    def test_home(self):
+        self.assertConstantQueries(lambda: reverse('home'), 1)
+
+    def test_listing_list(self):
+        self.assertConstantQueries(lambda: reverse('listing_list'), 4)
+
+    def test_listing_detail(self):
+        self.assertConstantQueries(lambda: reverse('listing_detail', args=[Listing.objects.latest('pk').pk]), 3)
+
+    def test_dashboard(self):
+        self.assertConstantQueries(lambda: reverse('dashboard'), 7, user=self.owner)
+
+    def test_renter_dashboard(self):
+        self.assertConstantQueries(lambda: reverse('dashboard'), 6, user=self.renter)
+
+    def test_messages(self):
+        self.assertConstantQueries(lambda: reverse('messages'), 3, user=self.owner)
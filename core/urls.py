@@ -1,12 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
 from django.contrib.auth import views as auth_views
 
+# Async variants of the public pages, for ASGI deployments; see core.async_views.
+public = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('listings/', views.listing_list, name='listing_list'),
-    path('listing/<int:pk>/', views.listing_detail, name='listing_detail'),
+    path('', public.home, name='home'),
+    path('listings/', public.listing_list, name='listing_list'),
+    path('listings.json', views.listing_list_json, name='listing_list_json'),
+    path('listing/<int:pk>/', public.listing_detail, name='listing_detail'),
+    path('listing/<int:pk>/calendar.json', views.listing_calendar, name='listing_calendar'),
     path('create-listing/', views.create_listing, name='create_listing'),
+    path('listings/import/', views.import_listings, name='import_listings'),
+    path('listings/export/', views.export_listings, name='export_listings'),
     path('book/<int:pk>/', views.book_listing, name='book_listing'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('profile/setup/', views.profile_setup, name='profile_setup'),
@@ -14,7 +22,17 @@ urlpatterns = [
     path('pay/<int:pk>/', views.pay_booking, name='pay_booking'),
     path('review/<int:pk>/', views.leave_review, name='leave_review'),
     path('message/<int:pk>/', views.send_message, name='send_message'),
-    path('messages/', views.messages, name='messages'),
+    path('messages/', views.inbox, name='messages'),
+    path('messages/<int:pk>/', views.conversation, name='conversation'),
+    path('messages/<int:pk>/since.json', views.conversation_messages_json, name='conversation_messages_json'),
+    path('api/v1/listings/', api.listing_list, name='api_listing_list'),
+    path('api/v1/listings/<int:pk>/', api.listing_detail, name='api_listing_detail'),
+    path('api/v1/listings/<int:pk>/availability/', api.listing_availability, name='api_listing_availability'),
+    path('api/v1/listings/<int:pk>/reviews/', api.listing_reviews, name='api_listing_reviews'),
+    path('api/v1/categories/', api.category_list, name='api_category_list'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('request-profiles/', views.request_profiles, name='request_profiles'),
+    path('metrics', views.metrics, name='metrics'),
     path('login/', auth_views.LoginView.as_view(template_name='core/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(template_name='core/logout.html'), name='logout'),
     path('signup/', views.signup, name='signup'),
@@ -1,83 +1,323 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db.models import Q, Sum
 from django.core.exceptions import ValidationError
+from django.conf import settings
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.db import transaction
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
 import logging
-from .models import Listing, Booking, Profile, Category, ListingImage, Availability, Review, Message
+from .models import Listing, Booking, Profile, Category, ListingImage, Availability, Review, Message, ConversationMember
 from .forms import ListingForm, BookingForm, ProfileForm, AvailabilityForm, ReviewForm, MessageForm
+from . import bulk, caching, calendars, conversations, eventlog, facets, geo, instrumentation, pricing, search, stats, tasks
+from .caching import cache_anonymous_page
+from .images import validate_upload
+from .booking import BookingUnavailable, create_booking, filter_bookable
+from .pagination import COUNT_LIMIT, InvalidCursor, KeysetPaginator, RankedPaginator, cached_count, count_cache_key
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Utility function for price calculation
-def calculate_total_price(listing, start_date, end_date):
-    """Calculate total price based on pricing unit and duration."""
-    duration_days = (end_date - start_date).days
-    if duration_days <= 0:
-        raise ValidationError("End date must be after start date.")
-    
-    # Convert Decimal price to float for calculation, then back to Decimal
-    price = float(listing.price)
-    if listing.pricing_unit == 'hour':
-        total_price = price * (duration_days * 24)
-    elif listing.pricing_unit == 'day':
-        total_price = price * duration_days
-    elif listing.pricing_unit == 'week':
-        total_price = price * (duration_days / 7)
-    elif listing.pricing_unit == 'month':
-        total_price = price * (duration_days / 30)
-    elif listing.pricing_unit == 'year':
-        total_price = price * (duration_days / 365)
-    return round(total_price, 2)  # Match DecimalField decimal_places=2
+DASHBOARD_PAGE_SIZE = 20
+INBOX_PAGE_SIZE = 20
+THREAD_PAGE_SIZE = 50
+REVIEW_PAGE_SIZE = 10
+# listing_list ``sort`` values; each is served by an index on available listings.
+LISTING_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'rating': ('-rating_avg', '-id'),
+    # Only with a near/lat+lng origin, which annotates ``distance``.
+    'distance': ('distance', 'id'),
+}
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 200
+RADIUS_CHOICES = (5, 10, 25, 50, 100, 200)
+# listing_list filters set from the facet links rather than the form.
+FACET_FILTERS = ('rental_type', 'pricing_unit', 'instant_book', 'price_range')
 
+@cache_anonymous_page(lambda request: ['listings', 'categories'])
 def home(request):
     """Display featured listings on the homepage."""
-    featured_listings = Listing.objects.filter(is_available=True).select_related('category').prefetch_related('images').order_by('-created_at')[:6]
+    featured_listings = Listing.objects.filter(is_available=True).select_related('category', 'primary_image').order_by('-created_at')[:6]
     return render(request, 'core/home.html', {'featured_listings': featured_listings})
 
-def listing_list(request):
-    """List all available listings with filters."""
-    query = request.GET.get('q', '').strip()
-    category_id = request.GET.get('category', '')
-    max_price = request.GET.get('max_price', '')
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _parse_float(value, low, high):
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if low <= number <= high else None
+
+def _origin(filters):
+    """The (latitude, longitude) to search around: explicit coordinates or a gazetteer place."""
+    latitude, longitude = _parse_float(filters['lat'], -90, 90), _parse_float(filters['lng'], -180, 180)
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    place = geo.geocode(filters['near']) if filters['near'] else None
+    return (place.latitude, place.longitude) if place else None
 
-    listings = Listing.objects.filter(is_available=True).select_related('category').prefetch_related('images')
+def _parse_bbox(value):
+    """``west,south,east,north`` (GeoJSON order) as a (south, west, north, east) box."""
+    parts = value.split(',')
+    if len(parts) != 4:
+        return None
+    west, east = _parse_float(parts[0], -180, 180), _parse_float(parts[2], -180, 180)
+    south, north = _parse_float(parts[1], -90, 90), _parse_float(parts[3], -90, 90)
+    if None in (west, south, east, north) or south > north or west > east:
+        return None
+    return south, west, north, east
 
-    if query:
-        listings = listings.filter(
-            Q(title__icontains=query) | Q(description__icontains=query) | Q(location__icontains=query)
+def _filter_listings(request):
+    """Apply the listing_list query-string filters.
+
+    Returns the filtered queryset, the search ranking (or None when there is no
+    text query), the normalized filter values and the listings the facets
+    count: every filter applied except the facet selections.
+    """
+    filters = {
+        'q': request.GET.get('q', '').strip(),
+        'category': request.GET.get('category', ''),
+        'max_price': request.GET.get('max_price', ''),
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+        'min_rating': request.GET.get('min_rating', ''),
+        'rental_type': request.GET.get('rental_type', ''),
+        'pricing_unit': request.GET.get('pricing_unit', ''),
+        'instant_book': request.GET.get('instant_book', ''),
+        'price_range': request.GET.get('price_range', ''),
+        'sort': request.GET.get('sort', ''),
+        'near': request.GET.get('near', '').strip(),
+        'lat': request.GET.get('lat', ''),
+        'lng': request.GET.get('lng', ''),
+        'radius': request.GET.get('radius', ''),
+        'bbox': request.GET.get('bbox', ''),
+    }
+    origin = _origin(filters)
+    if filters['sort'] not in LISTING_ORDERINGS or (filters['sort'] == 'distance' and origin is None):
+        filters['sort'] = ''
+    listings = Listing.objects.filter(is_available=True).select_related('category', 'primary_image')
+
+    if filters['max_price'].replace('.', '', 1).isdigit():  # Allow decimal input
+        listings = listings.filter(price__lte=float(filters['max_price']))
+    if filters['min_rating'] in ('1', '2', '3', '4', '5'):
+        listings = listings.filter(rating_avg__gte=int(filters['min_rating']))
+    if origin is not None:
+        radius = _parse_float(filters['radius'], 0, MAX_RADIUS_KM) or DEFAULT_RADIUS_KM
+        listings = (
+            listings.filter(geo.within(*geo.bounding_box(*origin, radius)))
+            .annotate(distance=geo.distance_km(*origin))
+            .filter(distance__lte=radius)
         )
-    if category_id.isdigit():
-        listings = listings.filter(category_id=category_id)
-    if max_price.replace('.', '', 1).isdigit():  # Allow decimal input
-        listings = listings.filter(price__lte=float(max_price))
+        filters['sort'] = filters['sort'] or 'distance'
+    bbox = _parse_bbox(filters['bbox'])
+    if bbox:
+        listings = listings.filter(geo.within(*bbox))
+    start_date, end_date = _parse_date(filters['start']), _parse_date(filters['end'])
+    if start_date and end_date and start_date <= end_date:
+        listings = filter_bookable(listings, start_date, end_date)
+        if start_date < end_date:
+            listings = pricing.annotate_quotes(listings, start_date, end_date)
+    facet_listings = search.matching(listings, filters['q']) if filters['q'] else listings
+    listings = facets.apply(listings, filters)
+    # Ranked last, so the search limit applies to listings that pass every filter.
+    ranked_ids = search.search_listing_ids(filters['q'], listings) if filters['q'] else None
+    return listings, ranked_ids, filters, facet_listings
 
-    categories = Category.objects.all()
-    context = {
-        'listings': listings,
-        'query': query,
-        'categories': categories,
-        'selected_category': category_id,
-        'max_price': max_price,
+def _paginate_listings(listings, ranked_ids, filters, cursor=None):
+    """Return one cursor page of listings plus an approximate, cached total."""
+    if ranked_ids is not None:
+        page = RankedPaginator(listings, ranked_ids).page(cursor)
+    else:
+        page = KeysetPaginator(listings, ordering=LISTING_ORDERINGS[filters['sort'] or 'newest']).page(cursor)
+    if page.count is None:
+        page.count = cached_count(listings, count_cache_key('listing_list', filters))
+    return page
+
+def _facet_query(filters, key, value):
+    """The filter query with ``key`` set to ``value``, or cleared when it already is."""
+    params = {**filters, key: '' if filters[key] == value else value}
+    return urlencode({name: param for name, param in params.items() if param})
+
+def _facet_groups(counts, filters):
+    """(title, options) pairs of facet links for listing_list; each option toggles one filter."""
+    def option(key, value, label, count):
+        return {'label': label, 'count': count, 'query': _facet_query(filters, key, value), 'selected': filters[key] == value}
+
+    price_labels = [f'TSh {low:,}+' if high is None else f'TSh {low:,} – {high:,}' for low, high in facets.price_ranges()]
+    return [
+        ('Type', [option('rental_type', value, label, counts['rental_type'].get(value, 0)) for value, label in Listing.RENTAL_TYPES]),
+        ('Priced per', [option('pricing_unit', value, label, counts['pricing_unit'].get(value, 0)) for value, label in Listing.PRICING_UNITS]),
+        ('Price', [option('price_range', str(index), label, count) for index, (label, count) in enumerate(zip(price_labels, counts['price']))]),
+        ('Booking', [option('instant_book', '1', 'Instant book', counts['instant_book'])]),
+    ]
+
+def _facets_json(counts):
+    return {
+        'category': counts['category'],
+        'rental_type': counts['rental_type'],
+        'pricing_unit': counts['pricing_unit'],
+        'instant_book': counts['instant_book'],
+        'price': [
+            {'range': index, 'min': low, 'max': high, 'count': count}
+            for index, ((low, high), count) in enumerate(zip(facets.price_ranges(), counts['price']))
+        ],
     }
+
+def _listing_list_context(page, filters, categories, counts):
+    return {
+        'listings': page.object_list,
+        'page': page,
+        'count_limit': COUNT_LIMIT,
+        'filter_query': urlencode({key: value for key, value in filters.items() if value}),
+        'query': filters['q'],
+        'categories': [
+            {'id': category.pk, 'name': category.name, 'count': counts['category'].get(category.pk, 0)} for category in categories
+        ],
+        'facet_groups': _facet_groups(counts, filters),
+        # Carried through the filter form, which has no inputs of its own for them.
+        'facet_filters': [(key, filters[key]) for key in FACET_FILTERS if filters[key]],
+        'selected_category': filters['category'],
+        'max_price': filters['max_price'],
+        'start': filters['start'],
+        'end': filters['end'],
+        'min_rating': filters['min_rating'],
+        'sort': filters['sort'],
+        'near': filters['near'],
+        'near_unknown': bool(filters['near']) and not (filters['lat'] and filters['lng']) and geo.geocode(filters['near']) is None,
+        'lat': filters['lat'],
+        'lng': filters['lng'],
+        'radius': filters['radius'],
+        'radius_choices': RADIUS_CHOICES,
+    }
+
+def listing_list(request):
+    """List all available listings with filters."""
+    listings, ranked_ids, filters, facet_listings = _filter_listings(request)
+    try:
+        page = _paginate_listings(listings, ranked_ids, filters, request.GET.get('cursor'))
+    except InvalidCursor:
+        page = _paginate_listings(listings, ranked_ids, filters)
+    counts = facets.counts(facet_listings, filters)
+    context = _listing_list_context(page, filters, Category.objects.all(), counts)
     return render(request, 'core/listing_list.html', context)
 
+def _listing_json(request, listing):
+    quote_cents = getattr(listing, 'quote_cents', None)
+    return {
+        'id': listing.pk,
+        'title': listing.title,
+        'slug': listing.slug,
+        'price': str(listing.price),
+        'pricing_unit': listing.pricing_unit,
+        'rental_type': listing.rental_type,
+        'location': listing.location,
+        'category': listing.category.name if listing.category else None,
+        'instant_book': listing.instant_book,
+        'image': request.build_absolute_uri(listing.thumbnail_url) if listing.thumbnail_url else None,
+        'url': request.build_absolute_uri(reverse('listing_detail', args=[listing.pk])),
+        'quote': str(pricing.from_cents(quote_cents)) if quote_cents is not None else None,
+        'latitude': listing.latitude,
+        'longitude': listing.longitude,
+        'distance_km': round(listing.distance, 1) if hasattr(listing, 'distance') else None,
+    }
+
+def listing_list_json(request):
+    """JSON variant of listing_list, paginated with the same cursors."""
+    listings, ranked_ids, filters, facet_listings = _filter_listings(request)
+    try:
+        page = _paginate_listings(listings, ranked_ids, filters, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'count': page.count,
+        'count_is_capped': page.count > COUNT_LIMIT,
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+        'results': [_listing_json(request, listing) for listing in page],
+        'facets': _facets_json(facets.counts(facet_listings, filters)),
+    })
+
+def _listing_reviews(listing_id):
+    """A listing's reviews, newest first, read through its own index rather than its bookings."""
+    return Review.objects.filter(listing_id=listing_id).select_related('booking__renter')
+
+def _listing_detail_context(request, listing, reviews):
+    return {
+        'listing': listing,
+        'reviews': reviews,
+        'reviews_previous_query': _cursor_query(request, 'reviews', reviews.previous_cursor),
+        'reviews_next_query': _cursor_query(request, 'reviews', reviews.next_cursor),
+    }
+
+@cache_anonymous_page(lambda request, pk: ['categories', f'listing:{pk}'])
 def listing_detail(request, pk):
     """Display details of a specific listing."""
-    listing = get_object_or_404(Listing.objects.select_related('category', 'owner').prefetch_related('images', 'availability', 'bookings__review'), pk=pk)
-    return render(request, 'core/listing_detail.html', {'listing': listing})
+    listing = get_object_or_404(Listing.objects.select_related('category', 'owner').prefetch_related('images'), pk=pk)
+    reviews = _keyset_page(_listing_reviews(listing.pk), request.GET.get('reviews'), REVIEW_PAGE_SIZE)
+    return render(request, 'core/listing_detail.html', _listing_detail_context(request, listing, reviews))
+
+def listing_calendar(request, pk):
+    """Return the free/busy calendar of a listing as JSON."""
+    listing = get_object_or_404(Listing, pk=pk)
+    try:
+        start = date.fromisoformat(request.GET['start']) if 'start' in request.GET else timezone.localdate()
+        days = min(int(request.GET.get('days', 90)), calendars.HORIZON_DAYS)
+        end = start + timedelta(days=max(days, 1) - 1)
+    except (ValueError, OverflowError):
+        return JsonResponse({'error': 'Invalid start or days.'}, status=400)
+    if days < 1:
+        return JsonResponse({'error': 'Invalid start or days.'}, status=400)
+
+    calendar = calendars.get_calendar(listing.pk)
+    return JsonResponse({
+        'listing': listing.pk,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': ''.join('1' if free else '0' for free in calendars.day_flags(calendar, start, end)),
+        'free_ranges': [[first.isoformat(), last.isoformat()] for first, last in calendars.free_ranges(calendar, start, end)],
+    })
+
+@staff_member_required
+def cache_stats(request):
+    """Expose this process's page and fragment cache hit/miss counters."""
+    return JsonResponse(caching.stats())
+
+@staff_member_required
+def request_profiles(request):
+    """Expose this process's most recent request profiles, newest first."""
+    return JsonResponse({'results': instrumentation.recent(request.GET.get('view') or None)})
+
+def metrics(request):
+    """Prometheus text export of this process's per-view request totals."""
+    token = settings.METRICS_TOKEN
+    if not (request.user.is_staff or (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'))):
+        return HttpResponse(status=403)
+    return HttpResponse(instrumentation.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @login_required
 def create_listing(request):
     """Create a new listing with validation and multiple image uploads."""
     if request.method == 'POST':
         form = ListingForm(request.POST)  # No request.FILES here since images isn't in the form
+        images = request.FILES.getlist('images')
+        for image in images:
+            try:
+                validate_upload(image)
+            except ValidationError as e:
+                form.add_error(None, e)
         if form.is_valid():
             try:
                 with transaction.atomic():
@@ -85,17 +325,16 @@ def create_listing(request):
                     listing.owner = request.user
                     listing.save()
                     
-                    # Handle multiple image uploads directly from request.FILES
-                    images = request.FILES.getlist('images')
+                    # Originals are stored here; renditions are generated after commit
                     for image in images:
                         ListingImage.objects.create(listing=listing, image=image)
                     
                     messages.success(request, "Listing created successfully!")
-                    logger.info(f"User {request.user.id} created listing {listing.id}")
+                    eventlog.event(logger, 'listing.created', user_id=request.user.id, listing_id=listing.id, images=len(images))
                     return redirect('dashboard')
             except Exception as e:
                 messages.error(request, f"Failed to create listing: {str(e)}")
-                logger.error(f"Error creating listing for user {request.user.id}: {str(e)}")
+                eventlog.event(logger, 'listing.create_failed', level=logging.ERROR, exc_info=True, user_id=request.user.id)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -104,6 +343,42 @@ def create_listing(request):
     categories = Category.objects.all()  # For template compatibility
     return render(request, 'core/create_listing.html', {'form': form, 'categories': categories})
 
+IMPORT_ERRORS_SHOWN = 100
+
+@login_required
+def import_listings(request):
+    """Create many listings at once from an uploaded CSV or JSONL file."""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, "Choose a CSV or JSONL file to import.")
+        else:
+            result = bulk.import_listings(bulk.read_rows(upload, bulk.detect_format(upload.name)), request.user)
+            eventlog.event(logger, 'listings.imported', user_id=request.user.id, imported=result.created, rejected=len(result.errors), file_error=result.file_error)
+            if result.created:
+                messages.success(request, f"Imported {result.created} listings.")
+            if result.errors:
+                messages.error(request, f"{len(result.errors)} rows were skipped.")
+            if result.file_error:
+                messages.error(request, result.file_error)
+    return render(request, 'core/import_listings.html', {
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+        'fields': bulk.IMPORT_FIELDS,
+    })
+
+@login_required
+def export_listings(request):
+    """Stream the user's listings as CSV (default) or JSONL."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in bulk.FORMATS:
+        fmt = 'csv'
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(bulk.export_listings(Listing.objects.filter(owner=request.user), fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="listings.{fmt}"'
+    return response
+
 @login_required
 def book_listing(request, pk):
     """Book a listing with security and availability checks."""
@@ -125,39 +400,19 @@ def book_listing(request, pk):
                 return render(request, 'core/book_listing.html', {'listing': listing, 'form': form})
             
             try:
-                total_price = calculate_total_price(listing, start_date, end_date)
-                available = listing.availability.filter(
-                    start_date__lte=end_date, end_date__gte=start_date
-                ).exists()
-                conflicting_booking = Booking.objects.filter(
-                    listing=listing,
-                    status__in=['pending', 'confirmed'],
-                    start_date__lte=end_date,
-                    end_date__gte=start_date
-                ).exists()
-
-                if not available or conflicting_booking:
-                    messages.error(request, "This listing is not available for the selected dates.")
-                    return render(request, 'core/book_listing.html', {'listing': listing, 'form': form})
-
-                with transaction.atomic():
-                    booking = Booking.objects.create(
-                        listing=listing,
-                        renter=request.user,
-                        start_date=start_date,
-                        end_date=end_date,
-                        total_price=total_price,
-                        status='confirmed' if listing.instant_book else 'pending',
-                        payment_status='unpaid'
-                    )
-                    messages.success(request, "Booking request submitted successfully!")
-                    logger.info(f"User {request.user.id} booked listing {listing.id}")
-                    return redirect('dashboard')
+                total_price = pricing.quote_listing(listing, start_date, end_date)
+                booking = create_booking(listing, request.user, start_date, end_date, total_price)
+                messages.success(request, "Booking request submitted successfully!")
+                eventlog.event(logger, 'booking.created', user_id=request.user.id, listing_id=listing.id, booking_id=booking.id)
+                return redirect('dashboard')
+            except BookingUnavailable as e:
+                messages.error(request, e.message)
+                return render(request, 'core/book_listing.html', {'listing': listing, 'form': form})
             except ValidationError as e:
                 messages.error(request, str(e))
-            except Exception as e:
+            except Exception:
                 messages.error(request, "An error occurred while booking.")
-                logger.error(f"Error booking listing {listing.id} by user {request.user.id}: {str(e)}")
+                eventlog.event(logger, 'booking.failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, listing_id=listing.id)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -166,28 +421,44 @@ def book_listing(request, pk):
     availability = listing.availability.all()
     return render(request, 'core/book_listing.html', {'listing': listing, 'form': form, 'availability': availability})
 
+def _keyset_page(queryset, cursor, per_page, ordering=('-created_at', '-id')):
+    paginator = KeysetPaginator(queryset, ordering=ordering, per_page=per_page)
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        return paginator.page()
+
+def _cursor_query(request, name, cursor):
+    """The current query string with cursor ``name`` replaced by ``cursor``."""
+    params = request.GET.copy()
+    params[name] = cursor
+    return params.urlencode()
+
 @login_required
 def dashboard(request):
     """Display user dashboard with optimized queries."""
     profile, _ = Profile.objects.get_or_create(user=request.user, defaults={'user_type': 'individual'})
     
-    owned_listings = Listing.objects.filter(owner=request.user).select_related('category').prefetch_related('images')
-    bookings_made = Booking.objects.filter(renter=request.user).select_related('listing__category')
-    bookings_received = Booking.objects.filter(listing__owner=request.user).select_related('renter', 'listing__category')
-    
-    revenue_data = bookings_received.filter(status='confirmed', payment_status='paid').aggregate(total=Sum('total_price'))
-    total_revenue = revenue_data['total'] or 0
-    total_bookings = bookings_received.count()
-    pending_bookings = bookings_received.filter(status='pending').count()
+    owned_listings = Listing.objects.filter(owner=request.user).select_related('category', 'primary_image')
+    bookings_made = _keyset_page(
+        Booking.objects.filter(renter=request.user).select_related('listing__category', 'review'),
+        request.GET.get('made'), DASHBOARD_PAGE_SIZE,
+    )
+    bookings_received = _keyset_page(
+        Booking.objects.filter(listing__owner=request.user).select_related('renter', 'listing__category'),
+        request.GET.get('received'), DASHBOARD_PAGE_SIZE,
+    )
 
     context = {
         'profile': profile,
         'owned_listings': owned_listings,
         'bookings_made': bookings_made,
         'bookings_received': bookings_received,
-        'total_revenue': total_revenue,
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
+        'made_previous_query': _cursor_query(request, 'made', bookings_made.previous_cursor),
+        'made_next_query': _cursor_query(request, 'made', bookings_made.next_cursor),
+        'received_previous_query': _cursor_query(request, 'received', bookings_received.previous_cursor),
+        'received_next_query': _cursor_query(request, 'received', bookings_received.next_cursor),
+        **stats.owner_summary(request.user),
     }
     return render(request, 'core/dashboard.html', context)
 
@@ -229,7 +500,7 @@ def set_availability(request, pk):
                     return redirect('dashboard')
             except Exception as e:
                 messages.error(request, f"Failed to set availability: {str(e)}")
-                logger.error(f"Error setting availability for listing {listing.id}: {str(e)}")
+                eventlog.event(logger, 'availability.failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, listing_id=listing.id)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -253,12 +524,13 @@ def pay_booking(request, pk):
             with transaction.atomic():
                 booking.payment_status = 'paid'
                 booking.save()
+                tasks.enqueue('payment.receipt', {'booking_id': booking.pk}, key=f'payment-receipt:{booking.pk}')
                 messages.success(request, "Payment processed successfully!")
-                logger.info(f"User {request.user.id} paid for booking {booking.id}")
+                eventlog.event(logger, 'booking.paid', user_id=request.user.id, listing_id=booking.listing_id, booking_id=booking.id)
                 return redirect('dashboard')
-        except Exception as e:
+        except Exception:
             messages.error(request, "Payment failed. Please try again.")
-            logger.error(f"Error processing payment for booking {booking.id}: {str(e)}")
+            eventlog.event(logger, 'booking.payment_failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, booking_id=booking.id)
     
     return render(request, 'core/pay_booking.html', {'booking': booking})
 
@@ -266,7 +538,7 @@ def pay_booking(request, pk):
 def leave_review(request, pk):
     """Leave a review for a confirmed, paid booking."""
     booking = get_object_or_404(Booking, pk=pk, renter=request.user)
-    if booking.status != 'confirmed' or booking.payment_status != 'paid' or booking.review.exists():
+    if booking.status != 'confirmed' or booking.payment_status != 'paid' or Review.objects.filter(booking=booking).exists():
         messages.error(request, "You can only review confirmed and paid bookings once.")
         return redirect('dashboard')
 
@@ -282,7 +554,7 @@ def leave_review(request, pk):
                     return redirect('dashboard')
             except Exception as e:
                 messages.error(request, f"Failed to submit review: {str(e)}")
-                logger.error(f"Error submitting review for booking {booking.id}: {str(e)}")
+                eventlog.event(logger, 'review.failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, booking_id=booking.id)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -308,12 +580,13 @@ def send_message(request, pk):
                     message.recipient = listing.owner
                     message.listing = listing
                     message.save()
+                    tasks.enqueue('message.notification', {'message_id': message.pk}, key=f'message-notification:{message.pk}')
                     messages.success(request, "Message sent successfully!")
-                    logger.info(f"User {request.user.id} sent message to {listing.owner.id}")
-                    return redirect('dashboard')
+                    eventlog.event(logger, 'message.sent', user_id=request.user.id, listing_id=listing.id, recipient_id=listing.owner_id)
+                    return redirect('conversation', pk=message.conversation_id)
             except Exception as e:
                 messages.error(request, f"Failed to send message: {str(e)}")
-                logger.error(f"Error sending message for listing {listing.id}: {str(e)}")
+                eventlog.event(logger, 'message.failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, listing_id=listing.id)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -322,13 +595,92 @@ def send_message(request, pk):
     return render(request, 'core/send_message.html', {'listing': listing, 'form': form})
 
 @login_required
-def messages(request):
-    """Display sent and received messages."""
-    sent_messages = Message.objects.filter(sender=request.user).select_related('recipient', 'listing')
-    received_messages = Message.objects.filter(recipient=request.user).select_related('sender', 'listing')
+def inbox(request):
+    """List the user's conversations, most recently active first."""
+    page = _keyset_page(
+        ConversationMember.objects.filter(user=request.user).select_related(
+            'other_user', 'conversation__listing', 'conversation__last_message',
+        ),
+        request.GET.get('cursor'), INBOX_PAGE_SIZE, ordering=('-last_message_at', '-id'),
+    )
     return render(request, 'core/messages.html', {
-        'sent_messages': sent_messages,
-        'received_messages': received_messages
+        'page': page,
+        'previous_query': _cursor_query(request, 'cursor', page.previous_cursor),
+        'next_query': _cursor_query(request, 'cursor', page.next_cursor),
+    })
+
+def _membership(request, pk):
+    return get_object_or_404(
+        ConversationMember.objects.select_related('other_user', 'conversation__listing'),
+        conversation_id=pk, user=request.user,
+    )
+
+@login_required
+def conversation(request, pk):
+    """Show one conversation, newest messages last, and accept replies."""
+    member = _membership(request, pk)
+    if request.method == 'POST':
+        form = MessageForm(request.POST)
+        if form.is_valid():
+            try:
+                with transaction.atomic():
+                    message = form.save(commit=False)
+                    message.sender = request.user
+                    message.recipient = member.other_user
+                    message.listing = member.conversation.listing
+                    message.conversation = member.conversation
+                    message.save()
+                    tasks.enqueue('message.notification', {'message_id': message.pk}, key=f'message-notification:{message.pk}')
+                eventlog.event(logger, 'message.replied', user_id=request.user.id, conversation_id=pk)
+                return redirect('conversation', pk=pk)
+            except Exception:
+                messages.error(request, "Failed to send message.")
+                eventlog.event(logger, 'message.reply_failed', level=logging.ERROR, exc_info=True, user_id=request.user.id, conversation_id=pk)
+        else:
+            messages.error(request, "Please correct the errors below.")
+    else:
+        form = MessageForm()
+
+    conversations.mark_read(member)
+    thread = _keyset_page(
+        Message.objects.filter(conversation_id=pk).select_related('sender'),
+        request.GET.get('cursor'), THREAD_PAGE_SIZE, ordering=('-id',),
+    )
+    return render(request, 'core/conversation.html', {
+        'member': member,
+        'conversation': member.conversation,
+        'thread': list(reversed(thread.object_list)),
+        'last_id': thread.object_list[0].pk if thread.object_list else 0,
+        'page': thread,
+        'previous_query': _cursor_query(request, 'cursor', thread.previous_cursor),
+        'next_query': _cursor_query(request, 'cursor', thread.next_cursor),
+        'form': form,
+    })
+
+@login_required
+def conversation_messages_json(request, pk):
+    """Messages newer than ``?since=<id>``, so clients can poll without reloading the thread."""
+    member = _membership(request, pk)
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid since.'}, status=400)
+    new_messages = conversations.messages_since(pk, since)
+    conversations.mark_read(member)
+    return JsonResponse({
+        'conversation': pk,
+        'last_id': new_messages[-1].pk if new_messages else since,
+        'has_more': len(new_messages) == conversations.POLL_LIMIT,
+        'messages': [
+            {
+                'id': message.pk,
+                'sender': message.sender.username,
+                'mine': message.sender_id == request.user.pk,
+                'content': message.content,
+                'created_at': message.created_at.isoformat(),
+            }
+            for message in new_messages
+        ],
     })
 
 def signup(request):
@@ -340,13 +692,14 @@ def signup(request):
                 with transaction.atomic():
                     user = form.save()
                     Profile.objects.create(user=user, user_type='individual')
+                    tasks.enqueue('account.welcome', {'user_id': user.pk}, key=f'account-welcome:{user.pk}')
                     login(request, user)
                     messages.success(request, "Account created successfully!")
-                    logger.info(f"New user signed up: {user.id}")
+                    eventlog.event(logger, 'user.signed_up', user_id=user.id)
                     return redirect('dashboard')
             except Exception as e:
                 messages.error(request, f"Signup failed: {str(e)}")
-                logger.error(f"Error during signup: {str(e)}")
+                eventlog.event(logger, 'user.signup_failed', level=logging.ERROR, exc_info=True)
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -1,6 +1,8 @@
-import os
+import sys
 from pathlib import Path
 
+from decouple import config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 ALLOWED_HOSTS = ['*']
@@ -15,11 +17,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'crispy_forms',
+    'rest_framework',
     'core',
     'django.contrib.humanize',
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,16 +37,87 @@ ROOT_URLCONF = 'edalali.urls'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database. SQLite by default; set DB_ENGINE=postgresql and the DB_* settings
+# below to run on Postgres.
+DB_ENGINE = config('DB_ENGINE', default='sqlite3')
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='edalali'),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default=''),
+            'PORT': config('DB_PORT', default=''),
+            # Keep connections open between requests; check them before reuse.
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # DB_POOL_MAX_SIZE > 0 switches to a psycopg connection pool per worker
+    # process. Django does not allow pooling together with CONN_MAX_AGE.
+    DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=0, cast=int)
+    if DB_POOL_MAX_SIZE:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+else:
+    # WAL lets readers run alongside the single writer, and synchronous=NORMAL
+    # only fsyncs at checkpoints, which is durable enough with WAL. Writers
+    # wait up to busy_timeout ms for the lock instead of failing with
+    # "database is locked", and IMMEDIATE transactions take the write lock
+    # when they begin, so a read-then-write transaction never has to upgrade.
+    SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='WAL')
+    SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')
+    SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+                'init_command': (
+                    f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE};'
+                    f'PRAGMA synchronous={SQLITE_SYNCHRONOUS};'
+                    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT};'
+                ),
+            },
+            # Tests use a file too: the default in-memory database shares one
+            # cache between connections, which locks whole tables, ignores
+            # busy_timeout and cannot use WAL.
+            'TEST': {'NAME': config('DB_TEST_NAME', default=str(BASE_DIR / 'test_db.sqlite3'))},
+        }
     }
-}
+
+# Local memory by default; set CACHE_URL=redis://host:6379/0 to share the cache
+# between workers. RedisCache uses the redis package from requirements_fixed.txt.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'edalali',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+CACHE_PAGE_TIMEOUT = config('CACHE_PAGE_TIMEOUT', default=600, cast=int)
+CACHE_FRAGMENT_TIMEOUT = config('CACHE_FRAGMENT_TIMEOUT', default=3600, cast=int)
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that times renders for core.instrumentation.
+        'BACKEND': 'core.instrumentation.InstrumentedTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -62,11 +137,85 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Listing image renditions are generated off the request path by core.images.
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+IMAGE_PIPELINE_EAGER = config('IMAGE_PIPELINE_EAGER', default=False, cast=bool)
+
+# Background tasks. With TASKS_EAGER=1 tasks run right after the enqueuing
+# transaction commits instead of waiting for `manage.py run_tasks`.
+TASKS_EAGER = config('TASKS_EAGER', default=False, cast=bool)
+TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
+TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
+TWILIO_FROM_NUMBER = config('TWILIO_FROM_NUMBER', default='')
+
+# Serve home, listing_list and listing_detail from core.async_views. Enable
+# when running edalali.asgi under uvicorn; leave off under WSGI.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Push events to signed-in browsers over a WebSocket; see core.realtime.
+# The in-process broker only reaches sockets held by the process that sent
+# the event. Any deployment with more than one process (several uvicorn
+# workers, or gunicorn serving WSGI next to the ASGI server that holds the
+# sockets) must use core.realtime.RedisBroker, the default once a Redis URL
+# is configured. It uses the redis package from requirements_fixed.txt.
+REALTIME_PATH = '/ws/'
+REALTIME_REDIS_URL = config('REALTIME_REDIS_URL', default=CACHE_URL)
+REALTIME_BROKER = config(
+    'REALTIME_BROKER',
+    default='core.realtime.RedisBroker' if REALTIME_REDIS_URL else 'core.realtime.InProcessBroker',
+)
+
+# Per-request timings, query counts and duplicate queries; see
+# core.instrumentation. The last INSTRUMENTATION_BUFFER_SIZE profiles are at
+# /request-profiles/ for staff and totals at /metrics, which also accepts
+# "Authorization: Bearer <METRICS_TOKEN>" when a token is set.
+INSTRUMENTATION = config('INSTRUMENTATION', default=True, cast=bool)
+INSTRUMENTATION_BUFFER_SIZE = config('INSTRUMENTATION_BUFFER_SIZE', default=500, cast=int)
+INSTRUMENTATION_SLOW_MS = config('INSTRUMENTATION_SLOW_MS', default=1000, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Read-only JSON API under /api/v1/; see core.api.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+}
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# core.* loggers write JSON lines from a background thread (core.eventlog),
+# to LOG_FILE with rotation or, when LOG_STDERR is on, to stderr. Other
+# libraries' errors go there too. LOG_STDERR defaults to off under
+# `manage.py test`, so test output is not interleaved with events.
+# LOG_REQUESTS adds an http.request event with each request's timings.
+TESTING = sys.argv[1:2] == ['test']
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FILE = config('LOG_FILE', default='')
+LOG_STDERR = config('LOG_STDERR', default=not TESTING, cast=bool)
+LOG_REQUESTS = config('LOG_REQUESTS', default=False, cast=bool)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'events': {
+            'class': 'core.eventlog.BackgroundHandler',
+            'filename': LOG_FILE,
+            'max_bytes': config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int),
+            'backup_count': config('LOG_BACKUP_COUNT', default=5, cast=int),
+        } if LOG_FILE or LOG_STDERR else {'class': 'logging.NullHandler'},
+    },
+    'root': {'handlers': ['events'], 'level': 'ERROR'},
+    'loggers': {
+        'core': {'handlers': ['events'], 'level': LOG_LEVEL, 'propagate': False},
+        # 4xx responses are counted by core.instrumentation; log only server errors.
+        'django.request': {'level': 'ERROR'},
+    },
+}
+
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/login/'
\ No newline at end of file